@@ -0,0 +1,242 @@
+"""
+Генератор правдоподобных ответов LNetworkService для замеров производительности
+"""
+import base64
+import random
+import uuid
+from datetime import datetime, timedelta
+
+NS_SOAP = "http://schemas.xmlsoap.org/soap/envelope/"
+NS_RUSGUARD = "http://www.rusguardsecurity.ru"
+NS_ENTITY = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity"
+NS_LOG = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity.Log"
+NS_NOTIFICATIONS = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Notifications"
+NS_ADDITIONAL_FIELDS = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity.AdditionalFields"
+NS_INSTANCE = "http://www.w3.org/2001/XMLSchema-instance"
+
+SUBTYPES = (
+    ("Information", "AccessPointEntryByKey", "Вход по ключу"),
+    ("Information", "AccessPointExitByKey", "Выход по ключу"),
+    ("Warning", "AccessPointEntryDeniedKeyNotFound", "Проход запрещен, ключ не найден"),
+    ("Information", "AccessPointDoorOpened", "Дверь открыта"),
+    ("Alarm", "AccessPointDoorBreak", "Взлом двери"),
+)
+
+
+def envelope(body) -> str:
+    return f'<s:Envelope xmlns:s="{NS_SOAP}"><s:Body>{body}</s:Body></s:Envelope>'
+
+
+def response(method, result, namespaces="") -> str:
+    return envelope(
+        f'<{method}Response xmlns="{NS_RUSGUARD}">'
+        f'<{method}Result{namespaces}>{result}</{method}Result>'
+        f'</{method}Response>'
+    )
+
+
+def _value(tag, value) -> str:
+    if value is None:
+        return f'<a:{tag} i:nil="true"/>'
+    return f'<a:{tag}>{value}</a:{tag}>'
+
+
+class Corpus:
+    """
+    Набор сотрудников и устройств, из которых строятся ответы сервера
+    """
+
+    def __init__(self, employees=200, drivers=50, seed=1):
+        self.random = random.Random(seed)
+        self.employees = [uuid.UUID(int=self.random.getrandbits(128)) for _ in range(employees)]
+        self.groups = [uuid.UUID(int=self.random.getrandbits(128)) for _ in range(max(1, employees // 20))]
+        self.server_id = uuid.UUID(int=self.random.getrandbits(128))
+        self.net_id = uuid.UUID(int=self.random.getrandbits(128))
+        self.drivers = [uuid.UUID(int=self.random.getrandbits(128)) for _ in range(drivers)]
+        self.start = datetime(2021, 10, 1, 8, 0, 0)
+
+    def log_message(self, message_id, details_size=40) -> str:
+        message_type, subtype, text = SUBTYPES[message_id % len(SUBTYPES)]
+        employee = self.employees[message_id % len(self.employees)]
+        group = self.groups[message_id % len(self.groups)]
+        driver = self.drivers[message_id % len(self.drivers)]
+        date = self.event_date(message_id)
+
+        return "".join((
+            "<a:LogMessage>",
+            _value("ContentData", None),
+            _value("ContentType", None),
+            _value("DateTime", date.strftime("%Y-%m-%dT%H:%M:%S.%f") + "0+08:00"),
+            _value("Details", ("Турникет " + str(driver)[:8] + " ").ljust(details_size, ".")),
+            _value("DriverID", driver),
+            _value("DriverName", f"Турникет {message_id % len(self.drivers)}"),
+            _value("EmployeeFirstName", "Иван"),
+            _value("EmployeeGroupFullName", "Организация\\Отдел"),
+            _value("EmployeeGroupId", group),
+            _value("EmployeeGroupName", "Отдел"),
+            _value("EmployeeID", employee),
+            _value("EmployeeLastName", "Иванов"),
+            _value("EmployeeSecondName", "Иванович"),
+            _value("Id", message_id),
+            _value("LogMessageSubType", subtype),
+            _value("LogMessageType", message_type),
+            _value("Message", text),
+            _value("OperatorFullName", None),
+            _value("OperatorID", None),
+            _value("OperatorLogin", None),
+            _value("ServerId", self.server_id),
+            _value("ServerName", "Сервер СКУД"),
+            "</a:LogMessage>",
+        ))
+
+    def events(self, count, first_id=1, method="GetEvents", details_size=40, descending=False) -> str:
+        step = -1 if descending else 1
+        messages = "".join(self.log_message(first_id + i * step, details_size) for i in range(count))
+        return response(
+            method,
+            f"<a:Count>{count}</a:Count><a:Messages>{messages}</a:Messages>",
+            f' xmlns:a="{NS_LOG}" xmlns:i="{NS_INSTANCE}"'
+        )
+
+    def notification(self, index) -> str:
+        message_type, subtype, text = SUBTYPES[index % len(SUBTYPES)]
+        date = self.start + timedelta(seconds=index * 7)
+
+        return "".join((
+            "<a:EmployeePassageNotification>",
+            _value("Data", None),
+            _value("DateTime", date.strftime("%Y-%m-%dT%H:%M:%S") + "+08:00"),
+            _value("Details", "Проход"),
+            _value("DriverId", self.drivers[index % len(self.drivers)]),
+            _value("EmployeeId", self.employees[index % len(self.employees)]),
+            _value("IsKeyEvent", "true"),
+            _value("LogMessageId", index),
+            _value("Message", text),
+            _value("MessageSubType", subtype),
+            _value("MessageType", message_type),
+            _value("OperatorId", None),
+            "<a:AddFields><b:Fields>",
+            "<b:AdditionalFieldValue><b:AdditionalFieldInfo>",
+            "<b:FieldType>String</b:FieldType><b:ID>1</b:ID><b:IsNotForShow>false</b:IsNotForShow>",
+            "<b:IsRequired>false</b:IsRequired><b:Name>Табельный номер</b:Name><b:Order>0</b:Order>",
+            "<b:OwnerType>Employee</b:OwnerType><b:DefaultValue i:nil=\"true\"/>",
+            "</b:AdditionalFieldInfo></b:AdditionalFieldValue>",
+            "</b:Fields></a:AddFields>",
+            _value("EmployeeFirstName", "Иван"),
+            _value("EmployeeLastName", "Иванов"),
+            _value("EmployeeSecondName", "Иванович"),
+            _value("EmployeePosition", "Инженер"),
+            _value("EmployeeGroupFullPath", "Организация\\Отдел"),
+            "</a:EmployeePassageNotification>",
+        ))
+
+    def notifications(self, count, first_index=0) -> str:
+        items = "".join(self.notification(first_index + i) for i in range(count))
+        return response(
+            "GetNotification",
+            f"<a:EmployeePassageNotifications>{items}</a:EmployeePassageNotifications>",
+            f' xmlns:a="{NS_NOTIFICATIONS}" xmlns:b="{NS_ADDITIONAL_FIELDS}" xmlns:i="{NS_INSTANCE}"'
+        )
+
+    def driver(self, index) -> str:
+        driver_id = self.drivers[index]
+        parent_id = None if index == 0 else self.drivers[(index - 1) // 4]
+        parent_property = "Controllers" if index and index < 5 else "AccessPoints"
+
+        def properties(tag, names):
+            return f"<a:{tag}>" + "".join(
+                f"<a:LPropertyValue><a:PropertyName>{name}</a:PropertyName><a:Value>{i}</a:Value></a:LPropertyValue>"
+                for i, name in enumerate(names)
+            ) + f"</a:{tag}>"
+
+        return "".join((
+            "<a:LDriverFullInfo>",
+            _value("DeviceServerId", self.server_id),
+            _value("Id", driver_id),
+            _value("ParentId", parent_id),
+            _value("DriverType", "RusGuardAcs2" if index < 5 else "AccessPoint"),
+            _value("IsActive", "true"),
+            _value("IsUnknownID", "false"),
+            _value("Name", f"Устройство {index}"),
+            _value("ParentPropertyName", parent_property),
+            properties("Properties", ("Address", "Timeout", "Mode", "Direction")),
+            _value("State", "Normal"),
+            properties("States", ("Online", "DoorState")),
+            "</a:LDriverFullInfo>",
+        ))
+
+    def drivers_full_info(self) -> str:
+        items = "".join(self.driver(i) for i in range(len(self.drivers)))
+        return response(
+            "GetServerDriversFullInfo", items, f' xmlns:a="{NS_ENTITY}" xmlns:i="{NS_INSTANCE}"'
+        )
+
+    def photo(self, size) -> str:
+        data = base64.b64encode(self.random.randbytes(size)).decode()
+        return response("GetAcsEmployeePhoto", data)
+
+    def event_date(self, message_id) -> datetime:
+        """
+        Время события в наборе: события следуют каждые 7 секунд от start
+        """
+        return self.start + timedelta(seconds=message_id * 7)
+
+    def last_event(self, message_id) -> str:
+        return self.events(1, message_id, method="GetLastEvent")
+
+    @staticmethod
+    def connect(session_id) -> str:
+        return response("Connect", session_id)
+
+    @staticmethod
+    def disconnect() -> str:
+        return envelope(f'<DisconnectResponse xmlns="{NS_RUSGUARD}"/>')
+
+    @staticmethod
+    def variable(name, value) -> str:
+        return response(
+            "GetVariable", f"<a:Name>{name}</a:Name><a:Value>{value}</a:Value>", f' xmlns:a="{NS_ENTITY}"'
+        )
+
+    @staticmethod
+    def message_types() -> str:
+        items = "".join(
+            "<a:LogMessageTypeSlimInfo>"
+            f"<a:LogMesssageType>{message_type}</a:LogMesssageType><a:Name>{message_type}</a:Name>"
+            f"<a:OrderNumber>{index}</a:OrderNumber><a:Publish>true</a:Publish>"
+            "</a:LogMessageTypeSlimInfo>"
+            for index, message_type in enumerate(dict.fromkeys(item[0] for item in SUBTYPES))
+        )
+        return response("GetLogMessageTypes", items, f' xmlns:a="{NS_LOG}"')
+
+    @staticmethod
+    def message_subtypes() -> str:
+        items = "".join(
+            "<a:LogMessageSubtypeSlimInfo>"
+            f"<a:LogMessageSubtype>{subtype}</a:LogMessageSubtype><a:LogMesssageType>{message_type}</a:LogMesssageType>"
+            f"<a:Name>{text}</a:Name><a:OrderNumber>{index}</a:OrderNumber><a:Publish>true</a:Publish>"
+            "</a:LogMessageSubtypeSlimInfo>"
+            for index, (message_type, subtype, text) in enumerate(SUBTYPES)
+        )
+        return response("GetLogMessageSubtypes", items, f' xmlns:a="{NS_LOG}"')
+
+    def all_nets(self) -> str:
+        return response(
+            "GetAllNets",
+            f"<a:LNetInfo><a:GatewayUrl>net.tcp://localhost</a:GatewayUrl><a:Id>{self.net_id}</a:Id>"
+            "<a:IsAttached>true</a:IsAttached></a:LNetInfo>",
+            f' xmlns:a="{NS_ENTITY}"'
+        )
+
+    def net_servers(self) -> str:
+        return response(
+            "GetNetServers",
+            f"<a:LServerInfo><a:Id>{self.server_id}</a:Id><a:IdNet>{self.net_id}</a:IdNet>"
+            "<a:IsAttached>true</a:IsAttached><a:ServerType>DeviceServer</a:ServerType>"
+            "<a:Url>net.tcp://localhost</a:Url></a:LServerInfo>",
+            f' xmlns:a="{NS_ENTITY}"'
+        )
+
+    @staticmethod
+    def fault(code, text) -> str:
+        return envelope(f"<s:Fault><faultcode>{code}</faultcode><faultstring>{text}</faultstring></s:Fault>")
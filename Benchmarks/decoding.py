@@ -0,0 +1,58 @@
+"""
+Сравнение скорости разбора страницы GetEvents:
+прежний путь (два разбора документа и replace для каждого тега) против табличного декодера.
+
+Запуск: python -m Benchmarks.decoding [количество сообщений]
+"""
+import sys
+import timeit
+from io import StringIO
+from xml.etree.ElementTree import fromstring, iterparse
+
+from Benchmarks.corpus import Corpus
+from RusGuardClient import Decoder
+
+
+class LegacyLogMessage:
+    def __init__(self, document):
+        url = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity.Log"
+        for element in document:
+            element_tag = element.tag.replace("{" + url + "}", "")
+            setattr(self, element_tag, element.text)
+
+
+def legacy_get_events(message: str):
+    """
+    Разбор страницы событий так, как это делалось до табличного декодера
+    """
+    namespace = dict([
+        node for _, node in iterparse(StringIO(message), events=['start-ns'])
+    ])
+    events = fromstring(message).find(
+        "s:Body/{http://www.rusguardsecurity.ru}GetEventsResponse/{http://www.rusguardsecurity.ru}GetEventsResult",
+        namespace
+    )
+    return [LegacyLogMessage(element) for element in events.find("a:Messages", namespace)]
+
+
+def measure(function, *args, number=5, repeat=5) -> float:
+    """
+    :return: Лучшее время одного вызова (сек.)
+    """
+    return min(timeit.repeat(lambda: function(*args), number=number, repeat=repeat)) / number
+
+
+def main(count=1000):
+    page = Corpus().events(count)
+
+    legacy = measure(legacy_get_events, page)
+    table = measure(Decoder.GetEvents, page)
+
+    print(f"Страница из {count} сообщений, {len(page) // 1024} КиБ")
+    print(f"было:  {legacy * 1000:8.2f} мс  ({count / legacy:10.0f} сообщ./с)")
+    print(f"стало: {table * 1000:8.2f} мс  ({count / table:10.0f} сообщ./с)")
+    print(f"ускорение: {legacy / table:.2f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
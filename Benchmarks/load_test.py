@@ -0,0 +1,225 @@
+"""
+Нагрузочный замер AsyncNetworkClient.
+Запросы запускаются с заданной частотой независимо от ответов (открытая модель нагрузки),
+время ответа считается от запланированного момента запуска, поэтому очередь на стороне клиента
+не скрывает задержку. По умолчанию запускается встроенный тестовый сервер (Benchmarks.mock_server)
+в том же процессе; при высокой частоте он конкурирует с клиентом за процессор, поэтому сервер
+лучше запускать отдельно и указывать его адрес в --target.
+
+Запуск: python -m Benchmarks.load_test --rate 200 --duration 10 --mix last_event=4,events=4,photo=1,drivers=1
+Против отдельно запущенного сервера: python -m Benchmarks.load_test --target 127.0.0.1:8080 --scheme http
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import tempfile
+import time
+import uuid
+
+from Benchmarks.mock_server import arguments_parser as server_arguments_parser, server_from_arguments
+from RusGuardClient.ANetwork import AsyncNetworkClient
+from RusGuardClient.photo_cache import PhotoCache
+from RusGuardClient.query import EventQuery
+
+OPERATIONS = {
+    "version": lambda client, state: client.get_version(),
+    "last_event": lambda client, state: client.get_last_event(),
+    "events": lambda client, state: client.get_events_page(
+        state.random.randint(0, state.last_event_id), page_size=state.page_size
+    ),
+    "filtered": lambda client, state: client.get_filtered_events_page(
+        EventQuery().after_message(state.random.randint(0, state.last_event_id)).paginate(state.page_size)
+    ),
+    "photo": lambda client, state: client.get_employee_photo_bytes(str(uuid.uuid4())),
+    "types": lambda client, state: client.get_log_message_types(),
+    "drivers": lambda client, state: client.get_server_drivers_full_info(state.server_id),
+}
+
+
+class State:
+    """
+    Общие параметры операций нагрузки
+    """
+
+    def __init__(self, page_size, seed=None):
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self.last_event_id = 0
+        self.server_id = None
+
+
+class OperationResult:
+    def __init__(self):
+        self.latencies = []
+        self.errors = {}  # type: {str: int}
+        self.skipped = 0
+
+    def percentile(self, q):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def as_dict(self) -> dict:
+        return {
+            "completed": len(self.latencies),
+            "errors": dict(self.errors),
+            "skipped": self.skipped,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "max": max(self.latencies, default=None),
+        }
+
+
+def parse_mix(value) -> dict:
+    """
+    :param value: Строка вида операция=вес,операция=вес
+    :return: {Операция: вес}
+    """
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Неизвестная операция: {name}, доступны: {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def run_load(client, mix, rate, duration, max_in_flight=256, page_size=100, seed=None):
+    """
+    Нагрузка клиента с заданной частотой запросов
+    :param client: Подключенный AsyncNetworkClient
+    :param mix: {Операция: вес}
+    :param rate: Запросов в секунду
+    :param duration: Длительность (сек.)
+    :param max_in_flight: Максимальное количество одновременных запросов; сверх него запуски пропускаются
+    :param page_size: Размер страницы событий
+    :param seed: Начальное значение генератора случайных чисел
+    :return: ({Операция: OperationResult}, время выполнения)
+    """
+    loop = asyncio.get_running_loop()
+    state = State(page_size, seed)
+    state.last_event_id = (await client.get_last_event()).Id
+    if "drivers" in mix:
+        state.server_id = (await client.get_net_servers())[0].Id
+
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results = {name: OperationResult() for name in names}
+    tasks = set()
+
+    async def execute(name, scheduled):
+        try:
+            await OPERATIONS[name](client, state)
+        except Exception as error:
+            errors = results[name].errors
+            errors[type(error).__name__] = errors.get(type(error).__name__, 0) + 1
+        else:
+            results[name].latencies.append(loop.time() - scheduled)
+
+    started = loop.time()
+    for index in range(int(rate * duration)):
+        scheduled = started + index / rate
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        name = state.random.choices(names, weights)[0]
+        if len(tasks) >= max_in_flight:
+            results[name].skipped += 1
+            continue
+
+        task = asyncio.ensure_future(execute(name, scheduled))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    await asyncio.gather(*tasks)
+    return results, loop.time() - started
+
+
+def report(results, elapsed, rate):
+    completed = sum(len(result.latencies) for result in results.values())
+    errors = sum(sum(result.errors.values()) for result in results.values())
+    skipped = sum(result.skipped for result in results.values())
+
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.1f}"
+
+    print(f"Цель: {rate:.0f} req/s, выполнено: {completed / elapsed:.1f} req/s за {elapsed:.1f} с")
+    print(f"Ошибок: {errors}, пропущено из-за перегрузки: {skipped}")
+    print(f"{'Операция':<12}{'успешно':>9}{'ошибки':>8}{'p50, мс':>10}{'p90, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    for name, result in results.items():
+        data = result.as_dict()
+        print(f"{name:<12}{data['completed']:>9}{sum(data['errors'].values()):>8}"
+              f"{ms(data['p50']):>10}{ms(data['p90']):>10}{ms(data['p99']):>10}{ms(data['max']):>10}")
+
+
+async def main_async(arguments):
+    server = None
+    target, scheme = arguments.target, arguments.scheme
+    if target is None:
+        arguments.port = 0
+        server = await server_from_arguments(arguments, seed=arguments.seed).start()
+        target, scheme = server.address, server.scheme
+
+    with tempfile.TemporaryDirectory() as photo_directory:
+        client = AsyncNetworkClient(
+            target, arguments.username, arguments.password,
+            limit=arguments.connections, limit_per_host=arguments.connections,
+            photo_cache=PhotoCache(photo_directory, memory_bytes=0, disk_bytes=64 * 1024 * 1024),
+            metadata_cache=False,
+            scheme=scheme
+        )
+        try:
+            await client.connect()
+            results, elapsed = await run_load(
+                client, parse_mix(arguments.mix), arguments.rate, arguments.duration,
+                arguments.max_in_flight, arguments.page_size, arguments.seed
+            )
+        finally:
+            await client.disconnect()
+            if server is not None:
+                await server.stop()
+
+    report(results, elapsed, arguments.rate)
+
+    if arguments.json:
+        with open(arguments.json, "w", encoding="utf-8") as file:
+            json.dump({
+                "rate": arguments.rate,
+                "elapsed": elapsed,
+                "operations": {name: result.as_dict() for name, result in results.items()},
+                "client": client.metrics.snapshot(),
+            }, file, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный замер AsyncNetworkClient", parents=[server_arguments_parser(add_help=False)]
+    )
+    parser.add_argument("--target", help="адрес сервера host:port; без него запускается тестовый сервер")
+    parser.add_argument("--scheme", default="http", choices=("http", "https"))
+    parser.add_argument("--username", default="user")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--rate", type=float, default=100.0, help="запросов в секунду")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность, сек.")
+    parser.add_argument("--mix", default="last_event=4,events=4,photo=1,drivers=1",
+                        help=f"операции и веса, доступны: {', '.join(OPERATIONS)}")
+    parser.add_argument("--connections", type=int, default=32, help="соединений в пуле клиента")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="одновременных запросов")
+    parser.add_argument("--page-size", type=int, default=100, help="размер страницы событий")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="файл для результатов в JSON")
+    arguments = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    started = time.perf_counter()
+    asyncio.run(main_async(arguments))
+    print(f"Общее время: {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+"""
+Локальный тестовый сервер LNetworkService для замеров клиента без доступа к СКУД.
+Ответы строятся из набора Corpus; задержка, размер фотографий, доля ошибок и обрывов соединения
+и скорость появления новых событий настраиваются, в том числе отдельно для SOAP действий.
+
+Запуск: python -m Benchmarks.mock_server --port 8080 --latency 0.02 --jitter 0.01 --event-rate 50
+Клиент: AsyncNetworkClient("127.0.0.1:8080", "user", "password", scheme="http")
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+import uuid
+from xml.etree.ElementTree import ParseError, fromstring
+
+from aiohttp import web
+
+from Benchmarks.corpus import Corpus, NS_SOAP
+from RusGuardClient.Models import qualified, to_datetime
+
+PATH = "/LNetworkServer/LNetworkService.svc"
+BODY_TAG = qualified(NS_SOAP, "Body")
+
+
+class ActionProfile:
+    """
+    Поведение сервера для SOAP действия
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, drop_rate=0.0):
+        """
+        :param latency: Задержка ответа (сек.)
+        :param jitter: Случайная добавка к задержке, от 0 до jitter (сек.)
+        :param error_rate: Доля ответов с ошибкой SOAP (HTTP 500)
+        :param drop_rate: Доля запросов, на которые соединение закрывается без ответа
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+
+
+def _arguments(body: str) -> dict:
+    """
+    Параметры метода из тела запроса
+    :param body: SOAP запрос
+    :return: {Локальное имя параметра: текст}
+    """
+    method = next(iter(fromstring(body).find(BODY_TAG)))
+    return {element.tag.rsplit("}", 1)[-1]: element.text for element in method}
+
+
+class MockServer:
+    """
+    Тестовый сервер LNetworkService на aiohttp.
+    Новые события появляются со скоростью event_rate в секунду от момента запуска;
+    GetNotification удерживает запрос, пока не появятся события или не истечет notification_hold.
+
+    Пример:
+        async with MockServer(latency=0.01, profiles={"GetAcsEmployeePhoto": ActionProfile(0.05)}) as server:
+            client = AsyncNetworkClient(server.address, "user", "password", scheme=server.scheme)
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, corpus=None, latency=0.0, jitter=0.0, error_rate=0.0,
+                 drop_rate=0.0, profiles=None, event_rate=10.0, first_event_id=1000, page_limit=1000,
+                 photo_size=60000, notification_hold=9.0, notification_limit=100, ssl_context=None, seed=None):
+        """
+        :param host: Адрес для прослушивания
+        :param port: Порт, 0 - любой свободный
+        :param corpus: Набор данных ответов (Corpus)
+        :param latency: Задержка ответа по умолчанию (сек.), см. ActionProfile
+        :param jitter: Случайная добавка к задержке по умолчанию (сек.)
+        :param error_rate: Доля ответов с ошибкой по умолчанию
+        :param drop_rate: Доля обрывов соединения по умолчанию
+        :param profiles: {SOAP действие: ActionProfile} - поведение отдельных действий
+        :param event_rate: Количество новых событий в секунду
+        :param first_event_id: Идентификатор последнего события на момент запуска
+        :param page_limit: Максимальный размер страницы событий
+        :param photo_size: Размер фотографии сотрудника (байт)
+        :param notification_hold: Время удержания запроса GetNotification без новых событий (сек.)
+        :param notification_limit: Максимальное количество уведомлений в ответе
+        :param ssl_context: SSLContext для https; None - http
+        :param seed: Начальное значение генератора случайных чисел
+        """
+        self.host = host
+        self.port = port
+        self.corpus = corpus if corpus is not None else Corpus()
+        self.default = ActionProfile(latency, jitter, error_rate, drop_rate)
+        self.profiles = dict(profiles or {})  # type: {str: ActionProfile}
+        self.event_rate = event_rate
+        self.first_event_id = first_event_id
+        self.page_limit = page_limit
+        self.photo_size = photo_size
+        self.notification_hold = notification_hold
+        self.notification_limit = notification_limit
+        self.ssl_context = ssl_context
+
+        self.requests = {}  # type: {str: int}
+        self.errors = {}  # type: {str: int}
+        self.drops = {}  # type: {str: int}
+
+        self._random = random.Random(seed)
+        self._started = time.monotonic()
+        self._cursors = {}  # type: {str: int}
+        self._photo = None
+        self._runner = None  # type: web.AppRunner
+
+        self._handlers = {
+            "Connect": self._connect,
+            "Disconnect": self._disconnect,
+            "GetVariable": self._get_variable,
+            "GetLastEvent": self._get_last_event,
+            "GetEvents": self._get_events,
+            "GetFilteredEvents": self._get_filtered_events,
+            "GetNotification": self._get_notification,
+            "GetAcsEmployeePhoto": self._get_photo,
+            "GetLogMessageTypes": lambda arguments: self.corpus.message_types(),
+            "GetLogMessageSubtypes": lambda arguments: self.corpus.message_subtypes(),
+            "GetAllNets": lambda arguments: self.corpus.all_nets(),
+            "GetNetServers": lambda arguments: self.corpus.net_servers(),
+            "GetServerDriversFullInfo": lambda arguments: self.corpus.drivers_full_info(),
+        }
+
+    @property
+    def scheme(self) -> str:
+        return "http" if self.ssl_context is None else "https"
+
+    @property
+    def address(self) -> str:
+        """
+        :return: Адрес для AsyncNetworkClient (host:port)
+        """
+        return f"{self.host}:{self.port}"
+
+    @property
+    def last_event_id(self) -> int:
+        return self.first_event_id + int((time.monotonic() - self._started) * self.event_rate)
+
+    def profile(self, action) -> ActionProfile:
+        return self.profiles.get(action, self.default)
+
+    def application(self) -> web.Application:
+        application = web.Application(client_max_size=16 * 1024 * 1024)
+        application.router.add_post(PATH, self._handle)
+        return application
+
+    async def start(self):
+        self._runner = web.AppRunner(self.application(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port, ssl_context=self.ssl_context)
+        await site.start()
+
+        self.port = self._runner.addresses[0][1]
+        self._started = time.monotonic()
+        logging.info("Тестовый сервер: %s://%s%s", self.scheme, self.address, PATH)
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.stop()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        action = request.headers.get("Soapaction", "").strip('"').rsplit("/", 1)[-1]
+        body = await request.text()
+        self.requests[action] = self.requests.get(action, 0) + 1
+
+        profile = self.profile(action)
+        delay = profile.latency + self._random.uniform(0, profile.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self._random.random() < profile.drop_rate:
+            self.drops[action] = self.drops.get(action, 0) + 1
+            request.transport.close()
+            return web.Response()
+
+        handler = self._handlers.get(action)
+        if handler is None:
+            return self._fault("a:ActionNotSupported", f"Unknown action {action}")
+
+        if self._random.random() < profile.error_rate:
+            self.errors[action] = self.errors.get(action, 0) + 1
+            return self._fault("s:Server", "Injected error")
+
+        try:
+            arguments = _arguments(body)
+        except (ParseError, StopIteration, TypeError):
+            return self._fault("s:Client", "Malformed request")
+
+        result = handler(arguments)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return web.Response(text=result, content_type="text/xml", charset="utf-8")
+
+    @staticmethod
+    def _fault(code, text) -> web.Response:
+        return web.Response(status=500, text=Corpus.fault(code, text), content_type="text/xml", charset="utf-8")
+
+    def _connect(self, arguments) -> str:
+        session_id = str(uuid.uuid4())
+        self._cursors[session_id] = self.last_event_id
+        return self.corpus.connect(session_id)
+
+    def _disconnect(self, arguments) -> str:
+        return self.corpus.disconnect()
+
+    def _get_variable(self, arguments) -> str:
+        return self.corpus.variable("Version", "1.0.0.0")
+
+    def _get_last_event(self, arguments) -> str:
+        return self.corpus.last_event(self.last_event_id)
+
+    def _page(self, arguments):
+        page_number = int(arguments.get("pageNumber") or 0)
+        page_size = min(int(arguments.get("pageSize") or self.page_limit), self.page_limit)
+        return page_number, page_size
+
+    def _get_events(self, arguments) -> str:
+        page_number, page_size = self._page(arguments)
+        first = int(arguments.get("fromMessageId") or 0) + 1 + page_number * page_size
+        count = max(0, min(page_size, self.last_event_id - first + 1))
+        return self.corpus.events(count, first)
+
+    def _get_filtered_events(self, arguments) -> str:
+        page_number, page_size = self._page(arguments)
+        first = int(arguments.get("fromMessageId") or 0) + 1
+        last = self.last_event_id
+
+        # Время событий набора растет с идентификатором, поэтому период переводится в диапазон идентификаторов
+        step = (self.corpus.event_date(1) - self.corpus.event_date(0)).total_seconds()
+        if arguments.get("fromDateTime") and not arguments["fromDateTime"].startswith("0001"):
+            start = to_datetime(arguments["fromDateTime"]).replace(tzinfo=None)
+            first = max(first, int(-(-(start - self.corpus.start).total_seconds() // step)))
+        if arguments.get("toDateTime") and not arguments["toDateTime"].startswith("9999"):
+            end = to_datetime(arguments["toDateTime"]).replace(tzinfo=None)
+            last = min(last, int((end - self.corpus.start).total_seconds() // step))
+
+        total = max(0, last - first + 1)
+        offset = page_number * page_size
+        count = max(0, min(page_size, total - offset))
+        if arguments.get("sortOrder") == "Descending":
+            return self.corpus.events(count, last - offset, method="GetFilteredEvents", descending=True)
+        return self.corpus.events(count, first + offset, method="GetFilteredEvents")
+
+    async def _get_notification(self, arguments) -> str:
+        session_id = arguments.get("connectionId")
+        cursor = self._cursors.get(session_id, self.last_event_id)
+
+        expires = time.monotonic() + self.notification_hold
+        while self.last_event_id <= cursor and time.monotonic() < expires:
+            await asyncio.sleep(min(0.05, max(0.0, expires - time.monotonic())))
+
+        count = min(self.last_event_id - cursor, self.notification_limit)
+        self._cursors[session_id] = cursor + count
+        return self.corpus.notifications(count, cursor + 1)
+
+    def _get_photo(self, arguments) -> str:
+        if self._photo is None:
+            self._photo = self.corpus.photo(self.photo_size)
+        return self._photo
+
+
+def _profiles(values) -> dict:
+    """
+    :param values: Строки вида Действие=задержка[,доля ошибок[,доля обрывов]]
+    :return: {SOAP действие: ActionProfile}
+    """
+    profiles = {}
+    for value in values or ():
+        action, _, settings = value.partition("=")
+        numbers = [float(number) for number in settings.split(",") if number]
+        latency, error_rate, drop_rate = (numbers + [0.0, 0.0, 0.0])[:3]
+        profiles[action] = ActionProfile(latency, 0.0, error_rate, drop_rate)
+    return profiles
+
+
+def arguments_parser(add_help=True) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Тестовый сервер LNetworkService", add_help=add_help)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, сек.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, сек.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов с ошибкой SOAP")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="доля обрывов соединения")
+    parser.add_argument("--profile", action="append", metavar="ACTION=LATENCY[,ERRORS[,DROPS]]",
+                        help="поведение отдельного действия, например GetAcsEmployeePhoto=0.1,0.01")
+    parser.add_argument("--event-rate", type=float, default=10.0, help="новых событий в секунду")
+    parser.add_argument("--page-limit", type=int, default=1000, help="максимальный размер страницы событий")
+    parser.add_argument("--photo-size", type=int, default=60000, help="размер фотографии, байт")
+    parser.add_argument("--notification-hold", type=float, default=9.0, help="удержание GetNotification, сек.")
+    parser.add_argument("--employees", type=int, default=200, help="сотрудников в наборе")
+    parser.add_argument("--drivers", type=int, default=50, help="устройств в наборе")
+    return parser
+
+
+def server_from_arguments(arguments, **kwargs) -> MockServer:
+    return MockServer(
+        host=arguments.host,
+        port=arguments.port,
+        corpus=Corpus(arguments.employees, arguments.drivers),
+        latency=arguments.latency,
+        jitter=arguments.jitter,
+        error_rate=arguments.error_rate,
+        drop_rate=arguments.drop_rate,
+        profiles=_profiles(arguments.profile),
+        event_rate=arguments.event_rate,
+        page_limit=arguments.page_limit,
+        photo_size=arguments.photo_size,
+        notification_hold=arguments.notification_hold,
+        **kwargs
+    )
+
+
+async def serve(server: MockServer):
+    async with server:
+        print(f"{server.scheme}://{server.address}{PATH}")
+        await asyncio.Event().wait()
+
+
+def main():
+    try:
+        asyncio.run(serve(server_from_arguments(arguments_parser().parse_args())))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
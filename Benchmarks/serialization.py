@@ -0,0 +1,70 @@
+"""
+Сравнение скорости формирования SOAP запросов:
+прежний путь (JSON шаблон + minidom + xml_creator) против скомпилированных шаблонов.
+
+Запуск: python -m Benchmarks.serialization
+"""
+import timeit
+import uuid
+from json import loads
+
+from RusGuardClient import Decoder
+from RusGuardClient.envelope import TEMPLATE_DIR, load_templates
+from RusGuardClient.xml_creator import xml_document
+
+USERNAME = "operator"
+PASSWORD = "secret"
+CLIENT_UUID = str(uuid.uuid4())
+
+CASES = {
+    "GetEvents": ("GetEvents", "fromMessageId", 603927),
+    "GetNotification": ("GetNotification", "connectionId", str(uuid.uuid4())),
+    "GetAcsEmployeePhoto": ("GetAcsEmployeePhoto", "employeeId", str(uuid.uuid4())),
+}
+
+
+def legacy_request(name, key, value, count=1) -> bytes:
+    """
+    Формирование запроса так, как это делалось до появления шаблонов
+    """
+    with open(TEMPLATE_DIR / f"{name}.json", 'r') as file:
+        json_file = loads(file.read())
+
+    json_file[name][key] = value
+
+    xml_root = xml_document()
+    xml_root.xml_timestamp()
+    xml_root.xml_usernametoken(USERNAME, PASSWORD, f"uuid-{CLIENT_UUID}-{count}")
+    data = xml_root.xml_simple(
+        Decoder.JsonToXML(json_file)
+    )
+
+    return data.toxml().encode()
+
+
+def compiled_request(name, key, value, count=1) -> bytes:
+    return load_templates().render(
+        name, USERNAME, PASSWORD, f"uuid-{CLIENT_UUID}-{count}", **{key: value}
+    )
+
+
+def measure(function, *args, number=2000, repeat=5) -> float:
+    """
+    :return: Количество запросов в секунду (лучший из повторов)
+    """
+    best = min(timeit.repeat(lambda: function(*args), number=number, repeat=repeat))
+    return number / best
+
+
+def main():
+    load_templates()
+
+    print(f"{'Запрос':<22}{'было, req/s':>14}{'стало, req/s':>15}{'ускорение':>12}")
+    for title, (name, key, value) in CASES.items():
+        legacy = measure(legacy_request, name, key, value)
+        compiled = measure(compiled_request, name, key, value)
+        print(f"{title:<22}{legacy:>14.0f}{compiled:>15.0f}{compiled / legacy:>11.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+Набор замеров разбора ответов и формирования запросов с проверкой на ухудшение.
+
+Для каждого замера считаются операции в секунду и пиковый объем памяти (tracemalloc) одного вызова.
+Результаты сравниваются с сохраненной базой (Benchmarks/baseline.json): если скорость снизилась
+или память выросла больше допустимого, программа завершается с кодом 1.
+Скорость сравнивается в пересчете на калибровочный замер, выполняемый перед каждым замером,
+чтобы база, записанная на другой машине, оставалась применимой, а колебания нагрузки машины
+меньше влияли на результат.
+
+Запуск: python -m Benchmarks.suite [--filter GetEvents] [--threshold 0.20] [--update-baseline]
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from json import loads
+from pathlib import Path
+from xml.etree.ElementTree import fromstring
+
+from Benchmarks.corpus import Corpus
+from Benchmarks.serialization import compiled_request, legacy_request
+from RusGuardClient import Decoder
+from RusGuardClient.envelope import TEMPLATE_DIR
+
+BASELINE = Path(__file__).with_name("baseline.json")
+CHUNK_SIZE = 65536
+
+# Минимальный прирост памяти, который считается ухудшением (байт): мелкие замеры шумят сильнее
+MEMORY_SLACK = 16 * 1024
+
+
+def _chunks(document: str, size=CHUNK_SIZE) -> [bytes]:
+    data = document.encode()
+    return [data[index:index + size] for index in range(0, len(data), size)]
+
+
+def _stream_events(chunks):
+    decoder = Decoder.EventStream()
+    count = 0
+    for chunk in chunks:
+        count += len(decoder.feed(chunk))
+    return count + len(decoder.close())
+
+
+def _stream_photo(chunks):
+    decoder = Decoder.PhotoStream()
+    for chunk in chunks:
+        decoder.feed(chunk)
+    return decoder.close()
+
+
+def _template(name) -> dict:
+    with open(TEMPLATE_DIR / f"{name}.json", "r") as file:
+        return loads(file.read())
+
+
+def cases(quick=False) -> dict:
+    """
+    Замеры: {Имя: (функция, аргументы)}. Документы строятся один раз, до замеров.
+    :param quick: Без самых больших документов
+    """
+    corpus = Corpus()
+    sizes = (10, 1000) if quick else (10, 1000, 10000)
+    photo_sizes = (256 * 1024,) if quick else (256 * 1024, 4 * 1024 * 1024)
+
+    result = {}
+    for count in sizes:
+        page = corpus.events(count)
+        result[f"decode.GetEvents[{count}]"] = (Decoder.GetEvents, page)
+        result[f"decode.EventStream[{count}]"] = (_stream_events, _chunks(page))
+        result[f"decode.GetNotification[{count}]"] = (Decoder.GetNotification, corpus.notifications(count))
+
+    for count in (50, 1000):
+        result[f"decode.GetServerDriversFullInfo[{count}]"] = (
+            Decoder.GetServerDriversFullInfo, Corpus(drivers=count).drivers_full_info()
+        )
+
+    for size in photo_sizes:
+        photo = corpus.photo(size)
+        result[f"decode.GetAcsEmployeePhoto[{size // 1024}KiB]"] = (Decoder.GetAcsEmployeePhoto, photo)
+        result[f"decode.PhotoStream[{size // 1024}KiB]"] = (_stream_photo, _chunks(photo))
+
+    for name in ("GetEvents", "GetFilteredEvents"):
+        result[f"encode.JsonToXML[{name}]"] = (lambda template: Decoder.JsonToXML(template).toxml(), _template(name))
+
+    result["encode.xml_document[GetEvents]"] = (legacy_request, "GetEvents", "fromMessageId", 603927)
+    result["encode.template[GetEvents]"] = (compiled_request, "GetEvents", "fromMessageId", 603927)
+    result["encode.template[GetFilteredEvents]"] = (compiled_request, "GetFilteredEvents", "fromMessageId", 603927)
+    return result
+
+
+CALIBRATION_DOCUMENT = Corpus(seed=7).events(20)
+
+
+def _calibration_workload():
+    root = fromstring(CALIBRATION_DOCUMENT)
+    return sorted(element.tag.rsplit("}", 1)[-1] for element in root.iter())
+
+
+def calibrate(min_time=0.1, repeat=3) -> float:
+    """
+    Скорость машины: операции в секунду на фиксированной смеси разбора XML и работы со строками
+    """
+    return measure(_calibration_workload, min_time=min_time, repeat=repeat)
+
+
+def measure(function, *args, min_time=0.2, repeat=5) -> float:
+    """
+    Как и timeit, сборщик мусора на время замера отключается
+    :return: Операций в секунду (лучший из повторов)
+    """
+    enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        return _measure(function, *args, min_time=min_time, repeat=repeat)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _measure(function, *args, min_time, repeat) -> float:
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            function(*args)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            function(*args)
+        best = min(best, time.perf_counter() - started)
+
+    return number / best
+
+
+def peak_memory(function, *args) -> int:
+    """
+    :return: Пиковый объем памяти, выделенной за один вызов (байт)
+    """
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = function(*args)
+        peak = tracemalloc.get_traced_memory()[1] - before
+        del result
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_case(function, *args, min_time=0.2, repeat=5) -> dict:
+    """
+    Замер с калибровкой до и после
+    :return: {"ops", "score" - ops в пересчете на калибровку, "peak", "calibration"}
+    """
+    calibration = calibrate()
+    ops = measure(function, *args, min_time=min_time, repeat=repeat)
+    calibration = (calibration + calibrate()) / 2
+
+    return {
+        "ops": ops,
+        "score": ops / calibration,
+        "peak": peak_memory(function, *args),
+        "calibration": calibration,
+    }
+
+
+def run(selected, min_time=0.2, repeat=5) -> dict:
+    results = {}
+    for name, (function, *args) in selected.items():
+        results[name] = run_case(function, *args, min_time=min_time, repeat=repeat)
+        print(f"  {name:<42}{results[name]['ops']:>12.1f} op/s{results[name]['peak'] / 1024:>12.0f} KiB",
+              file=sys.stderr)
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cases": results,
+    }
+
+
+def slower(current, baseline, threshold) -> [str]:
+    """
+    :return: Имена замеров, скорость которых снизилась больше допустимого
+    """
+    names = []
+    for name, result in current["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is not None and result["score"] / base["score"] - 1 < -threshold:
+            names.append(name)
+    return names
+
+
+def compare(current, baseline, threshold, memory_threshold) -> [str]:
+    """
+    Сравнение с базой
+    :param current: Результаты run
+    :param baseline: Сохраненные результаты
+    :param threshold: Допустимое снижение скорости (доля)
+    :param memory_threshold: Допустимый рост памяти (доля)
+    :return: Список ухудшений
+    """
+    regressions = []
+    print(f"{'Замер':<44}{'op/s':>12}{'скорость':>10}{'KiB':>10}{'память':>9}")
+    for name, result in current["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            print(f"{name:<44}{result['ops']:>12.1f}{'новый':>10}{result['peak'] / 1024:>10.0f}{'':>9}")
+            continue
+
+        speed = result["score"] / base["score"] - 1
+        memory = (result["peak"] - base["peak"]) / base["peak"] if base["peak"] else 0.0
+        print(f"{name:<44}{result['ops']:>12.1f}{speed:>+10.1%}{result['peak'] / 1024:>10.0f}{memory:>+9.1%}")
+
+        if speed < -threshold:
+            regressions.append(f"{name}: скорость {speed:+.1%} (допустимо -{threshold:.0%})")
+        if memory > memory_threshold and result["peak"] - base["peak"] > MEMORY_SLACK:
+            regressions.append(f"{name}: память {memory:+.1%} (допустимо +{memory_threshold:.0%})")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры разбора ответов и формирования запросов")
+    parser.add_argument("--filter", default="", help="только замеры, имя которых содержит строку")
+    parser.add_argument("--baseline", type=Path, default=BASELINE, help="файл базы")
+    parser.add_argument("--update-baseline", action="store_true", help="сохранить результаты как базу")
+    parser.add_argument("--threshold", type=float, default=0.20, help="допустимое снижение скорости")
+    parser.add_argument("--memory-threshold", type=float, default=0.10, help="допустимый рост памяти")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="повторных замеров при снижении скорости (учитывается лучший результат)")
+    parser.add_argument("--quick", action="store_true", help="без самых больших документов")
+    arguments = parser.parse_args()
+
+    selected = {name: case for name, case in cases(arguments.quick).items() if arguments.filter in name}
+    if not selected:
+        parser.error(f"нет замеров, содержащих {arguments.filter!r}")
+
+    # Число повторов не зависит от --quick: лучший из большего числа повторов систематически выше
+    min_time, repeat = 0.2, 5
+    current = run(selected, min_time, repeat)
+
+    baseline = {}
+    if arguments.baseline.exists():
+        baseline = json.loads(arguments.baseline.read_text(encoding="utf-8"))
+
+    # Снижение скорости перепроверяется: случайная нагрузка машины, в отличие от ухудшения кода, не повторяется
+    for _ in range(0 if arguments.update_baseline else arguments.retries):
+        names = slower(current, baseline, arguments.threshold)
+        if not names:
+            break
+        print(f"Повторный замер: {', '.join(names)}", file=sys.stderr)
+        for name in names:
+            function, *args = selected[name]
+            result = run_case(function, *args, min_time=min_time, repeat=repeat)
+            if result["score"] > current["cases"][name]["score"]:
+                current["cases"][name] = result
+
+    regressions = compare(current, baseline, arguments.threshold, arguments.memory_threshold)
+
+    if arguments.update_baseline:
+        # Замеры, не вошедшие в запуск (--filter, --quick), в базе сохраняются
+        merged = dict(baseline.get("cases", {}))
+        merged.update(current["cases"])
+        current["cases"] = dict(sorted(merged.items()))
+        arguments.baseline.write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+        print(f"База сохранена: {arguments.baseline}")
+        return
+
+    if regressions:
+        print("\nУхудшения:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+    if baseline:
+        print("\nУхудшений нет")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,32 @@
 import asyncio
 import base64
 import concurrent.futures
+import contextlib
+import heapq
 import logging
+import time
 import uuid
-from json import loads
-from pathlib import Path
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from itertools import chain
 
-import requests
-import urllib3
 import aiohttp
 
-from datetime import datetime, timedelta
-
 from RusGuardClient import Decoder
-from RusGuardClient.Models import LogMessage
-from RusGuardClient.xml_creator import xml_document
+from RusGuardClient.Models import PASSAGE_SUBTYPES, LogMessage
+from RusGuardClient.columnar import EventBatch
+from RusGuardClient.deadline import IDEMPOTENT_ACTIONS, LatencyTracker, RetryPolicy, first_successful, remaining
+from RusGuardClient.envelope import load_templates
+from RusGuardClient.follower import EventFollower
+from RusGuardClient.metadata_cache import MetadataCache, cached
+from RusGuardClient.metrics import Metrics
+from RusGuardClient.notifications import NotificationEngine
+from RusGuardClient.photo_cache import PhotoCache
+from RusGuardClient.query import EventQuery
+from RusGuardClient.singleflight import SingleFlight, coalesce
+from RusGuardClient.store import EventStore
+from RusGuardClient.topology import DriverTopology
 
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 logging.basicConfig(format='[%(asctime)s] NetworkClient: %(message)s', datefmt='%d/%b/%y %H:%M:%S', level=logging.INFO)
 
 
@@ -29,78 +39,408 @@ class AsyncNetworkClient:
     _username = str
     _password = str
 
-    _template_dir = "./RusGuardClient/Templates"
-
-    def __init__(self, host, username, password):
-        self._url = f"https://{host}/LNetworkServer/LNetworkService.svc"
+    _session = None  # type: aiohttp.ClientSession
+    store = None  # type: EventStore
+    photo_cache = None  # type: PhotoCache
+    metadata_cache = None  # type: MetadataCache
+    metrics = None  # type: Metrics
+    tracer = None  # type: TransportTracer
+    _topologies = None  # type: {object: DriverTopology}
+    _limiter = None
+
+    def __init__(self, host, username, password, limit=100, limit_per_host=10, keepalive_timeout=60, store=None,
+                 photo_cache=None, metadata_cache=None, limiter=None, retry=None, hedge_percentile=None,
+                 metrics=None, tracer=None, scheme="https"):
+        """
+        :param host: Адрес сервера RusGuard
+        :param username: Имя пользователя
+        :param password: Пароль
+        :param limit: Максимальное количество одновременных соединений в пуле
+        :param limit_per_host: Максимальное количество соединений к одному хосту
+        :param keepalive_timeout: Время жизни простаивающего соединения в пуле (сек.)
+        :param store: Локальное хранилище событий (EventStore или путь к файлу базы),
+                      в которое сохраняются полученные события
+        :param photo_cache: Кэш фотографий сотрудников, по умолчанию PhotoCache("./EmployeePhoto")
+        :param metadata_cache: Кэш справочных данных (MetadataCache), по умолчанию - в памяти;
+                               False - без кэширования
+        :param limiter: Асинхронный контекстный менеджер, ограничивающий одновременные запросы
+                        (кроме GetNotification), см. ClientPool
+        :param retry: Политика повторов идемпотентных запросов (RetryPolicy), по умолчанию 3 попытки
+        :param hedge_percentile: Процентиль времени ответа (например, 0.95), после которого
+                                 идемпотентный запрос дублируется; None - без дублирования
+        :param metrics: Показатели запросов по SOAP действиям (Metrics), по умолчанию - новый экземпляр
+        :param tracer: Трассировка фаз HTTP запросов (TransportTracer); None - без трассировки
+        :param scheme: Протокол подключения: https или http (например, для локального тестового сервера)
+        """
+        if scheme not in ("https", "http"):
+            raise ValueError(f"Неподдерживаемый протокол: {scheme}")
+        self._url = f"{scheme}://{host}/LNetworkServer/LNetworkService.svc"
         self._client_uuid = str(uuid.uuid4())
 
         self._username = username
         self._password = password
-        self._loop = asyncio.get_event_loop()
 
-        self._connect()
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+
+        self._templates = load_templates()
+        self._flights = SingleFlight()
+
+        if store is not None and not isinstance(store, EventStore):
+            store = EventStore(store)
+        self.store = store
+        self.photo_cache = photo_cache if photo_cache is not None else PhotoCache()
+        if metadata_cache is None:
+            metadata_cache = MetadataCache()
+        self.metadata_cache = metadata_cache if metadata_cache is not False else None
+        self._limiter = limiter
+
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.hedge_percentile = hedge_percentile
+        self.latency = LatencyTracker()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.tracer = tracer
+        self._topologies = {}
+
+    @classmethod
+    async def create(cls, host, username, password, **kwargs):
+        """
+        Создает клиента и подключается к серверу
+        :param host: Адрес сервера RusGuard
+        :param username: Имя пользователя
+        :param password: Пароль
+        :param kwargs: Параметры пула соединений, см. __init__
+        :return: Подключенный клиент
+        """
+        client = cls(host, username, password, **kwargs)
+        await client._connect_or_close()
+        return client
 
-    async def _socket(self, soapaction, data, timeout=15):
+    @property
+    def connected(self) -> bool:
+        return self._session_uuid is not str
+
+    async def __aenter__(self):
+        if not self.connected:
+            await self._connect_or_close()
+        return self
+
+    async def _connect_or_close(self):
+        """
+        Подключение; при ошибке пул соединений закрывается, так как __aexit__ не будет вызван
+        :return:
+        """
+        try:
+            await self.connect()
+        except BaseException:
+            await self._close_session()
+            raise
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    async def _open_session(self) -> aiohttp.ClientSession:
+        """
+        Открывает пул соединений с сервером, если он еще не открыт.
+        Соединения переиспользуются (keep-alive) между всеми запросами клиента.
+        :return: Сессия aiohttp
+        """
+        if self._session is None or self._session.closed:
+            http_connector = aiohttp.TCPConnector(
+                ssl=False,
+                limit=self._limit,
+                limit_per_host=self._limit_per_host,
+                keepalive_timeout=self._keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=http_connector,
+                headers={
+                    'Content-Type': 'text/xml; charset=utf-8',
+                    'Accept-Encoding': 'gzip, deflate'
+                },
+                trace_configs=[self.tracer.trace_config()] if self.tracer is not None else None
+            )
+
+        return self._session
+
+    async def _close_session(self):
+        """
+        Закрывает пул соединений
+        :return:
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+        self._session = None
+
+    def _limited(self, soapaction):
+        # Длинный опрос уведомлений не ограничивается, иначе он занимал бы место обычных запросов
+        if self._limiter is None or soapaction.endswith("/GetNotification"):
+            return contextlib.nullcontext()
+        return self._limiter
+
+    async def _post(self, soapaction, data, timeout):
+        """
+        Однократная отправка запроса
+        :param soapaction: SOAP действие
+        :param data: Тело запроса
+        :param timeout: Время ожидания ответа (сек.)
+        :return: Текст ответа
+        """
         headers = {
-            'Content-Type': 'text/xml; charset=utf-8',
-            'Soapaction': '"' + soapaction + '"',
-            'Accept-Encoding': 'gzip, deflate'
+            'Soapaction': '"' + soapaction + '"'
         }
+        started = time.perf_counter()
+        received = 0
+        failure = None
 
         try:
-            http_connector = aiohttp.TCPConnector(verify_ssl=False)
+            session = await self._open_session()
             http_timeout = aiohttp.ClientTimeout(total=timeout)
 
-            async with aiohttp.ClientSession(connector=http_connector, headers=headers,
-                                             timeout=http_timeout) as session:
-                async with session.post(self._url, data=data.encode()) as response:
+            async with self._limited(soapaction):
+                # Ожидание в очереди ограничителя площадки не входит во время ответа сервера
+                started = time.perf_counter()
+                async with session.post(self._url, data=data, headers=headers, timeout=http_timeout,
+                                        trace_request_ctx={"action": soapaction.rsplit("/", 1)[-1]}) as response:
+                    received = len(await response.read())
+
                     if response.status == 500:
                         text = await response.text()
                         fault = Decoder.ErrorDecode(text)
                         logging.error("%s - %s", fault['faultcode'], fault['faultstring'])
+                        failure = "fault"
                         raise SystemError
 
-                    if response.status == 200:
-                        text = await response.text()
-                        return text
+                    if response.status != 200:
+                        failure = "status"
+                        logging.error("Неожиданный ответ сервера %s: HTTP %s", self._url, response.status)
+                        raise ConnectionError(f"{self._url}: HTTP {response.status}")
+
+                    text = await response.text()
+                    return text
         except concurrent.futures.TimeoutError:
+            failure = "timeout"
             raise TimeoutError
 
-        except requests.ConnectionError:
+        except aiohttp.ClientConnectionError as error:
+            failure = "connection"
             logging.error("Ошибка подключения к серверу: %s", self._url)
-            exit(500)
-
-    def _secure_header(self, count):
-        xml_root = xml_document()
-        xml_root.xml_timestamp()
-        xml_root.xml_usernametoken(
-            self._username,
-            self._password,
-            f"uuid-{self._client_uuid}-{count}"
+            raise ConnectionError(f"{self._url}: {error}") from error
+
+        except asyncio.CancelledError:
+            failure = "cancelled"
+            raise
+
+        except BaseException as error:
+            if failure is None:
+                failure = type(error).__name__
+            raise
+
+        finally:
+            self.metrics.request(
+                soapaction.rsplit("/", 1)[-1], time.perf_counter() - started, len(data), received, failure
+            )
+
+    async def _timed(self, soapaction, request, timeout):
+        started = time.monotonic()
+        result = await request(timeout)
+        self.latency.record(soapaction, time.monotonic() - started)
+        return result
+
+    async def _hedged(self, soapaction, request, timeout):
+        """
+        Запрос с дублированием: если ответ не получен за время, заданное процентилем
+        hedge_percentile, отправляется повторный запрос и используется первый полученный ответ
+        """
+        delay = self.latency.percentile(soapaction, self.hedge_percentile)
+        primary = asyncio.ensure_future(self._timed(soapaction, request, timeout))
+        if delay is None or (timeout is not None and delay >= timeout):
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        logging.info("Нет ответа за %.3f сек., запрос %s продублирован", delay, soapaction.rsplit("/", 1)[-1])
+        secondary = asyncio.ensure_future(
+            self._timed(soapaction, request, None if timeout is None else timeout - delay)
         )
+        return await first_successful({primary, secondary})
+
+    async def _call(self, soapaction, request, timeout=15, repeatable=True):
+        """
+        Выполнение запроса в пределах срока текущего блока deadline.
+        Идемпотентные запросы повторяются при ошибке соединения или таймауте
+        согласно политике retry и при необходимости дублируются (hedge_percentile).
+        :param soapaction: SOAP действие
+        :param request: Функция request(timeout), возвращающая корутину одной попытки запроса
+        :param timeout: Время ожидания ответа на одну попытку (сек.)
+        :param repeatable: Запрос допускает повтор и дублирование
+        :return: Результат запроса
+        """
+        idempotent = repeatable and soapaction.rsplit("/", 1)[-1] in IDEMPOTENT_ACTIONS
+        attempts = self.retry.attempts if idempotent else 1
+
+        for attempt in range(attempts):
+            budget = remaining(timeout)
+            try:
+                if idempotent and self.hedge_percentile is not None:
+                    return await self._hedged(soapaction, request, budget)
+                return await self._timed(soapaction, request, budget)
+            except (ConnectionError, TimeoutError) as error:
+                if attempt + 1 >= attempts:
+                    raise
+
+                delay = self.retry.delay(attempt)
+                left = remaining(None)
+                if left is not None and left <= delay:
+                    raise
+                logging.info("Повтор запроса %s через %.2f сек. (%r)", soapaction.rsplit("/", 1)[-1], delay, error)
+                await asyncio.sleep(delay)
 
-        return xml_root
+    async def _socket(self, soapaction, data, timeout=15):
+        """
+        Отправка запроса, см. _call
+        :param soapaction: SOAP действие
+        :param data: Тело запроса
+        :param timeout: Время ожидания ответа на одну попытку (сек.)
+        :return: Текст ответа
+        """
+        return await self._call(soapaction, lambda budget: self._post(soapaction, data, budget), timeout)
 
-    def _connect(self):
+    async def _stream(self, soapaction, data, timeout=15, chunk_size=65536):
+        """
+        Отправка запроса с потоковым чтением ответа.
+        Таймаут ограничивает ожидание каждой части ответа, а не весь ответ,
+        чтобы медленный обработчик не прерывал загрузку.
+        :param soapaction: SOAP действие
+        :param data: Тело запроса
+        :param timeout: Время ожидания очередной части ответа (сек.)
+        :param chunk_size: Размер читаемой части ответа
+        :return: Асинхронный генератор частей ответа
+        """
+        headers = {
+            'Soapaction': '"' + soapaction + '"'
+        }
+        trace_context = {"action": soapaction.rsplit("/", 1)[-1]}
+        # Время обработки частей вызывающим кодом во время запроса не учитывается
+        started = time.perf_counter()
+        paused = 0.0
+        received = 0
+        failure = None
+
+        try:
+            session = await self._open_session()
+            timeout = remaining(timeout)
+            http_timeout = aiohttp.ClientTimeout(
+                total=remaining(None), sock_connect=timeout, sock_read=timeout
+            )
+
+            async with self._limited(soapaction):
+                # Ожидание в очереди ограничителя площадки не входит во время ответа сервера
+                started = time.perf_counter()
+                async with session.post(self._url, data=data, headers=headers, timeout=http_timeout,
+                                        trace_request_ctx=trace_context) as response:
+                    if response.status == 500:
+                        text = await response.text()
+                        received = len(await response.read())
+                        fault = Decoder.ErrorDecode(text)
+                        logging.error("%s - %s", fault['faultcode'], fault['faultstring'])
+                        failure = "fault"
+                        raise SystemError
+
+                    # Тело ответа с другим кодом (например, от прокси-сервера) декодеру не передается
+                    if response.status != 200:
+                        failure = "status"
+                        logging.error("Неожиданный ответ сервера %s: HTTP %s", self._url, response.status)
+                        raise ConnectionError(f"{self._url}: HTTP {response.status}")
+
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        received += len(chunk)
+                        if "trace" in trace_context:
+                            trace_context["trace"].receive(len(chunk))
+                        mark = time.perf_counter()
+                        yield chunk
+                        paused += time.perf_counter() - mark
+        except concurrent.futures.TimeoutError:
+            failure = "timeout"
+            raise TimeoutError
+
+        except aiohttp.ClientConnectionError as error:
+            failure = "connection"
+            logging.error("Ошибка подключения к серверу: %s", self._url)
+            raise ConnectionError(f"{self._url}: {error}") from error
+
+        except (asyncio.CancelledError, GeneratorExit):
+            failure = "cancelled"
+            raise
+
+        except BaseException as error:
+            if failure is None:
+                failure = type(error).__name__
+            raise
+
+        finally:
+            self.metrics.request(
+                soapaction.rsplit("/", 1)[-1], time.perf_counter() - started - paused, len(data), received, failure
+            )
+
+    async def _remember(self, messages):
+        """
+        Сохранение полученных событий в локальное хранилище (вне цикла событий)
+        :param messages: Список LogMessage
+        :return: Тот же список
+        """
+        if self.store is not None and messages:
+            await asyncio.to_thread(self.store.add, messages)
+        return messages
+
+    def _envelope(self, name, **values) -> bytes:
+        """
+        Формирует SOAP запрос по скомпилированному шаблону
+        :param name: Имя шаблона
+        :param values: Значения слотов шаблона
+        :return: Тело запроса
+        """
+        with self.metrics.measure("encode", self._templates.template(name).method):
+            return self._templates.render(
+                name,
+                self._username,
+                self._password,
+                f"uuid-{self._client_uuid}-{self._request_count + 1}",
+                **values
+            )
+
+    def _decode(self, soapaction, decoder, response):
+        """
+        Разбор ответа с учетом времени разбора в показателях
+        :param soapaction: SOAP действие
+        :param decoder: Функция разбора из Decoder
+        :param response: Текст ответа
+        :return: Результат разбора
+        """
+        with self.metrics.measure("decode", soapaction.rsplit("/", 1)[-1]):
+            return decoder(response)
+
+    async def connect(self):
         """
         Подключение к сервру и получение токена авторизации
         :return: type: uuid
         """
         soapaction = "http://www.rusguardsecurity.ru/ILNetworkService/Connect"
-        xml_root = self._secure_header(self._request_count + 1)
-        data = xml_root.xml_method(
-            "Connect",
-            {"xmlns": "http://www.rusguardsecurity.ru"}
-        )
+        data = self._envelope("Connect")
 
         logging.info("Попытка подключения к серверу.")
-        response = self._loop.run_until_complete(
-            self._socket(soapaction, data.toxml())
-        )
+        response = await self._socket(soapaction, data)
 
         try:
-            self._session_uuid = Decoder.ConnectionDecode(response)
+            self._session_uuid = self._decode(soapaction, Decoder.ConnectionDecode, response)
             self._request_count += 1
             logging.info("Авторизация прошла успешно.")
             logging.info("SessionID - %s", self._session_uuid)
@@ -108,45 +448,39 @@ class AsyncNetworkClient:
         except ValueError:
             logging.error("Ошибка получения токена авторизации")
 
-    def disconnect(self):
+    async def disconnect(self):
         """
         Завершаем сеанс с сервером
         :return:
         """
 
         soapaction = "http://www.rusguardsecurity.ru/ILNetworkService/Disconnect"
-        xml_root = self._secure_header(self._request_count + 1)
-
-        data = xml_root.xml_method("Disconnect", {"xmlns": "http://www.rusguardsecurity.ru"})
-        self._loop.run_until_complete(
-            self._socket(soapaction, data.toxml())
-        )
+        data = self._envelope("Disconnect")
+        try:
+            await self._socket(soapaction, data)
+        finally:
+            self._session_uuid = str
+            await self._close_session()
         logging.info("Соединение с сервером разорвано.")
 
-    def get_version(self):
+    @coalesce
+    async def get_version(self):
         """
         Запрос для получения версии сервера
         :return:
         """
         soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetVariable"
 
-        with open(f"{self._template_dir}/GetVersion.json", 'r') as file:
-            json_file = loads(file.read())
-
-        xml_root = self._secure_header(self._request_count + 1)
-        data = xml_root.xml_simple(
-            Decoder.JsonToXML(json_file)
-        )
+        data = self._envelope("GetVersion")
 
-        response = self._loop.run_until_complete(
-            self._socket(soapaction, data.toxml())
-        )
+        response = await self._socket(soapaction, data)
         self._request_count += 1
-        key, value = Decoder.GetVariable(response)
+        key, value = self._decode(soapaction, Decoder.GetVariable, response)
         logging.info("Версия сервера: %s", value)
 
         return value
 
+    @coalesce
     async def get_last_event(self) -> LogMessage:
         """
         Запрос на получение идентификатора последнего события сервера
@@ -154,16 +488,10 @@ class AsyncNetworkClient:
         """
         soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetLastEvent"
 
-        with open(f"{self._template_dir}/GetLastEvent.json", 'r') as file:
-            json_file = loads(file.read())
-
-        xml_root = self._secure_header(self._request_count + 1)
-        data = xml_root.xml_simple(
-            Decoder.JsonToXML(json_file)
-        )
+        data = self._envelope("GetLastEvent")
 
-        response = await self._socket(soapaction, data.toxml())
-        event = Decoder.GetLastEvent(response)
+        response = await self._socket(soapaction, data)
+        event = self._decode(soapaction, Decoder.GetLastEvent, response)
 
         logging.info("ID Последнего события %s", event.Id)
         logging.info("[%s] %s", event.Message, event.Details)
@@ -171,134 +499,421 @@ class AsyncNetworkClient:
         self._request_count += 1
         return event
 
-    async def get_events(self, last_event_id=None):
+    @coalesce
+    async def get_events(self, last_event_id=None, as_batch=False):
         """
         Возвращает все события произошедшие на сервере
         :param last_event_id: Идентификатор последнего сообщения
+        :param as_batch: Вернуть события в столбцовом виде (EventBatch, требуется numpy)
         :return:
         """
         soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetEvents"
 
-        with open(f"{self._template_dir}/GetEvents.json", 'r') as file:
-            json_file = loads(file.read())
+        if as_batch:
+            return await self._collect_batch(self.stream_events(last_event_id))
 
         if last_event_id is None:
             event = await self.get_last_event()
             last_event_id = event.Id
 
-        json_file['GetEvents']['fromMessageId'] = last_event_id
-
-        xml_root = self._secure_header(self._request_count + 1)
-        data = xml_root.xml_simple(
-            Decoder.JsonToXML(json_file)
+        data = self._envelope(
+            "GetEvents",
+            fromMessageId=last_event_id
         )
 
-        response = await self._socket(soapaction, data.toxml())
+        response = await self._socket(soapaction, data)
         self._request_count += 1
 
-        return Decoder.GetEvents(response)
+        return await self._remember(self._decode(soapaction, Decoder.GetEvents, response))
 
-    async def get_notification(self):
+    @coalesce
+    async def get_events_page(self, from_message_id=0, page_number=0, page_size=1000,
+                              from_date=None, to_date=None) -> [LogMessage]:
         """
-        Ожидание сообщения от сервера
-        :return:
+        Получение одной страницы событий
+        :param from_message_id: Идентификатор сообщения, после которого начинается выборка
+        :param page_number: Номер страницы, начиная с 0
+        :param page_size: Размер страницы
+        :param from_date: Начало периода (datetime или строка ISO 8601)
+        :param to_date: Конец периода
+        :return: Список сообщений
         """
-        soapaction = "http://www.rusguardsecurity.ru/ILNetworkService/GetNotification"
+        soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetEvents"
+
+        values = {
+            "fromMessageId": from_message_id,
+            "pageNumber": page_number,
+            "pageSize": page_size,
+        }
+        if from_date is not None:
+            values["fromDateTime"] = from_date
+        if to_date is not None:
+            values["toDateTime"] = to_date
+
+        data = self._envelope("GetEvents", **values)
 
-        with open(f"{self._template_dir}/GetNotification.json", 'r') as file:
-            json_file = loads(file.read())
+        response = await self._socket(soapaction, data)
+        self._request_count += 1
 
-        json_file['GetNotification']['connectionId'] = self._session_uuid
+        return await self._remember(self._decode(soapaction, Decoder.GetEvents, response))
 
-        xml_root = self._secure_header(self._request_count + 1)
-        data = xml_root.xml_simple(
-            Decoder.JsonToXML(json_file)
-        )
+    async def backfill(self, from_message_id=0, from_date=None, to_date=None, page_size=1000, concurrency=4):
+        """
+        Загрузка истории событий страницами, несколько страниц запрашиваются параллельно.
+        Сообщения возвращаются в порядке страниц; загрузка заканчивается
+        на первой неполной странице.
+        :param from_message_id: Идентификатор сообщения, после которого начинается выборка
+        :param from_date: Начало периода
+        :param to_date: Конец периода
+        :param page_size: Размер страницы
+        :param concurrency: Максимальное количество одновременно загружаемых страниц
+        :return: Асинхронный итератор LogMessage
+        """
+        pending = deque()
+        next_page = 0
+
+        def schedule():
+            nonlocal next_page
+            pending.append(asyncio.ensure_future(
+                self.get_events_page(from_message_id, next_page, page_size, from_date, to_date)
+            ))
+            next_page += 1
 
-        response = await self._socket(soapaction, data.toxml(), 9)
+        for _ in range(concurrency):
+            schedule()
+
+        try:
+            while pending:
+                page = await pending.popleft()
+                if len(page) < page_size:
+                    for task in pending:
+                        task.cancel()
+                    pending.clear()
+                else:
+                    schedule()
+
+                logging.info("Загружена страница событий: %s сообщений", len(page))
+                for message in page:
+                    yield message
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def tail(self, cursor=None, from_message_id=None, **kwargs) -> EventFollower:
+        """
+        Непрерывное чтение новых событий с адаптивным интервалом опроса
+        :param cursor: Путь к файлу, в котором сохраняется позиция чтения
+        :param from_message_id: Начальная позиция, если позиция не сохранена;
+                                по умолчанию - последнее событие сервера
+        :param kwargs: Параметры опроса, см. EventFollower
+        :return: Асинхронный итератор LogMessage
+        """
+        return EventFollower(self, cursor, from_message_id, **kwargs)
+
+    async def stream_events(self, last_event_id=None):
+        """
+        Потоковый вариант get_events: сообщения возвращаются по мере
+        получения ответа, страница целиком в памяти не хранится
+        :param last_event_id: Идентификатор последнего сообщения
+        :return: Асинхронный итератор LogMessage
+        """
+        soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetEvents"
+
+        if last_event_id is None:
+            event = await self.get_last_event()
+            last_event_id = event.Id
+
+        data = self._envelope(
+            "GetEvents",
+            fromMessageId=last_event_id
+        )
         self._request_count += 1
 
-        return Decoder.GetNotification(response)
+        decoder = Decoder.EventStream()
+        timer = self.metrics.timer("decode", "GetEvents")
+        async for chunk in self._stream(soapaction, data):
+            for message in await self._remember(timer(decoder.feed, chunk)):
+                yield message
 
-    async def get_employee_photo(self, employee_id, photo_number=1) -> str:
+        for message in await self._remember(timer(decoder.close)):
+            yield message
+        timer.stop()
+
+    @staticmethod
+    async def _collect_batch(messages) -> EventBatch:
         """
-        Формируем запрос на получение фотографии пользователя
-        :param photo_number: Номер фотографии
-        :param employee_id: Идентификатор владельца карты допуска
+        Сборка EventBatch из потока сообщений без промежуточного списка
+        :param messages: Асинхронный итератор LogMessage
         :return:
         """
-        soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetAcsEmployeePhoto"
+        builder = EventBatch.builder()
+        async for message in messages:
+            builder.append(message)
 
-        cache_photo = Path(f"./EmployeePhoto/{employee_id}.png")
-        if cache_photo.exists():
-            create_date = datetime.fromtimestamp(
-                cache_photo.stat().st_ctime
-            )
+        return builder.build()
+
+    async def get_notification(self, timeout=9):
+        """
+        Ожидание сообщения от сервера
+        :param timeout: Время ожидания ответа (сек.)
+        :return:
+        """
+        soapaction = "http://www.rusguardsecurity.ru/ILNetworkService/GetNotification"
+
+        data = self._envelope(
+            "GetNotification",
+            connectionId=self._session_uuid
+        )
 
-            create_date += timedelta(days=5)
-            if datetime.now() < create_date:
-                logging.info(f"Фотография пользователя ID:{employee_id}, загруженна с хранилища")
-                with open(cache_photo, 'rb') as file:
-                    byte_photo = file.read()
-                    b64_encoded_photo = base64.b64encode(byte_photo)
-                    self._request_count += 1
-                    return b64_encoded_photo.decode('utf-8')
+        response = await self._socket(soapaction, data, timeout)
+        self._request_count += 1
+
+        return self._decode(soapaction, Decoder.GetNotification, response)
 
-        with open(f"{self._template_dir}/GetAcsEmployeePhoto.json") as file:
-            json_file = loads(file.read())
+    def notifications(self, **kwargs) -> NotificationEngine:
+        """
+        Непрерывный опрос уведомлений с раздачей подписчикам
+        :param kwargs: Параметры NotificationEngine
+        :return: NotificationEngine (запускается через start() или async with)
+        """
+        return NotificationEngine(self, **kwargs)
 
-        json_file['GetAcsEmployeePhoto']['employeeId'] = employee_id
-        json_file['GetAcsEmployeePhoto']['photoNumber'] = photo_number
+    @coalesce
+    async def get_employee_photo_bytes(self, employee_id, photo_number=1, output=None):
+        """
+        Получение фотографии пользователя в двоичном виде.
+        Base64 содержимое ответа декодируется потоком по мере получения.
+        :param employee_id: Идентификатор владельца карты допуска
+        :param photo_number: Номер фотографии
+        :param output: Файловый объект, в который записывается фотография (в кэш она при этом не сохраняется)
+        :return: Фотография (bytes или memoryview только для чтения) или None, если фотография отсутствует;
+                 при записи в output - количество записанных байт
+        """
+        soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetAcsEmployeePhoto"
 
-        xml_root = self._secure_header(self._request_count + 1)
-        data = xml_root.xml_simple(
-            Decoder.JsonToXML(json_file)
+        photo = await self.photo_cache.get(employee_id)
+        if photo is not None:
+            self._request_count += 1
+            if not photo:
+                # Отсутствие фотографии на сервере уже известно
+                return None
+            if output is not None:
+                output.write(photo)
+                return len(photo)
+            return photo
+
+        data = self._envelope(
+            "GetAcsEmployeePhoto",
+            employeeId=employee_id,
+            photoNumber=photo_number
         )
 
-        response = await self._socket(soapaction, data.toxml())
-        b64_encoded_photo = Decoder.GetAcsEmployeePhoto(response)
+        async def request(timeout):
+            decoder = Decoder.PhotoStream(output)
+            timer = self.metrics.timer("decode", "GetAcsEmployeePhoto")
+            async for chunk in self._stream(soapaction, data, timeout):
+                timer(decoder.feed, chunk)
+            photo = timer(decoder.close)
+            timer.stop()
+            return photo
+
+        # При записи в output повтор запроса записал бы фотографию повторно
+        photo = await self._call(soapaction, request, repeatable=output is None)
+        self._request_count += 1
 
-        if b64_encoded_photo is None:
+        if photo is None:
             logging.info(f"Фотография пользователя ID:{employee_id} отсутсвует")
-            with open(f"./EmployeePhoto/no_avatar.png", 'rb') as file:
-                byte_photo = file.read()
-                b64_encoded_photo = base64.b64encode(byte_photo)
-                self._request_count += 1
-                return b64_encoded_photo.decode('utf-8')
-
-        with open(cache_photo, 'wb') as file:
-            file.write(
-                base64.b64decode(b64_encoded_photo)
-            )
+            if output is None:
+                await self.photo_cache.put_missing(employee_id)
+            return None
+
+        if output is None:
+            await self.photo_cache.put(employee_id, photo)
 
         logging.info(f"Фотография пользователя ID:{employee_id}, загруженна с сервера")
-        self._request_count += 1
+        return photo
 
-        return b64_encoded_photo
+    async def get_employee_photo(self, employee_id, photo_number=1) -> str:
+        """
+        Формируем запрос на получение фотографии пользователя
+        :param photo_number: Номер фотографии
+        :param employee_id: Идентификатор владельца карты допуска
+        :return: Фотография в base64; при ее отсутствии - изображение no_avatar.png
+        """
+        photo = await self.get_employee_photo_bytes(employee_id, photo_number)
+        if photo is None:
+            photo = await self.photo_cache.placeholder()
 
-    def get_filtered_events(self, type, day):
-        # TODO: Сделать полнофункциональный фильтр по эвентам
-        soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetFilteredEvents"
+        return base64.b64encode(photo).decode('utf-8')
 
-        with open(f"{self._template_dir}/GetFilteredEvents.json", 'r') as file:
-            json_file = loads(file.read())
+    async def get_recent_employees(self, period: timedelta) -> [str]:
+        """
+        Сотрудники, проходившие через точки доступа за последний период
+        :param period: Длина периода (timedelta)
+        :return: Список идентификаторов сотрудников в порядке первого появления
+        """
+        end = datetime.now(timezone.utc)
+        query = EventQuery().subtypes(*PASSAGE_SUBTYPES).between(end - period, end)
+        messages = await self.get_filtered_events(query, shard=timedelta(days=1))
 
-        json_file['GetFilteredEvents']['msgSubTypes']['a:LogMsgSubType'] = type
-        json_file['GetFilteredEvents']['fromDateTime'] = f"2021-10-{day}T00:00:00+08:00"
-        json_file['GetFilteredEvents']['toDateTime'] = f"2021-10-{day}T23:59:59+08:00"
+        return list(dict.fromkeys(
+            str(message.EmployeeID) for message in messages if message.EmployeeID is not None
+        ))
 
-        xml_root = self._secure_header(self._request_count + 1)
-        data = xml_root.xml_simple(
-            Decoder.JsonToXML(json_file)
-        )
+    async def prefetch_photos(self, employee_ids=None, period=timedelta(days=7), concurrency=4, progress=None,
+                              photo_number=1) -> int:
+        """
+        Предварительная загрузка фотографий сотрудников в кэш.
+        Фотографии, уже имеющиеся в кэше и не устаревшие, не запрашиваются;
+        отсутствие фотографии на сервере также сохраняется в кэше.
+        :param employee_ids: Идентификаторы сотрудников; None - все сотрудники из событий за период
+        :param period: Период событий для выбора сотрудников (timedelta)
+        :param concurrency: Максимальное количество одновременных запросов
+        :param progress: Функция progress(обработано, всего, идентификатор сотрудника)
+        :param photo_number: Номер фотографии
+        :return: Количество загруженных с сервера фотографий
+        """
+        if employee_ids is None:
+            employee_ids = await self.get_recent_employees(period)
+        employee_ids = list(dict.fromkeys(str(employee_id) for employee_id in employee_ids))
+
+        semaphore = asyncio.Semaphore(concurrency)
+        total = len(employee_ids)
+        done = 0
+        loaded = 0
+        missing = 0
+        failed = 0
+
+        async def prefetch(employee_id):
+            nonlocal done, loaded, missing, failed
+            async with semaphore:
+                # Ошибка по одному сотруднику не прерывает загрузку остальных
+                try:
+                    if not await self.photo_cache.fresh(employee_id):
+                        if await self.get_employee_photo_bytes(employee_id, photo_number) is None:
+                            missing += 1
+                        else:
+                            loaded += 1
+                except Exception as error:
+                    failed += 1
+                    logging.error("Не удалось загрузить фотографию пользователя ID:%s: %r", employee_id, error)
+            done += 1
+            if progress is not None:
+                progress(done, total, employee_id)
+
+        await asyncio.gather(*[prefetch(employee_id) for employee_id in employee_ids])
+
+        logging.info("Загружено фотографий: %s из %s, без фотографии: %s, ошибок: %s", loaded, total, missing, failed)
+        return loaded
+
+    async def get_filtered_events_page(self, query: EventQuery, page_number=0) -> [LogMessage]:
+        """
+        Получение одной страницы отфильтрованных событий
+        :param query: Параметры запроса
+        :param page_number: Номер страницы, начиная с 0
+        :return: Список сообщений
+        """
+        soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetFilteredEvents"
 
-        response = self._loop.run_until_complete(
-            self._socket(soapaction, data.toxml())
-        )
+        data = self._envelope("GetFilteredEvents", **query.slots(page_number))
+
+        response = await self._socket(soapaction, data)
 
         self._request_count += 1
-        return Decoder.GetFilteredEvents(response)
+        return await self._remember(self._decode(soapaction, Decoder.GetFilteredEvents, response))
+
+    async def _get_filtered_events_pages(self, query: EventQuery, semaphore) -> [LogMessage]:
+        """
+        Последовательная загрузка всех страниц запроса
+        """
+        result = []
+        page_number = 0
+
+        async with semaphore:
+            while True:
+                page = await self.get_filtered_events_page(query, page_number)
+                result.extend(page)
+                if len(page) < query.page_size:
+                    return result
+                page_number += 1
+
+    async def get_filtered_events(self, query: EventQuery, shard=None, concurrency=4, as_batch=False):
+        """
+        Получение событий по фильтру.
+        Период запроса может быть разбит на интервалы, которые загружаются параллельно,
+        результаты объединяются в порядке сортировки запроса.
+        :param query: Параметры запроса
+        :param shard: Длина интервала разбиения (datetime.timedelta), None - без разбиения
+        :param concurrency: Максимальное количество одновременно загружаемых интервалов
+        :param as_batch: Вернуть события в столбцовом виде (EventBatch, требуется numpy)
+        :return: Список сообщений или EventBatch
+        """
+        shards = query.shards(shard)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        results = await asyncio.gather(*[
+            self._get_filtered_events_pages(item, semaphore) for item in shards
+        ])
+
+        if query.sorted_column == "DateTime":
+            if query.descending:
+                results.reverse()
+            merged = chain.from_iterable(results)
+        else:
+            def sort_key(message):
+                value = getattr(message, query.sorted_column, None)
+                return value is not None, value
+
+            merged = heapq.merge(*results, key=sort_key, reverse=query.descending)
+
+        # Границы соседних интервалов включаются сервером в оба интервала
+        seen = set()
+        messages = []
+        for message in merged:
+            if message.Id not in seen:
+                seen.add(message.Id)
+                messages.append(message)
+
+        logging.info("Получено событий по фильтру: %s (интервалов: %s)", len(messages), len(shards))
+
+        if as_batch:
+            return EventBatch.from_messages(messages)
+        return messages
+
+    async def stream_filtered_events(self, query: EventQuery):
+        """
+        Потоковый вариант get_filtered_events: страницы загружаются последовательно,
+        сообщения возвращаются по мере получения ответа
+        :param query: Параметры запроса
+        :return: Асинхронный итератор LogMessage
+        """
+        soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetFilteredEvents"
+        page_number = 0
+
+        while True:
+            data = self._envelope("GetFilteredEvents", **query.slots(page_number))
+            self._request_count += 1
 
+            count = 0
+            decoder = Decoder.EventStream()
+            timer = self.metrics.timer("decode", "GetFilteredEvents")
+            async for chunk in self._stream(soapaction, data):
+                for message in await self._remember(timer(decoder.feed, chunk)):
+                    count += 1
+                    yield message
+
+            for message in await self._remember(timer(decoder.close)):
+                count += 1
+                yield message
+            timer.stop()
+
+            if count < query.page_size:
+                return
+            page_number += 1
+
+    @cached
+    @coalesce
     async def get_log_message_types(self):
         """
         Формируем запрос на получения типов важности сообщения от сервера
@@ -306,18 +921,14 @@ class AsyncNetworkClient:
         """
         soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetLogMessageTypes"
 
-        with open(f"{self._template_dir}/GetLogMessageTypes.json", 'r') as file:
-            json_file = loads(file.read())
+        data = self._envelope("GetLogMessageTypes")
 
-        xml_root = self._secure_header(self._request_count + 1)
-        data = xml_root.xml_simple(
-            Decoder.JsonToXML(json_file)
-        )
-
-        response = await self._socket(soapaction, data.toxml())
+        response = await self._socket(soapaction, data)
         self._request_count += 1
-        return Decoder.GetLogMessageTypes(response)
+        return self._decode(soapaction, Decoder.GetLogMessageTypes, response)
 
+    @cached
+    @coalesce
     async def get_log_message_subtypes(self):
         """
         Формируем запрос на получения типов важности сообщения от сервера
@@ -325,75 +936,100 @@ class AsyncNetworkClient:
         """
         soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetLogMessageSubtypes"
 
-        with open(f"{self._template_dir}/GetLogMessageSubtypes.json", 'r') as file:
-            json_file = loads(file.read())
-
-        xml_root = self._secure_header(self._request_count + 1)
-        data = xml_root.xml_simple(
-            Decoder.JsonToXML(json_file)
-        )
+        data = self._envelope("GetLogMessageSubtypes")
 
-        response = await self._socket(soapaction, data.toxml())
+        response = await self._socket(soapaction, data)
         self._request_count += 1
-        return Decoder.GetLogMessageSubtypes(response)
+        return self._decode(soapaction, Decoder.GetLogMessageSubtypes, response)
 
+    @cached
+    @coalesce
     async def get_all_nets(self):
         soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetAllNets"
 
-        with open(f"{self._template_dir}/GetAllNets.json", 'r') as file:
-            json_file = loads(file.read())
-
-        xml_root = self._secure_header(self._request_count + 1)
-        data = xml_root.xml_simple(
-            Decoder.JsonToXML(json_file)
-        )
+        data = self._envelope("GetAllNets")
 
-        response = await self._socket(soapaction, data.toxml())
+        response = await self._socket(soapaction, data)
         self._request_count += 1
-        return Decoder.GetAllNets(response)
+        return self._decode(soapaction, Decoder.GetAllNets, response)
 
+    @cached
+    @coalesce
     async def get_net_servers(self, server_id=None):
         soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetNetServers"
 
-        with open(f"{self._template_dir}/GetNetServers.json", 'r') as file:
-            json_file = loads(file.read())
-
         if server_id is None:
             result = await self.get_all_nets()
             server_id = result.Id
 
-        json_file['GetNetServers']['id'] = server_id
-
-        xml_root = self._secure_header(self._request_count + 1)
-        data = xml_root.xml_simple(
-            Decoder.JsonToXML(json_file)
+        data = self._envelope(
+            "GetNetServers",
+            id=server_id
         )
 
-        response = await self._socket(soapaction, data.toxml())
+        response = await self._socket(soapaction, data)
         self._request_count += 1
 
-        return Decoder.GetNetServers(response)
+        return self._decode(soapaction, Decoder.GetNetServers, response)
 
+    @cached
+    @coalesce
     async def get_server_drivers_full_info(self, server_id):
         soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetServerDriversFullInfo"
 
-        with open(f"{self._template_dir}/GetServerDriversFullInfo.json", 'r') as file:
-            json_file = loads(file.read())
-
-        json_file['GetServerDriversFullInfo']['serverID'] = server_id
-
-        xml_root = self._secure_header(self._request_count + 1)
-        data = xml_root.xml_simple(
-            Decoder.JsonToXML(json_file)
+        data = self._envelope(
+            "GetServerDriversFullInfo",
+            serverID=server_id
         )
 
-        response = await self._socket(soapaction, data.toxml())
+        response = await self._socket(soapaction, data)
         self._request_count += 1
 
-        return Decoder.GetServerDriversFullInfo(response)
+        return self._decode(soapaction, Decoder.GetServerDriversFullInfo, response)
+
+    async def get_driver_topology(self, server_id=None, refresh=False) -> DriverTopology:
+        """
+        Индекс драйверов серверов устройств (см. DriverTopology).
+        Индекс строится один раз для каждого значения server_id и обновляется при refresh=True
+        только по изменившимся драйверам.
+        :param server_id: Идентификатор сервера; None - все серверы типа DeviceServer
+        :param refresh: Запросить актуальный список драйверов, минуя кэш справочников
+        :return: DriverTopology
+        """
+        topology = self._topologies.get(server_id)
+        if topology is not None and not refresh:
+            return topology
+
+        if server_id is None:
+            servers = await self.get_net_servers()
+            server_ids = [server.Id for server in servers if server.ServerType == "DeviceServer"]
+        else:
+            server_ids = [server_id]
+
+        if refresh and self.metadata_cache is not None:
+            # Только драйверы обновляемых серверов: кэш остальных серверов остается действительным
+            for item in server_ids:
+                self.metadata_cache.invalidate("get_server_drivers_full_info", item)
+
+        results = await asyncio.gather(*[self.get_server_drivers_full_info(item) for item in server_ids])
+
+        if topology is None:
+            topology = self._topologies[server_id] = DriverTopology()
+        for item, drivers in zip(server_ids, results):
+            changes = topology.update(drivers, item)
+            logging.info(
+                "Драйверы сервера %s: добавлено %s, изменено %s, удалено %s",
+                item, len(changes["added"]), len(changes["changed"]), len(changes["removed"])
+            )
+
+        return topology
 
     async def process(self, action, controller_id):
         soapaction = "http://www.rusguardsecurity.ru/ILNetworkService/Process"
 
-        with open(f"{self._template_dir}/Process.json", 'r') as file:
-            json_file = loads(file.read())
+        data = self._envelope(
+            "Process",
+            Id=controller_id,
+            MethodName=action,
+            connectionId=self._session_uuid
+        )
@@ -1,11 +1,52 @@
-import base64
-from xml.etree.ElementTree import fromstring, iterparse
+import binascii
+from xml.parsers import expat
+from xml.etree.ElementTree import XMLPullParser, fromstring, iterparse
 from xml.dom.minidom import Document, Element
-from RusGuardClient.Models import *
+from RusGuardClient.Models import (
+    NS_LOG, NS_NOTIFICATIONS, EmployeePassageNotification, LDriverFullInfo, LNetInfo, LogMessage,
+    LogMessageSubtypeSlimInfo, LogMessageTypeSlimInfo, LServerInfo, Messages, local_name, qualified
+)
 
 from io import StringIO
 import logging
 
+NS_SOAP = "http://schemas.xmlsoap.org/soap/envelope/"
+NS_RUSGUARD = "http://www.rusguardsecurity.ru"
+NS_XSI = "http://www.w3.org/2001/XMLSchema-instance"
+
+
+def result_path(method) -> str:
+    """
+    Путь к результату метода внутри SOAP конверта
+    :param method: Имя метода сервиса
+    :return: Путь в нотации ElementTree с полными именами элементов
+    """
+    return "/".join((
+        qualified(NS_SOAP, "Body"),
+        qualified(NS_RUSGUARD, method + "Response"),
+        qualified(NS_RUSGUARD, method + "Result"),
+    ))
+
+
+FAULT_PATH = qualified(NS_SOAP, "Body") + "/" + qualified(NS_SOAP, "Fault")
+CONNECT_RESULT = result_path("Connect")
+GET_VARIABLE_RESULT = result_path("GetVariable")
+GET_EVENTS_RESULT = result_path("GetEvents")
+GET_LAST_EVENT_RESULT = result_path("GetLastEvent")
+GET_NOTIFICATION_RESULT = result_path("GetNotification")
+GET_ACS_EMPLOYEE_PHOTO_RESULT = result_path("GetAcsEmployeePhoto")
+GET_FILTERED_EVENTS_RESULT = result_path("GetFilteredEvents")
+GET_LOG_MESSAGE_TYPES_RESULT = result_path("GetLogMessageTypes")
+GET_LOG_MESSAGE_SUBTYPES_RESULT = result_path("GetLogMessageSubtypes")
+GET_ALL_NETS_RESULT = result_path("GetAllNets")
+GET_NET_SERVERS_RESULT = result_path("GetNetServers")
+GET_SERVER_DRIVERS_FULL_INFO_RESULT = result_path("GetServerDriversFullInfo")
+
+LAST_MESSAGE_PATH = qualified(NS_LOG, "Messages") + "/" + LogMessage.tag
+PASSAGE_NOTIFICATIONS_PATH = (
+    qualified(NS_NOTIFICATIONS, "EmployeePassageNotifications") + "/" + EmployeePassageNotification.tag
+)
+
 
 def get_namespaces(raw_string):
     namespaces = dict([
@@ -57,10 +98,7 @@ def ErrorDecode(message: str):
     logging.basicConfig(format='[%(asctime)s] DECODER: %(message)s', datefmt='%d/%b/%y %H:%M:%S')
 
     try:
-        root = fromstring(message)
-
-        body = root.find('s:Body', get_namespaces(message))
-        fault = body.find("s:Fault", get_namespaces(message))
+        fault = fromstring(message).find(FAULT_PATH)
         message_block = {}
 
         for item in fault:
@@ -79,11 +117,7 @@ def ConnectionDecode(message: str) -> str:
     :param message: сообщение от сервера
     :return: UUID
     """
-    namespace = get_namespaces(message)
-
-    body = fromstring(message).find("s:Body", namespace)
-    ConnectionUUID = body.find(
-        "{http://www.rusguardsecurity.ru}ConnectResponse/{http://www.rusguardsecurity.ru}ConnectResult", namespace)
+    ConnectionUUID = fromstring(message).find(CONNECT_RESULT)
 
     if ConnectionUUID is None:
         raise ValueError
@@ -92,14 +126,10 @@ def ConnectionDecode(message: str) -> str:
 
 
 def GetVariable(message: str):
-    namespace = get_namespaces(message)
-
-    VariableResult = fromstring(message).find(
-        "s:Body/{http://www.rusguardsecurity.ru}GetVariableResponse/{http://www.rusguardsecurity.ru}GetVariableResult",
-        namespace
-    )
+    VariableResult = fromstring(message).find(GET_VARIABLE_RESULT)
 
-    return VariableResult.find("a:Name", namespace).text, VariableResult.find("a:Value", namespace).text
+    variable = {local_name(element.tag): element.text for element in VariableResult}
+    return variable.get("Name"), variable.get("Value")
 
 
 def GetEvents(message: str) -> [LogMessage]:
@@ -108,27 +138,146 @@ def GetEvents(message: str) -> [LogMessage]:
     :param message: XML документ с сервера
     :return: Список сообщений
     """
-    namespace = get_namespaces(message)
-    events = fromstring(message).find(
-        "s:Body/{http://www.rusguardsecurity.ru}GetEventsResponse/{http://www.rusguardsecurity.ru}GetEventsResult",
-        namespace
-    )
-    list_messages = Messages(events, namespace)
+    events = fromstring(message).find(GET_EVENTS_RESULT)
+    list_messages = Messages(events)
     return list_messages.LogMessages
 
 
+class EventStream:
+    """
+    Потоковый разбор ответа GetEvents/GetFilteredEvents.
+    Документ подается частями по мере получения, сообщения возвращаются
+    сразу после закрытия элемента a:LogMessage, а разобранные элементы
+    удаляются из дерева, поэтому расход памяти не зависит от размера страницы.
+    """
+
+    def __init__(self):
+        self._parser = XMLPullParser(events=("start", "end"))
+        self._stack = []  # type: [Element]
+
+    def feed(self, chunk) -> [LogMessage]:
+        """
+        Передача очередной части документа
+        :param chunk: Часть XML документа (bytes или str)
+        :return: Сообщения, полностью полученные в этой части
+        """
+        self._parser.feed(chunk)
+        return self._read_events()
+
+    def close(self) -> [LogMessage]:
+        """
+        Завершение разбора документа
+        :return: Оставшиеся сообщения
+        """
+        self._parser.close()
+        return self._read_events()
+
+    def _read_events(self) -> [LogMessage]:
+        messages = []
+        stack = self._stack
+
+        for event, element in self._parser.read_events():
+            if event == "start":
+                stack.append(element)
+                continue
+
+            stack.pop()
+            if element.tag == LogMessage.tag:
+                messages.append(LogMessage(element))
+                element.clear()
+                if stack:
+                    stack[-1].remove(element)
+
+        return messages
+
+
+class PhotoStream:
+    """
+    Потоковый разбор ответа GetAcsEmployeePhoto.
+    Base64 содержимое результата декодируется по мере получения частями,
+    кратными 4 символам, поэтому закодированный текст целиком в памяти не хранится.
+    """
+    _result_tag = qualified(NS_RUSGUARD, "GetAcsEmployeePhotoResult")
+    _nil_attribute = NS_XSI + "}nil"  # Имена expat: "namespace}name"
+    _whitespace = str.maketrans("", "", " \t\r\n")
+
+    def __init__(self, output=None):
+        """
+        :param output: Файловый объект для записи фотографии; по умолчанию - буфер в памяти
+        """
+        self._buffer = bytearray() if output is None else None
+        self._output = output
+        self._pending = ""
+        self._inside = False
+        self.found = False
+        self.size = 0
+
+        self._parser = expat.ParserCreate(namespace_separator="}")
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._parser.CharacterDataHandler = self._data
+
+    @staticmethod
+    def _qualified(name):
+        return "{" + name if "}" in name else name
+
+    def _start(self, name, attributes):
+        if self._qualified(name) == self._result_tag:
+            nil = attributes.get(self._nil_attribute, "false")
+            self.found = nil != "true"
+            self._inside = self.found
+
+    def _end(self, name):
+        if self._inside and self._qualified(name) == self._result_tag:
+            self._write(self._pending, final=True)
+            self._pending = ""
+            self._inside = False
+
+    def _data(self, text):
+        if self._inside:
+            self._write(self._pending + text.translate(self._whitespace))
+
+    def _write(self, text, final=False):
+        length = len(text) if final else len(text) - len(text) % 4
+        self._pending = text[length:]
+        if not length:
+            return
+
+        data = binascii.a2b_base64(text[:length])
+        self.size += len(data)
+        if self._buffer is not None:
+            self._buffer += data
+        else:
+            self._output.write(data)
+
+    def feed(self, chunk):
+        """
+        :param chunk: Часть XML документа (bytes)
+        """
+        self._parser.Parse(chunk, False)
+
+    def close(self):
+        """
+        :return: Фотография (memoryview буфера только для чтения: значение может быть общим
+                 для нескольких вызовов через кэш) или None, если фотография отсутствует.
+                 При записи в файловый объект - количество записанных байт или None
+        """
+        self._parser.Parse(b"", True)
+        if not self.found:
+            return None
+        if self._buffer is not None:
+            return memoryview(self._buffer).toreadonly()
+        return self.size
+
+
 def GetLastEvent(message: str) -> LogMessage:
     """
     Получение последнего сообщения с сервера
     :param message: XML ответ с сервера
     :return:
     """
-    namespace = get_namespaces(message)
-    LastEvent = fromstring(message).find(
-        "s:Body/{http://www.rusguardsecurity.ru}GetLastEventResponse/{http://www.rusguardsecurity.ru}GetLastEventResult",
-        namespace
-    )
-    lastMessage = LastEvent.find("a:Messages/a:LogMessage", namespace)
+    LastEvent = fromstring(message).find(GET_LAST_EVENT_RESULT)
+    lastMessage = LastEvent.find(LAST_MESSAGE_PATH)
 
     return LogMessage(lastMessage)
 
@@ -139,21 +288,11 @@ def GetNotification(message: str) -> [EmployeePassageNotification]:
     :param message:
     :return:
     """
-    namespace = get_namespaces(message)
+    notify = fromstring(message).find(GET_NOTIFICATION_RESULT)
 
-    notify = fromstring(message).find(
-        "s:Body/{http://www.rusguardsecurity.ru}GetNotificationResponse/{http://www.rusguardsecurity.ru}GetNotificationResult",
-        namespace
-    )
-
-    PassageNotifications = notify.findall("a:EmployeePassageNotifications/a:EmployeePassageNotification", namespace)
-    EmployeePassageNotifications = []
-
-    for item in PassageNotifications:
-        EmployeePassageNotifications.append(
-            EmployeePassageNotification(item)
-        )
-    return EmployeePassageNotifications
+    return [
+        EmployeePassageNotification(item) for item in notify.iterfind(PASSAGE_NOTIFICATIONS_PATH)
+    ]
 
 
 def GetAcsEmployeePhoto(message: str):
@@ -162,14 +301,7 @@ def GetAcsEmployeePhoto(message: str):
     :param message:
     :return:
     """
-
-    namespace = get_namespaces(message)
-
-    photo_element = fromstring(message).find(
-        "s:Body/{http://www.rusguardsecurity.ru}GetAcsEmployeePhotoResponse/"
-        "{http://www.rusguardsecurity.ru}GetAcsEmployeePhotoResult",
-        namespace
-    )
+    photo_element = fromstring(message).find(GET_ACS_EMPLOYEE_PHOTO_RESULT)
     photo = photo_element.text
 
     return photo
@@ -181,93 +313,38 @@ def GetFilteredEvents(message: str):
     :param message: XML документ с сервера
     :return: Список сообщений
     """
-    namespace = get_namespaces(message)
-    events = fromstring(message).find(
-        "s:Body/{http://www.rusguardsecurity.ru}GetFilteredEventsResponse/"
-        "{http://www.rusguardsecurity.ru}GetFilteredEventsResult",
-        namespace
-    )
-    list_messages = Messages(events, namespace)
+    events = fromstring(message).find(GET_FILTERED_EVENTS_RESULT)
+    list_messages = Messages(events)
     return list_messages.LogMessages
 
 
 def GetLogMessageTypes(message: str):
-    namespace = get_namespaces(message)
-    LogMessageResult = fromstring(message).find(
-        "s:Body/{http://www.rusguardsecurity.ru}GetLogMessageTypesResponse/"
-        "{http://www.rusguardsecurity.ru}GetLogMessageTypesResult",
-        namespace
-    )
+    LogMessageResult = fromstring(message).find(GET_LOG_MESSAGE_TYPES_RESULT)
 
-    LogsMessageSlimInfo = []
-    for element in LogMessageResult:
-        LogsMessageSlimInfo.append(
-            LogMessageTypeSlimInfo(element)
-        )
-
-    return LogsMessageSlimInfo
+    return [LogMessageTypeSlimInfo(element) for element in LogMessageResult]
 
 
 def GetLogMessageSubtypes(message: str):
-    namespace = get_namespaces(message)
-    LogMessageResult = fromstring(message).find(
-        "s:Body/{http://www.rusguardsecurity.ru}GetLogMessageSubtypesResponse/"
-        "{http://www.rusguardsecurity.ru}GetLogMessageSubtypesResult",
-        namespace
-    )
+    LogMessageResult = fromstring(message).find(GET_LOG_MESSAGE_SUBTYPES_RESULT)
 
-    LogsMessageSubtypeSlimInfo = []
-    for element in LogMessageResult:
-        LogsMessageSubtypeSlimInfo.append(
-            LogMessageSubtypeSlimInfo(element)
-        )
-
-    return LogsMessageSubtypeSlimInfo
+    return [LogMessageSubtypeSlimInfo(element) for element in LogMessageResult]
 
 
 def GetAllNets(message: str):
-    namespace = get_namespaces(message)
-    GetAllNetsResult = fromstring(message).find(
-        "s:Body/{http://www.rusguardsecurity.ru}GetAllNetsResponse/"
-        "{http://www.rusguardsecurity.ru}GetAllNetsResult",
-        namespace
-    )
+    GetAllNetsResult = fromstring(message).find(GET_ALL_NETS_RESULT)
 
     return LNetInfo(
-        GetAllNetsResult.find("a:LNetInfo", namespace)
+        GetAllNetsResult.find(LNetInfo.tag)
     )
 
 
 def GetNetServers(message: str):
-    namespace = get_namespaces(message)
-    GetNetServersResult = fromstring(message).find(
-        "s:Body/{http://www.rusguardsecurity.ru}GetNetServersResponse/"
-        "{http://www.rusguardsecurity.ru}GetNetServersResult",
-        namespace
-    )
-
-    Servers = []
-    for element in GetNetServersResult:
-        Servers.append(
-            LServerInfo(element)
-        )
+    GetNetServersResult = fromstring(message).find(GET_NET_SERVERS_RESULT)
 
-    return Servers
+    return [LServerInfo(element) for element in GetNetServersResult]
 
 
 def GetServerDriversFullInfo(message: str):
-    namespace = get_namespaces(message)
-    GetServerDriversFullInfoResult = fromstring(message).find(
-        "s:Body/{http://www.rusguardsecurity.ru}GetServerDriversFullInfoResponse/"
-        "{http://www.rusguardsecurity.ru}GetServerDriversFullInfoResult",
-        namespace
-    )
-
-    LDriversFullInfo = []
-
-    for element in GetServerDriversFullInfoResult:
-        LDriversFullInfo.append(
-            LDriverFullInfo(element)
-        )
+    GetServerDriversFullInfoResult = fromstring(message).find(GET_SERVER_DRIVERS_FULL_INFO_RESULT)
 
-    return LDriversFullInfo
+    return [LDriverFullInfo(element) for element in GetServerDriversFullInfoResult]
@@ -1,246 +1,526 @@
+import re
+from datetime import datetime
+from enum import Enum
+from uuid import UUID
 from xml.etree.ElementTree import Element
 
+NS_ENTITY = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity"
+NS_LOG = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity.Log"
+NS_NOTIFICATIONS = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Notifications"
+NS_ADDITIONAL_FIELDS = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity.AdditionalFields"
 
-class LogMessage:
-    ContentData = str
-    ContentType = str
 
-    DateTime = str
+class _StrEnum(str, Enum):
+    """
+    Перечисление, значения которого сравниваются и выводятся как строки
+    """
 
-    Details = str
-    DriverID = str
-    DriverName = str
+    def __str__(self):
+        return self.value
 
-    EmployeeID = str
-    EmployeeFirstName = str
-    EmployeeLastName = str
-    EmployeeSecondName = str
+    def __format__(self, format_spec):
+        return format(self.value, format_spec)
 
-    EmployeeGroupId = str
-    EmployeeGroupFullName = str
-    EmployeeGroupName = str
 
-    Id = int
+class LogMsgType(_StrEnum):
+    Information = "Information"
+    Warning = "Warning"
+    Error = "Error"
+    Alarm = "Alarm"
 
-    LogMessageSubType = str
-    LogMessageType = str
 
-    Message = str
+class LogMsgSubType(_StrEnum):
+    AccessPointEntryByKey = "AccessPointEntryByKey"
+    AccessPointExitByKey = "AccessPointExitByKey"
+    AccessPointEntryDeniedKeyNotFound = "AccessPointEntryDeniedKeyNotFound"
+    AccessPointExitDeniedKeyNotFound = "AccessPointExitDeniedKeyNotFound"
+    AccessPointEntryDeniedAccessLevel = "AccessPointEntryDeniedAccessLevel"
+    AccessPointExitDeniedAccessLevel = "AccessPointExitDeniedAccessLevel"
+    AccessPointDoorOpened = "AccessPointDoorOpened"
+    AccessPointDoorClosed = "AccessPointDoorClosed"
+    AccessPointDoorBreak = "AccessPointDoorBreak"
+    AccessPointDoorHeldOpen = "AccessPointDoorHeldOpen"
 
-    OperatorFullName = str
-    OperatorID = str
-    OperatorLogin = str
 
-    ServerId = str
-    ServerName = str
+# Подтипы сообщений о проходе сотрудника и об отказе в проходе сотруднику, ключ которого известен
+PASSAGE_SUBTYPES = (
+    LogMsgSubType.AccessPointEntryByKey,
+    LogMsgSubType.AccessPointExitByKey,
+    LogMsgSubType.AccessPointEntryDeniedAccessLevel,
+    LogMsgSubType.AccessPointExitDeniedAccessLevel,
+)
+
+
+def to_str(text):
+    return text
+
+
+def to_int(text) -> int:
+    return int(text)
+
+
+def to_bool(text) -> bool:
+    return text.strip().lower() == "true"
+
+
+def to_uuid(text) -> UUID:
+    return UUID(text)
+
+
+_FRACTION_RE = re.compile(r"(\.\d{6})\d+")
+
+
+def to_datetime(text) -> datetime:
+    """
+    Разбор даты в формате .NET (до 7 знаков в долях секунды, смещение или Z)
+    :param text: Дата в формате ISO 8601
+    :return:
+    """
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        text = _FRACTION_RE.sub(r"\1", text)
+        if text.endswith("Z"):
+            text = text[:-1] + "+00:00"
+        return datetime.fromisoformat(text)
+
+
+def to_enum(enum):
+    """
+    Конвертер в перечисление; неизвестные серверу значения остаются строками
+    :param enum: Класс перечисления
+    :return: Функция конвертации
+    """
+    members = {member.value: member for member in enum}
+
+    def convert(text):
+        return members.get(text, text)
+
+    return convert
+
+
+def qualified(namespace, name) -> str:
+    """
+    Полное имя элемента в нотации ElementTree
+    :param namespace: Пространство имен
+    :param name: Локальное имя
+    :return: {namespace}name
+    """
+    return "{" + namespace + "}" + name
+
+
+def field_table(namespace, fields) -> dict:
+    """
+    Таблица соответствия полного имени элемента, имени атрибута модели и конвертера значения
+    :param namespace: Пространство имен полей
+    :param fields: {Имя поля: конвертер}
+    :return: {"{namespace}name": ("name", конвертер)}
+    """
+    return {qualified(namespace, name): (name, convert) for name, convert in fields.items()}
+
+
+def local_name(tag) -> str:
+    return tag[tag.rfind("}") + 1:]
+
+
+def fill_fields(model, document, fields):
+    """
+    Заполнение атрибутов модели по таблице полей за один проход по элементу.
+    Значения приводятся к типам поля один раз, при разборе;
+    если значение не удалось привести к типу, сохраняется исходная строка.
+    :param model: Экземпляр модели
+    :param document: XML элемент
+    :param fields: Таблица полей, см. field_table
+    :return:
+    """
+    for element in document:
+        field = fields.get(element.tag)
+        if field is None:
+            continue
+
+        name, convert = field
+        text = element.text
+        if text is not None:
+            try:
+                text = convert(text)
+            except ValueError:
+                pass
+
+        setattr(model, name, text)
+
+
+class Model:
+    """
+    Базовый класс моделей ответа сервера.
+    Поля хранятся в __slots__, незаполненные сервером поля равны None.
+    """
+    __slots__ = ()
+
+    _fields = {}  # type: {str: (str, callable)}
+
+    def __getattr__(self, name):
+        if name in type(self).__slots__:
+            return None
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in type(self).__slots__)
+        return f"{type(self).__name__}({values})"
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in type(self).__slots__}
+
+    @classmethod
+    def from_text(cls, values: dict):
+        """
+        Создание модели из текстовых значений полей (например, из локального хранилища)
+        с тем же приведением типов, что и при разборе ответа сервера
+        :param values: {Имя поля: текст}
+        :return: Экземпляр модели
+        """
+        model = cls()
+        for name, convert in cls._fields.values():
+            text = values.get(name)
+            if text is None:
+                continue
+            try:
+                text = convert(text)
+            except ValueError:
+                pass
+            setattr(model, name, text)
+
+        return model
+
+
+class LogMessage(Model):
+    _fields = field_table(NS_LOG, {
+        "ContentData": to_str,
+        "ContentType": to_str,
+        "DateTime": to_datetime,
+        "Details": to_str,
+        "DriverID": to_uuid,
+        "DriverName": to_str,
+        "EmployeeID": to_uuid,
+        "EmployeeFirstName": to_str,
+        "EmployeeLastName": to_str,
+        "EmployeeSecondName": to_str,
+        "EmployeeGroupId": to_uuid,
+        "EmployeeGroupFullName": to_str,
+        "EmployeeGroupName": to_str,
+        "Id": to_int,
+        "LogMessageSubType": to_enum(LogMsgSubType),
+        "LogMessageType": to_enum(LogMsgType),
+        "Message": to_str,
+        "OperatorFullName": to_str,
+        "OperatorID": to_uuid,
+        "OperatorLogin": to_str,
+        "ServerId": to_uuid,
+        "ServerName": to_str,
+    })
+    __slots__ = tuple(name for name, _ in _fields.values()) + ("Site",)
+
+    ContentData: str
+    ContentType: str
+
+    DateTime: datetime
+
+    Details: str
+    DriverID: UUID
+    DriverName: str
+
+    EmployeeID: UUID
+    EmployeeFirstName: str
+    EmployeeLastName: str
+    EmployeeSecondName: str
+
+    EmployeeGroupId: UUID
+    EmployeeGroupFullName: str
+    EmployeeGroupName: str
+
+    Id: int
+
+    LogMessageSubType: LogMsgSubType
+    LogMessageType: LogMsgType
+
+    Message: str
+
+    OperatorFullName: str
+    OperatorID: UUID
+    OperatorLogin: str
+
+    ServerId: UUID
+    ServerName: str
+
+    Site: str  # Площадка (сервер) ClientPool, заполняется клиентом
+
+    tag = qualified(NS_LOG, "LogMessage")
 
     def __init__(self, document=None):
         if isinstance(document, Element):
-            url = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity.Log"
             try:
-                for element in document:
-                    element_tag = element.tag.replace("{"+url+"}", "")
-                    setattr(self, element_tag, element.text)
+                fill_fields(self, document, self._fields)
             except Exception:
                 raise TypeError("type xml.etree.ElementTree.Element only")
 
 
 class Messages:
+    _messages_tag = qualified(NS_LOG, "Messages")
+
     def __init__(self, document=None, namespace=None):
         self.LogMessages = []  # type:[LogMessage]
         if isinstance(document, Element):
             try:
-                result = document.find("a:Messages", namespace)
-                for element_message in result:
-                    self.LogMessages.append(LogMessage(element_message))
+                result = document.find(self._messages_tag)
+                self.LogMessages = [LogMessage(element_message) for element_message in result]
 
             except Exception:
                 raise TypeError("type xml.etree.ElementTree.Element only")
 
 
-class AdditionalFieldInfo:
-    FieldType = str
-    ID = str
-    IsNotForShow = str
-    IsRequired = str
-    Name = str
-    Order = str
-    OwnerType = str
-    DefaultValue = str
-
-    def __init__(self, document, namespace):
+class AdditionalFieldInfo(Model):
+    _fields = field_table(NS_ADDITIONAL_FIELDS, {
+        "FieldType": to_str,
+        "ID": to_str,
+        "IsNotForShow": to_bool,
+        "IsRequired": to_bool,
+        "Name": to_str,
+        "Order": to_int,
+        "OwnerType": to_str,
+        "DefaultValue": to_str,
+    })
+    __slots__ = tuple(name for name, _ in _fields.values())
+
+    FieldType: str
+    ID: str
+    IsNotForShow: bool
+    IsRequired: bool
+    Name: str
+    Order: int
+    OwnerType: str
+    DefaultValue: str
+
+    def __init__(self, document, namespace=None):
         if isinstance(document, Element):
             try:
-                for key in document:
-                    key_tag = key.tag.replace("{" + namespace['b'] + "}", "")
-                    setattr(self, key_tag, key.text)
+                fill_fields(self, document, self._fields)
 
             except Exception:
                 raise TypeError("type xml.etree.ElementTree.Element only")
 
 
-class EmployeePassageNotification:
-    Data = str
-
-    DateTime = str
-    Details = str
-    DriverId = str
-    EmployeeId = str
-    IsKeyEvent = str
-    LogMessageId = str
-
-    Message = str
-    MessageSubType = str
-    MessageType = str
-    OperatorId = str
-
-    AddFields = [AdditionalFieldInfo]
-
-    EmployeeFirstName = str
-    EmployeeLastName = str
-    EmployeeSecondName = str
-
-    EmployeePosition = str
-
-    EmployeeGroupFullPath = str
-
-    __namespace = {
-        'b': "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity.AdditionalFields",
-        'a': "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Notifications"
-    }
+class EmployeePassageNotification(Model):
+    _fields = field_table(NS_NOTIFICATIONS, {
+        "Data": to_str,
+        "DateTime": to_datetime,
+        "Details": to_str,
+        "DriverId": to_uuid,
+        "EmployeeId": to_uuid,
+        "IsKeyEvent": to_bool,
+        "LogMessageId": to_int,
+        "Message": to_str,
+        "MessageSubType": to_enum(LogMsgSubType),
+        "MessageType": to_enum(LogMsgType),
+        "OperatorId": to_uuid,
+        "EmployeeFirstName": to_str,
+        "EmployeeLastName": to_str,
+        "EmployeeSecondName": to_str,
+        "EmployeePosition": to_str,
+        "EmployeeGroupFullPath": to_str,
+    })
+    __slots__ = tuple(name for name, _ in _fields.values()) + ("AddFields", "Site")
+
+    Data: str
+
+    DateTime: datetime
+    Details: str
+    DriverId: UUID
+    EmployeeId: UUID
+    IsKeyEvent: bool
+    LogMessageId: int
+
+    Message: str
+    MessageSubType: LogMsgSubType
+    MessageType: LogMsgType
+    OperatorId: UUID
+
+    AddFields: [AdditionalFieldInfo]
+
+    EmployeeFirstName: str
+    EmployeeLastName: str
+    EmployeeSecondName: str
+
+    EmployeePosition: str
+
+    EmployeeGroupFullPath: str
+
+    Site: str  # Площадка (сервер) ClientPool, заполняется клиентом
+
+    tag = qualified(NS_NOTIFICATIONS, "EmployeePassageNotification")
+    _add_fields_tag = qualified(NS_NOTIFICATIONS, "AddFields")
+    _add_fields_path = "/".join(
+        qualified(NS_ADDITIONAL_FIELDS, name) for name in ("Fields", "AdditionalFieldValue", "AdditionalFieldInfo")
+    )
 
     def __init__(self, document=None):
         self.AddFields = []
         if isinstance(document, Element):
             try:
-                for key in document:
-                    key_tag = key.tag.replace("{"+self.__namespace['a']+"}", "")
-
-                    if key_tag == "AddFields":
-                        fields = key.findall('b:Fields/b:AdditionalFieldValue/b:AdditionalFieldInfo', self.__namespace)
-                        for field in fields:
-                            self.AddFields.append(AdditionalFieldInfo(field, self.__namespace))
-                        continue
+                fill_fields(self, document, self._fields)
 
-                    setattr(self, key_tag, key.text)
+                add_fields = document.find(self._add_fields_tag)
+                if add_fields is not None:
+                    for field in add_fields.iterfind(self._add_fields_path):
+                        self.AddFields.append(AdditionalFieldInfo(field))
 
             except Exception:
                 raise TypeError("type xml.etree.ElementTree.Element only")
 
 
-class LogMessageTypeSlimInfo:
-    LogMesssageType = str
-    Name = str
-    OrderNumber = int
-    Publish = bool
+class LogMessageTypeSlimInfo(Model):
+    _fields = field_table(NS_LOG, {
+        "LogMesssageType": to_enum(LogMsgType),
+        "Name": to_str,
+        "OrderNumber": to_int,
+        "Publish": to_bool,
+    })
+    __slots__ = tuple(name for name, _ in _fields.values())
 
-    _namespace = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity.Log"
+    LogMesssageType: LogMsgType
+    Name: str
+    OrderNumber: int
+    Publish: bool
 
     def __init__(self, document):
         if isinstance(document, Element):
             try:
-                for element in document:
-                    tag = element.tag.replace("{"+self._namespace+"}", "")
-                    setattr(self, tag, element.text)
+                fill_fields(self, document, self._fields)
 
             except Exception:
                 raise TypeError("type xml.etree.ElementTree.Element only")
 
 
-class LogMessageSubtypeSlimInfo:
-    LogMessageSubtype = str
-    LogMesssageType = str
-    Name = str
-    OrderNumber = int
-    Publish = bool
+class LogMessageSubtypeSlimInfo(Model):
+    _fields = field_table(NS_LOG, {
+        "LogMessageSubtype": to_enum(LogMsgSubType),
+        "LogMesssageType": to_enum(LogMsgType),
+        "Name": to_str,
+        "OrderNumber": to_int,
+        "Publish": to_bool,
+    })
+    __slots__ = tuple(name for name, _ in _fields.values())
 
-    _namespace = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity.Log"
+    LogMessageSubtype: LogMsgSubType
+    LogMesssageType: LogMsgType
+    Name: str
+    OrderNumber: int
+    Publish: bool
 
     def __init__(self, document):
         if isinstance(document, Element):
             try:
-                for element in document:
-                    tag = element.tag.replace("{"+self._namespace+"}", "")
-                    setattr(self, tag, element.text)
+                fill_fields(self, document, self._fields)
             except Exception:
                 raise TypeError("type xml.etree.ElementTree.Element only")
 
 
-class LNetInfo:
+class LNetInfo(Model):
+    _fields = field_table(NS_ENTITY, {
+        "GatewayUrl": to_str,
+        "Id": to_uuid,
+        "IsAttached": to_bool,
+    })
+    __slots__ = tuple(name for name, _ in _fields.values())
+
     GatewayUrl: str
-    Id = str
-    IsAttached = bool
+    Id: UUID
+    IsAttached: bool
 
-    _namespace = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity"
+    tag = qualified(NS_ENTITY, "LNetInfo")
 
     def __init__(self, document):
         if isinstance(document, Element):
             try:
-                for element in document:
-                    tag = element.tag.replace("{"+self._namespace+"}", "")
-                    setattr(self, tag, element.text)
+                fill_fields(self, document, self._fields)
             except Exception:
                 raise TypeError("type xml.etree.ElementTree.Element only")
 
 
-class LServerInfo:
-    Id = str
-    IdNet = str
-    IsAttached = str
-    ServerType = str
-    Url = str
+class LServerInfo(Model):
+    _fields = field_table(NS_ENTITY, {
+        "Id": to_uuid,
+        "IdNet": to_uuid,
+        "IsAttached": to_bool,
+        "ServerType": to_str,
+        "Url": to_str,
+    })
+    __slots__ = tuple(name for name, _ in _fields.values())
 
-    _namespace = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity"
+    Id: UUID
+    IdNet: UUID
+    IsAttached: bool
+    ServerType: str
+    Url: str
 
     def __init__(self, document):
         if isinstance(document, Element):
             try:
-                for element in document:
-                    tag = element.tag.replace("{"+self._namespace+"}", "")
-                    setattr(self, tag, element.text)
+                fill_fields(self, document, self._fields)
             except Exception:
                 raise TypeError("type xml.etree.ElementTree.Element only")
 
 
-class LDriverFullInfo:
-    DeviceServerId = str
-    Id = str
-    ParentId = str
+class LDriverFullInfo(Model):
+    _fields = field_table(NS_ENTITY, {
+        "DeviceServerId": to_uuid,
+        "Id": to_uuid,
+        "ParentId": to_uuid,
+        "DriverType": to_str,
+        "IsActive": to_bool,
+        "IsUnknownID": to_bool,
+        "Name": to_str,
+        "ParentPropertyName": to_str,
+        "State": to_str,
+    })
+    __slots__ = tuple(name for name, _ in _fields.values()) + ("Properties", "States")
+
+    DeviceServerId: UUID
+    Id: UUID
+    ParentId: UUID
 
-    DriverType = str
+    DriverType: str
 
-    IsActive = bool
-    IsUnknownID = bool
+    IsActive: bool
+    IsUnknownID: bool
 
-    Name = str
-    ParentPropertyName = str
+    Name: str
+    ParentPropertyName: str
 
-    Properties = None
+    Properties: dict
 
-    State = str
-    States = None
+    State: str
+    States: dict
 
-    _namespace = "http://schemas.datacontract.org/2004/07/VVIInvestment.RusGuard.DAL.Entities.Entity"
+    _properties_tag = qualified(NS_ENTITY, "Properties")
+    _states_tag = qualified(NS_ENTITY, "States")
+    _property_name_tag = qualified(NS_ENTITY, "PropertyName")
+    _value_tag = qualified(NS_ENTITY, "Value")
 
     def __init__(self, document):
         if isinstance(document, Element):
             self.Properties = {}
             self.States = {}
-            for element in document:
-                tag = element.tag.replace("{"+self._namespace+"}", "")
-
-                if tag == "Properties":
-                    for sub_element in element:
-                        key = sub_element.find("{"+self._namespace+"}PropertyName").text
-                        value = sub_element.find("{"+self._namespace+"}Value").text
-                        self.Properties[key] = value
-                    continue
-
-                if tag == "States":
-                    for sub_element in element:
-                        key = sub_element.find("{"+self._namespace+"}PropertyName").text
-                        value = sub_element.find("{"+self._namespace+"}Value").text
-                        self.States[key] = value
-                    continue
-
-                setattr(self, tag, element.text)
+            fill_fields(self, document, self._fields)
+
+            properties = document.find(self._properties_tag)
+            if properties is not None:
+                self._read_properties(properties, self.Properties)
+
+            states = document.find(self._states_tag)
+            if states is not None:
+                self._read_properties(states, self.States)
+
+    def _read_properties(self, element, target):
+        for sub_element in element:
+            key = sub_element.find(self._property_name_tag).text
+            value = sub_element.find(self._value_tag).text
+            target[key] = value
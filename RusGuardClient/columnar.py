@@ -0,0 +1,294 @@
+from datetime import datetime, timezone
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from RusGuardClient.Models import LogMessage
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError("Для работы EventBatch требуется пакет numpy: pip install numpy")
+
+
+class Dictionary:
+    """
+    Словарное кодирование значений столбца: значение -> код.
+    Отсутствующее значение (None) кодируется как -1.
+    """
+    __slots__ = ("values", "_codes")
+
+    def __init__(self, values=()):
+        self.values = []
+        self._codes = {}
+        for value in values:
+            self.code(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value) -> int:
+        if value is None:
+            return -1
+
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def lookup(self, value) -> int:
+        """
+        Код существующего значения без добавления в словарь
+        :return: Код или -2, если значение не встречалось
+        """
+        if value is None:
+            return -1
+        return self._codes.get(value, -2)
+
+    def decode(self, code):
+        return None if code < 0 else self.values[code]
+
+
+def _utc(value: datetime):
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class EventBatchBuilder:
+    """
+    Построчная сборка EventBatch без хранения списка LogMessage
+    """
+
+    def __init__(self):
+        _require_numpy()
+        self._ids = []
+        self._timestamps = []
+        self._types = []
+        self._subtypes = []
+        self._employees = []
+        self._drivers = []
+
+        self._dictionaries = {column: Dictionary() for column in EventBatch.columns}
+
+    def append(self, message: LogMessage):
+        dictionaries = self._dictionaries
+
+        self._ids.append(message.Id)
+        self._timestamps.append(_utc(message.DateTime))
+        self._types.append(dictionaries["type"].code(message.LogMessageType))
+        self._subtypes.append(dictionaries["subtype"].code(message.LogMessageSubType))
+        self._employees.append(dictionaries["employee"].code(message.EmployeeID))
+        self._drivers.append(dictionaries["driver"].code(message.DriverID))
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def build(self):
+        return EventBatch(
+            ids=numpy.array(self._ids, dtype=numpy.int64),
+            timestamps=numpy.array(self._timestamps, dtype="datetime64[us]"),
+            codes={
+                "type": numpy.array(self._types, dtype=numpy.int32),
+                "subtype": numpy.array(self._subtypes, dtype=numpy.int32),
+                "employee": numpy.array(self._employees, dtype=numpy.int32),
+                "driver": numpy.array(self._drivers, dtype=numpy.int32),
+            },
+            dictionaries=self._dictionaries
+        )
+
+
+class EventBatch:
+    """
+    Столбцовое представление страницы событий.
+    Идентификаторы и время (UTC) хранятся в массивах NumPy, типы, подтипы,
+    сотрудники и устройства - кодами словарей, что позволяет фильтровать
+    и группировать события векторными операциями.
+    """
+    columns = ("type", "subtype", "employee", "driver")
+
+    def __init__(self, ids, timestamps, codes, dictionaries):
+        """
+        :param ids: Идентификаторы сообщений, int64
+        :param timestamps: Время сообщений в UTC, datetime64[us]
+        :param codes: {Столбец: массив кодов int32}
+        :param dictionaries: {Столбец: Dictionary}
+        """
+        _require_numpy()
+        self.ids = ids
+        self.timestamps = timestamps
+        self.codes = codes
+        self.dictionaries = dictionaries
+
+    @classmethod
+    def builder(cls) -> EventBatchBuilder:
+        return EventBatchBuilder()
+
+    @classmethod
+    def from_messages(cls, messages):
+        """
+        :param messages: Итерируемый набор LogMessage
+        :return: EventBatch
+        """
+        builder = EventBatchBuilder()
+        builder.extend(messages)
+        return builder.build()
+
+    @classmethod
+    def concat(cls, batches):
+        """
+        Объединение нескольких пакетов с перекодировкой словарей
+        :param batches: Список EventBatch
+        :return: EventBatch
+        """
+        _require_numpy()
+        batches = list(batches)
+        if not batches:
+            return EventBatchBuilder().build()
+
+        dictionaries = {column: Dictionary() for column in cls.columns}
+        codes = {column: [] for column in cls.columns}
+
+        for batch in batches:
+            for column in cls.columns:
+                dictionary = dictionaries[column]
+                mapping = numpy.array(
+                    [dictionary.code(value) for value in batch.dictionaries[column].values] + [-1],
+                    dtype=numpy.int32
+                )
+                # Код -1 (None) при индексации берет последний элемент mapping, равный -1
+                codes[column].append(mapping[batch.codes[column]])
+
+        return cls(
+            ids=numpy.concatenate([batch.ids for batch in batches]),
+            timestamps=numpy.concatenate([batch.timestamps for batch in batches]),
+            codes={column: numpy.concatenate(codes[column]) for column in cls.columns},
+            dictionaries=dictionaries
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        """
+        Выборка строк по маске, срезу или массиву индексов
+        :return: EventBatch с теми же словарями
+        """
+        return EventBatch(
+            ids=self.ids[index],
+            timestamps=self.timestamps[index],
+            codes={column: codes[index] for column, codes in self.codes.items()},
+            dictionaries=self.dictionaries
+        )
+
+    def values(self, column) -> list:
+        """
+        Раскодированные значения столбца
+        :param column: type, subtype, employee или driver
+        :return: Список значений
+        """
+        dictionary = self.dictionaries[column]
+        return [dictionary.decode(code) for code in self.codes[column].tolist()]
+
+    def _isin(self, column, values):
+        dictionary = self.dictionaries[column]
+        wanted = [dictionary.lookup(value) for value in values]
+        return numpy.isin(self.codes[column], [code for code in wanted if code != -2])
+
+    def mask(self, types=None, subtypes=None, employees=None, drivers=None, start=None, end=None):
+        """
+        Булева маска строк, удовлетворяющих всем заданным условиям
+        :param types: Типы сообщений
+        :param subtypes: Подтипы сообщений
+        :param employees: Идентификаторы сотрудников
+        :param drivers: Идентификаторы устройств
+        :param start: Начало периода (включительно)
+        :param end: Конец периода (не включительно)
+        :return: numpy.ndarray[bool]
+        """
+        result = numpy.ones(len(self), dtype=bool)
+
+        for column, values in (("type", types), ("subtype", subtypes), ("employee", employees), ("driver", drivers)):
+            if values is not None:
+                result &= self._isin(column, values)
+
+        if start is not None:
+            result &= self.timestamps >= numpy.datetime64(_utc(start), "us")
+        if end is not None:
+            result &= self.timestamps < numpy.datetime64(_utc(end), "us")
+
+        return result
+
+    def filter(self, **conditions):
+        """
+        Отбор строк, см. mask
+        :return: EventBatch
+        """
+        return self[self.mask(**conditions)]
+
+    def count_by(self, column) -> dict:
+        """
+        Количество событий по значениям столбца
+        :param column: type, subtype, employee или driver
+        :return: {Значение: количество}
+        """
+        dictionary = self.dictionaries[column]
+        codes = self.codes[column]
+        counts = numpy.bincount(codes + 1, minlength=len(dictionary) + 1)
+
+        return {
+            dictionary.decode(code - 1): int(count)
+            for code, count in enumerate(counts.tolist()) if count
+        }
+
+    def group_by(self, column) -> dict:
+        """
+        Разбиение пакета по значениям столбца
+        :param column: type, subtype, employee или driver
+        :return: {Значение: EventBatch}
+        """
+        dictionary = self.dictionaries[column]
+        codes = self.codes[column]
+
+        order = numpy.argsort(codes, kind="stable")
+        unique, starts = numpy.unique(codes[order], return_index=True)
+        bounds = list(starts[1:]) + [len(order)]
+
+        return {
+            dictionary.decode(int(code)): self[order[start:stop]]
+            for code, start, stop in zip(unique.tolist(), starts.tolist(), bounds)
+        }
+
+    def time_buckets(self, interval, column=None):
+        """
+        Количество событий по интервалам времени
+        :param interval: Длина интервала, datetime.timedelta
+        :param column: Если задан, счет ведется отдельно по каждому значению столбца
+        :return: (начала интервалов datetime64[us], количества) или
+                 (начала интервалов, значения столбца, матрица количеств [интервал, значение])
+        """
+        step = numpy.timedelta64(interval, "us").astype(numpy.int64)
+        valid = ~numpy.isnat(self.timestamps)
+        ticks = self.timestamps[valid].astype(numpy.int64) // step
+
+        buckets, bucket_index = numpy.unique(ticks, return_inverse=True)
+        starts = (buckets * step).astype("datetime64[us]")
+
+        if column is None:
+            return starts, numpy.bincount(bucket_index, minlength=len(buckets))
+
+        dictionary = self.dictionaries[column]
+        width = len(dictionary) + 1
+        codes = self.codes[column][valid] + 1
+        counts = numpy.bincount(bucket_index * width + codes, minlength=len(buckets) * width)
+        counts = counts.reshape(len(buckets), width)
+
+        values = [None] + list(dictionary.values)
+        return starts, values, counts
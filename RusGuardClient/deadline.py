@@ -0,0 +1,157 @@
+import asyncio
+import random
+import time
+from bisect import bisect_left, insort
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+
+# Действия, повтор которых не изменяет состояние сервера: их можно повторять и дублировать
+IDEMPOTENT_ACTIONS = frozenset((
+    "GetVariable",
+    "GetLastEvent",
+    "GetEvents",
+    "GetFilteredEvents",
+    "GetAcsEmployeePhoto",
+    "GetLogMessageTypes",
+    "GetLogMessageSubtypes",
+    "GetAllNets",
+    "GetNetServers",
+    "GetServerDriversFullInfo",
+))
+
+_deadline = ContextVar("rusguard_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Ограничение общего времени выполнения запросов внутри блока, включая повторы.
+    Вложенный блок не может продлить срок внешнего.
+
+    Пример:
+        with deadline(2.0):
+            photo = await client.get_employee_photo(employee_id)
+    :param seconds: Время на выполнение блока (сек.)
+    """
+    expires = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        expires = min(expires, current)
+
+    token = _deadline.set(expires)
+    try:
+        yield expires
+    finally:
+        _deadline.reset(token)
+
+
+def remaining(timeout=None) -> float:
+    """
+    Время, оставшееся на запрос, с учетом срока текущего блока deadline
+    :param timeout: Собственный таймаут запроса (сек.)
+    :return: Наименьшее из таймаута и остатка срока
+    """
+    expires = _deadline.get()
+    if expires is None:
+        return timeout
+
+    left = expires - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("Срок выполнения запроса истек")
+    return left if timeout is None else min(timeout, left)
+
+
+def detached_context():
+    """
+    Копия текущего контекста без срока блока deadline: для задачи, результат которой
+    ожидают несколько вызовов, каждый со своим сроком
+    :return: contextvars.Context
+    """
+    context = copy_context()
+    context.run(_deadline.set, None)
+    return context
+
+
+class RetryPolicy:
+    """
+    Ограниченные повторы с экспоненциальной задержкой и случайным разбросом (full jitter)
+    """
+
+    def __init__(self, attempts=3, base_delay=0.1, max_delay=2.0):
+        """
+        :param attempts: Максимальное количество попыток, включая первую
+        :param base_delay: Задержка перед первым повтором (сек.)
+        :param max_delay: Максимальная задержка (сек.)
+        """
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt) -> float:
+        """
+        :param attempt: Номер неудачной попытки, начиная с 0
+        :return: Задержка перед следующей попыткой (сек.)
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class LatencyTracker:
+    """
+    Скользящее окно времени ответа по SOAP действиям для расчета процентилей
+    """
+
+    def __init__(self, window=200, min_samples=20):
+        """
+        :param window: Количество последних запросов в окне
+        :param min_samples: Минимальное количество запросов для расчета процентиля
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}  # type: {str: deque}
+        self._sorted = {}  # type: {str: list}
+
+    def record(self, action, seconds):
+        samples = self._samples.get(action)
+        if samples is None:
+            samples = self._samples[action] = deque()
+            self._sorted[action] = []
+
+        ordered = self._sorted[action]
+        if len(samples) >= self.window:
+            ordered.pop(bisect_left(ordered, samples.popleft()))
+        samples.append(seconds)
+        insort(ordered, seconds)
+
+    def percentile(self, action, q):
+        """
+        :param action: SOAP действие
+        :param q: Процентиль, 0..1
+        :return: Время ответа (сек.) или None, если запросов недостаточно
+        """
+        ordered = self._sorted.get(action)
+        if not ordered or len(ordered) < self.min_samples:
+            return None
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def first_successful(tasks):
+    """
+    Результат первой успешно завершившейся задачи; остальные задачи отменяются.
+    Если все задачи завершились ошибкой, возбуждается последняя ошибка.
+    :param tasks: Набор asyncio.Task
+    :return:
+    """
+    pending = set(tasks)
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
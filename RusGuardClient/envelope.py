@@ -0,0 +1,316 @@
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+from json import loads
+from pathlib import Path
+
+from RusGuardClient import Decoder
+from RusGuardClient.xml_creator import xml_document
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / "Templates"
+
+# Маркер слота, который подставляется в документ при компиляции шаблона
+_SLOT_MARK = "\ue000"
+_SLOT_RE = re.compile(_SLOT_MARK + "([^" + _SLOT_MARK + "]*)" + _SLOT_MARK)
+
+_MISSING = object()
+
+
+def _escape(value: str) -> str:
+    """
+    Экранирование текста так же, как это делает xml.dom.minidom
+    :param value: Текст
+    :return:
+    """
+    return value.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
+def _format_str(value) -> bytes:
+    return _escape(str(value)).encode()
+
+
+def _format_int(value) -> bytes:
+    return str(int(value)).encode()
+
+
+def _format_datetime(value) -> bytes:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return _escape(str(value)).encode()
+
+
+def _format_bool(value) -> bytes:
+    if isinstance(value, str):
+        return _escape(value).encode()
+    return b"true" if value else b"false"
+
+
+def _format_created(value: datetime) -> bytes:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ").encode()
+
+
+def _format_expires(value: datetime) -> bytes:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%f3Z").encode()
+
+
+FORMATTERS = {
+    "str": _format_str,
+    "uuid": _format_str,
+    "int": _format_int,
+    "datetime": _format_datetime,
+    "bool": _format_bool,
+    "created": _format_created,
+    "expires": _format_expires,
+}
+
+class ArraySlot:
+    """
+    Слот-массив: элемент шаблона целиком заменяется списком значений.
+    Пустой список выводится так, как элемент записан в шаблоне (например, i:nil="true"),
+    непустой - без атрибута i:nil, с дочерним элементом item_tag на каждое значение.
+    """
+
+    def __init__(self, item_tag):
+        self.item_tag = item_tag
+
+    def formatter(self, tag, attributes, default: bytes):
+        attributes = "".join(
+            f' {key}="{_escape(str(value))}"' for key, value in attributes.items() if key != "i:nil"
+        )
+        open_tag = f"<{tag}{attributes}>".encode()
+        close_tag = f"</{tag}>".encode()
+        item_open = f"<{self.item_tag}>".encode()
+        item_close = f"</{self.item_tag}>".encode()
+
+        def format_array(values) -> bytes:
+            if not values:
+                return default
+            items = b"".join(item_open + _format_str(value) + item_close for value in values)
+            return open_tag + items + close_tag
+
+        return format_array
+
+
+# Слоты заголовка WS-Security, общие для всех запросов
+HEADER_SLOTS = {
+    "created": "created",
+    "expires": "expires",
+    "token_id": "str",
+    "username": "str",
+    "password": "str",
+}
+
+# Изменяемые поля шаблонов: путь к элементу внутри метода -> тип слота.
+# Имя слота - последний элемент пути без префикса пространства имен.
+SLOTS = {
+    "GetEvents": {
+        "fromMessageId": "int",
+        "fromDateTime": "datetime",
+        "toDateTime": "datetime",
+        "pageNumber": "int",
+        "pageSize": "int",
+    },
+    "GetFilteredEvents": {
+        "fromMessageId": "int",
+        "fromDateTime": "datetime",
+        "toDateTime": "datetime",
+        "msgTypes": ArraySlot("a:LogMsgType"),
+        "msgSubTypes": ArraySlot("a:LogMsgSubType"),
+        "deviceIDs": ArraySlot("a:guid"),
+        "subjectIDs": ArraySlot("a:guid"),
+        "subjectType": "str",
+        "pageNumber": "int",
+        "pageSize": "int",
+        "sortedColumn": "str",
+        "sortOrder": "str",
+        "isShowEventsWithRelatedData": "bool",
+        "subjectIDs2": ArraySlot("a:guid"),
+        "subjectType2": "str",
+        "isShowRemovedEmployes": "bool",
+        "isEmptyConsider": "bool",
+        "isReturnLogCount": "bool",
+    },
+    "GetNotification": {
+        "connectionId": "uuid",
+    },
+    "GetAcsEmployeePhoto": {
+        "employeeId": "uuid",
+        "photoNumber": "int",
+    },
+    "GetNetServers": {
+        "id": "uuid",
+    },
+    "GetServerDriversFullInfo": {
+        "serverID": "uuid",
+    },
+    "Process": {
+        "operation/a:Id": "uuid",
+        "operation/a:MethodArgs/a:MethodName": "str",
+        "connectionId": "uuid",
+    },
+}
+
+
+def _slot_name(path: str) -> str:
+    return path.rsplit("/", 1)[-1].rsplit(":", 1)[-1]
+
+
+class EnvelopeTemplate:
+    """
+    Скомпилированный SOAP конверт: неизменяемые байтовые фрагменты,
+    между которыми подставляются значения типизированных слотов.
+    """
+    __slots__ = ("name", "method", "_head", "_tail", "_defaults")
+
+    def __init__(self, name, fragments, slots, defaults, method=None):
+        """
+        :param name: Имя шаблона
+        :param fragments: Байтовые фрагменты документа, len(fragments) == len(slots) + 1
+        :param slots: Список пар (имя слота, функция форматирования)
+        :param defaults: Значения слотов по умолчанию в отформатированном виде
+        :param method: Имя метода сервиса (корневой элемент Body), по умолчанию - имя шаблона
+        """
+        self.name = name
+        self.method = method or name
+        self._head = fragments[0]
+        self._tail = tuple(
+            (slot_name, formatter, fragment) for (slot_name, formatter), fragment in zip(slots, fragments[1:])
+        )
+        self._defaults = defaults
+
+    @property
+    def slots(self):
+        return tuple(slot_name for slot_name, _, _ in self._tail)
+
+    def render(self, **values) -> bytes:
+        """
+        Заполнение слотов шаблона
+        :param values: Значения слотов, незаданные слоты берутся из шаблона
+        :return: Готовый к отправке документ
+        """
+        parts = [self._head]
+        for slot_name, formatter, fragment in self._tail:
+            value = values.get(slot_name, _MISSING)
+            if value is _MISSING:
+                parts.append(self._defaults[slot_name])
+            else:
+                parts.append(formatter(value))
+            parts.append(fragment)
+
+        return b"".join(parts)
+
+
+class TemplateEngine:
+    """
+    Загружает и компилирует все шаблоны запросов один раз.
+    """
+
+    def __init__(self, template_dir=TEMPLATE_DIR):
+        self._templates = {}  # type: {str: EnvelopeTemplate}
+
+        for path in sorted(Path(template_dir).glob("*.json")):
+            json_file = loads(path.read_text(encoding="utf-8"))
+            self._templates[path.stem] = self._compile(path.stem, json_file)
+
+    def __contains__(self, name):
+        return name in self._templates
+
+    def template(self, name) -> EnvelopeTemplate:
+        return self._templates[name]
+
+    def render(self, name, username, password, token_id, **values) -> bytes:
+        """
+        Формирует запрос с заголовком безопасности
+        :param name: Имя шаблона
+        :param username: Имя пользователя
+        :param password: Пароль
+        :param token_id: Идентификатор UsernameToken
+        :param values: Значения слотов тела запроса
+        :return: SOAP документ
+        """
+        created = datetime.utcnow()
+
+        return self._templates[name].render(
+            created=created,
+            expires=created + timedelta(minutes=5),
+            token_id=token_id,
+            username=username,
+            password=password,
+            **values
+        )
+
+    @staticmethod
+    def _mark(slot_name) -> str:
+        return _SLOT_MARK + slot_name + _SLOT_MARK
+
+    def _compile(self, name, json_file) -> EnvelopeTemplate:
+        """
+        Компиляция JSON шаблона в SOAP конверт со слотами.
+        Документ строится теми же средствами, что и раньше (xml_creator, JsonToXML),
+        поэтому результат побайтно совпадает с прежним.
+        :param name: Имя шаблона
+        :param json_file: Содержимое JSON шаблона
+        :return:
+        """
+        root_key = next(iter(json_file))
+        formatters = {name: FORMATTERS[slot_type] for name, slot_type in HEADER_SLOTS.items()}
+        defaults = {}
+        arrays = {}
+
+        for path, slot_type in SLOTS.get(name, {}).items():
+            slot_name = _slot_name(path)
+            keys = path.split("/")
+
+            parent = json_file[root_key]
+            for key in keys[:-1]:
+                parent = parent[key]
+            value = parent[keys[-1]]
+
+            if isinstance(slot_type, ArraySlot):
+                default = Decoder.JsonToXML(parent, keys[-1]).toxml().encode()
+                formatters[slot_name] = slot_type.formatter(keys[-1], value.get("_attributes", {}), default)
+                defaults[slot_name] = default
+                arrays[slot_name] = keys[-1]
+            else:
+                formatters[slot_name] = FORMATTERS[slot_type]
+                defaults[slot_name] = _format_str(value)
+
+            parent[keys[-1]] = self._mark(slot_name)
+
+        xml_root = xml_document()
+        xml_root.xml_timestamp()
+        xml_root.xml_usernametoken(self._mark("username"), self._mark("password"), self._mark("token_id"))
+
+        for tag in ("created", "expires"):
+            node = xml_root.security.getElementsByTagName(f"u:{tag.capitalize()}")[0]
+            node.firstChild.data = self._mark(tag)
+
+        document = xml_root.xml_simple(
+            Decoder.JsonToXML(json_file)
+        ).toxml()
+
+        pieces = _SLOT_RE.split(document)
+
+        # Слот-массив заменяет элемент целиком, поэтому обрамляющие
+        # теги, созданные вокруг маркера, из соседних фрагментов убираются
+        for index in range(1, len(pieces), 2):
+            slot_name = pieces[index]
+            if slot_name in arrays:
+                tag = arrays[slot_name]
+                pieces[index - 1] = pieces[index - 1][:-len(f"<{tag}>")]
+                pieces[index + 1] = pieces[index + 1][len(f"</{tag}>"):]
+
+        fragments = [piece.encode() for piece in pieces[0::2]]
+        slots = [(slot_name, formatters[slot_name]) for slot_name in pieces[1::2]]
+
+        return EnvelopeTemplate(name, fragments, slots, defaults, root_key)
+
+
+@lru_cache(maxsize=None)
+def load_templates(template_dir=TEMPLATE_DIR) -> TemplateEngine:
+    """
+    Возвращает общий для процесса набор скомпилированных шаблонов
+    :param template_dir: Каталог с JSON шаблонами
+    :return:
+    """
+    return TemplateEngine(template_dir)
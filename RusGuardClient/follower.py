@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+
+class FileCursor:
+    """
+    Позиция чтения журнала событий (идентификатор последнего обработанного сообщения),
+    сохраняемая в локальный файл
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def load(self):
+        """
+        :return: Сохраненный идентификатор сообщения или None
+        """
+        try:
+            return int(self.path.read_text().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def store(self, message_id):
+        """
+        Атомарная запись позиции: запись во временный файл и замена
+        :param message_id: Идентификатор сообщения
+        :return:
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        temporary.write_text(str(message_id))
+        os.replace(temporary, self.path)
+
+    async def save(self, message_id):
+        await asyncio.to_thread(self.store, message_id)
+
+
+class EventFollower:
+    """
+    Непрерывное чтение новых событий сервера.
+
+    Пока события поступают, опрос идет с минимальным интервалом (а при полной
+    странице - без паузы), при их отсутствии интервал увеличивается до максимального.
+    Позиция (watermark) продвигается по LogMessage.Id, когда потребитель запрашивает
+    следующее сообщение, и сохраняется в файл после каждой страницы и при закрытии.
+    Сообщение, на котором чтение было прервано, после перезапуска будет получено повторно.
+
+    Пример:
+        async for message in client.tail("./cursor"):
+            ...
+    """
+
+    def __init__(self, client, cursor=None, from_message_id=None,
+                 min_interval=0.2, max_interval=10.0, backoff=2.0, page_size=1000):
+        """
+        :param client: AsyncNetworkClient
+        :param cursor: FileCursor или путь к файлу позиции
+        :param from_message_id: Начальная позиция, если она не сохранена в файле
+        :param min_interval: Интервал опроса при поступлении событий (сек.)
+        :param max_interval: Максимальный интервал опроса при отсутствии событий (сек.)
+        :param backoff: Множитель увеличения интервала
+        :param page_size: Размер запрашиваемой страницы
+        """
+        if cursor is not None and not isinstance(cursor, FileCursor):
+            cursor = FileCursor(cursor)
+
+        self._client = client
+        self._cursor = cursor
+        self._from_message_id = from_message_id
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.page_size = page_size
+
+        self.watermark = None
+        self._saved = None
+
+    async def _initial_watermark(self):
+        if self._cursor is not None:
+            message_id = await asyncio.to_thread(self._cursor.load)
+            if message_id is not None:
+                logging.info("Чтение событий продолжается с сообщения %s", message_id)
+                return message_id
+
+        if self._from_message_id is not None:
+            return self._from_message_id
+
+        event = await self._client.get_last_event()
+        return event.Id
+
+    async def save(self):
+        """
+        Сохранение текущей позиции в файл
+        :return:
+        """
+        if self._cursor is not None and self.watermark is not None and self.watermark != self._saved:
+            await self._cursor.save(self.watermark)
+            self._saved = self.watermark
+
+    def __aiter__(self):
+        return self._follow()
+
+    async def _follow(self):
+        if self.watermark is None:
+            self.watermark = await self._initial_watermark()
+            self._saved = self.watermark
+
+        interval = self.min_interval
+
+        try:
+            while True:
+                page = await self._client.get_events_page(self.watermark, page_size=self.page_size)
+
+                for message in page:
+                    yield message
+                    if message.Id > self.watermark:
+                        self.watermark = message.Id
+
+                await self.save()
+
+                if len(page) >= self.page_size:
+                    continue
+
+                if page:
+                    interval = self.min_interval
+                else:
+                    interval = min(interval * self.backoff, self.max_interval)
+
+                await asyncio.sleep(interval)
+        finally:
+            await self.save()
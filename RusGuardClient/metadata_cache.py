@@ -0,0 +1,184 @@
+import asyncio
+import functools
+import inspect
+import logging
+import os
+import pickle
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+DEFAULT_TTLS = {
+    "get_log_message_types": timedelta(hours=24),
+    "get_log_message_subtypes": timedelta(hours=24),
+    "get_all_nets": timedelta(hours=1),
+    "get_net_servers": timedelta(hours=1),
+    "get_server_drivers_full_info": timedelta(minutes=10),
+}
+
+
+class MetadataCache:
+    """
+    Кэш редко изменяющихся справочных данных сервера (типы и подтипы сообщений,
+    сети, серверы, драйверы) с временем жизни для каждого метода.
+    Может сохраняться в файл, чтобы после перезапуска не запрашивать данные повторно.
+    """
+
+    def __init__(self, ttls=None, path=None):
+        """
+        :param ttls: {Имя метода: время жизни (timedelta)}, дополняет DEFAULT_TTLS;
+                     время жизни None отключает кэширование метода
+        :param path: Файл для сохранения кэша; None - только в памяти
+        """
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+
+        self.path = Path(path) if path is not None else None
+        self._items = {}  # type: {tuple: (object, float)}
+        self._loaded = self.path is None
+        self._save_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def ttl(self, method):
+        ttl = self.ttls.get(method)
+        return None if ttl is None else ttl.total_seconds()
+
+    def get(self, key):
+        """
+        :param key: (Имя метода, аргументы)
+        :return: (True, значение) или (False, None), если значения нет или оно устарело
+        """
+        item = self._items.get(key)
+        if item is None:
+            return False, None
+
+        value, expires = item
+        if time.time() >= expires:
+            del self._items[key]
+            return False, None
+        return True, value
+
+    def put(self, key, value):
+        ttl = self.ttl(key[0])
+        if ttl is not None:
+            self._items[key] = (value, time.time() + ttl)
+
+    def invalidate(self, method=None, *args):
+        """
+        Удаление значений из кэша
+        :param method: Имя метода; None - очистить весь кэш
+        :param args: Аргументы вызова; если не заданы - все значения метода
+        :return:
+        """
+        if method is None:
+            self._items.clear()
+            return
+
+        for key in list(self._items):
+            if key[0] == method and (not args or key[1] == args):
+                del self._items[key]
+
+    def load(self):
+        """
+        Чтение кэша из файла (блокирующий вызов)
+        :return:
+        """
+        self._loaded = True
+        if self.path is None:
+            return
+
+        try:
+            with open(self.path, "rb") as file:
+                items = pickle.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as error:
+            logging.error("Не удалось прочитать кэш справочников %s: %s", self.path, error)
+            return
+
+        now = time.time()
+        self._items.update({key: item for key, item in items.items() if item[1] > now})
+
+    def store(self, items=None):
+        """
+        Атомарная запись кэша в файл (блокирующий вызов)
+        :param items: Снимок значений кэша; None - текущие значения
+        :return:
+        """
+        if self.path is None:
+            return
+
+        if items is None:
+            items = dict(self._items)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Уникальный временный файл: одновременные записи (в том числе из других процессов) не смешиваются
+        with tempfile.NamedTemporaryFile(dir=self.path.parent, prefix=self.path.name + ".",
+                                         suffix=".tmp", delete=False) as file:
+            try:
+                pickle.dump(items, file, protocol=pickle.HIGHEST_PROTOCOL)
+            except BaseException:
+                file.close()
+                os.unlink(file.name)
+                raise
+        try:
+            os.replace(file.name, self.path)
+        except OSError:
+            os.unlink(file.name)
+            raise
+
+    async def ensure_loaded(self):
+        if not self._loaded:
+            await asyncio.to_thread(self.load)
+
+    async def save(self):
+        """
+        Запись кэша в файл; ошибка записи только записывается в журнал
+        :return:
+        """
+        if self.path is None:
+            return
+
+        async with self._save_lock:
+            # Снимок делается в цикле событий: словарь не изменяется во время чтения из потока
+            items = dict(self._items)
+            try:
+                await asyncio.to_thread(self.store, items)
+            except OSError as error:
+                logging.error("Не удалось сохранить кэш справочников %s: %s", self.path, error)
+
+
+def cached(method):
+    """
+    Декоратор метода AsyncNetworkClient: результат сохраняется в metadata_cache клиента
+    на время жизни, заданное для имени метода
+    """
+    name = method.__name__
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        cache = self.metadata_cache
+        if cache is None or cache.ttl(name) is None:
+            return await method(self, *args, **kwargs)
+
+        # Ключ не зависит от того, переданы аргументы позиционно, по имени или по умолчанию
+        arguments = signature.bind(self, *args, **kwargs)
+        arguments.apply_defaults()
+        key = (name, arguments.args[1:])
+
+        await cache.ensure_loaded()
+        found, value = cache.get(key)
+        if found:
+            return value
+
+        value = await method(self, *args, **kwargs)
+        cache.put(key, value)
+        await cache.save()
+        return value
+
+    return wrapper
@@ -0,0 +1,236 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Границы интервалов гистограмм времени (сек.)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными границами интервалов (как в Prometheus)
+    """
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list:
+        """
+        :return: [(граница, количество наблюдений <= границы)], последняя граница - +Inf
+        """
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """
+        Оценка квантиля по границам интервалов
+        :param q: Квантиль, 0..1
+        :return: Верхняя граница интервала, в который попадает квантиль, или None
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+        return float("inf")
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": self.cumulative(),
+        }
+
+
+class ActionMetrics:
+    """
+    Показатели одного SOAP действия
+    """
+    __slots__ = ("requests", "errors", "sent_bytes", "received_bytes", "latency", "encode", "decode")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.requests = 0
+        self.errors = {}  # type: {str: int}
+        self.sent_bytes = 0
+        self.received_bytes = 0
+        self.latency = Histogram(buckets)
+        self.encode = Histogram(buckets)
+        self.decode = Histogram(buckets)
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": dict(self.errors),
+            "sent_bytes": self.sent_bytes,
+            "received_bytes": self.received_bytes,
+            "latency": self.latency.as_dict(),
+            "encode": self.encode.as_dict(),
+            "decode": self.decode.as_dict(),
+        }
+
+
+class Timer:
+    """
+    Накопление времени нескольких вызовов (например, разбора ответа по частям) в одно наблюдение
+    """
+    __slots__ = ("_metrics", "kind", "action", "elapsed")
+
+    def __init__(self, metrics, kind, action):
+        self._metrics = metrics
+        self.kind = kind
+        self.action = action
+        self.elapsed = 0.0
+
+    def __call__(self, function, *args):
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.elapsed += time.perf_counter() - started
+
+    def stop(self):
+        getattr(self._metrics, self.kind)(self.action, self.elapsed)
+
+
+class Metrics:
+    """
+    Показатели запросов клиента по SOAP действиям: количество запросов и ошибок,
+    время ответа сервера, объем запросов и ответов, время формирования XML и разбора ответа.
+
+    Приемники (sinks) - функции sink(kind, action, value, error), вызываемые на каждое наблюдение:
+        kind - "request", "encode" или "decode"; value - время (сек.); error - имя ошибки или None.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.actions = {}  # type: {str: ActionMetrics}
+        self.sinks = []
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink):
+        if sink in self.sinks:
+            self.sinks.remove(sink)
+
+    def reset(self):
+        self.actions = {}
+
+    def action(self, action) -> ActionMetrics:
+        metrics = self.actions.get(action)
+        if metrics is None:
+            metrics = self.actions[action] = ActionMetrics(self.buckets)
+        return metrics
+
+    def _emit(self, kind, action, value, error=None):
+        for sink in self.sinks:
+            sink(kind, action, value, error)
+
+    def request(self, action, seconds, sent=0, received=0, error=None):
+        """
+        Учет запроса к серверу
+        :param action: SOAP действие
+        :param seconds: Время от отправки до получения ответа
+        :param sent: Размер запроса (байт)
+        :param received: Размер ответа (байт)
+        :param error: Имя класса ошибки или None
+        """
+        metrics = self.action(action)
+        metrics.requests += 1
+        metrics.sent_bytes += sent
+        metrics.received_bytes += received
+        if error is None:
+            metrics.latency.observe(seconds)
+        else:
+            metrics.errors[error] = metrics.errors.get(error, 0) + 1
+        self._emit("request", action, seconds, error)
+
+    def encode(self, action, seconds):
+        self.action(action).encode.observe(seconds)
+        self._emit("encode", action, seconds)
+
+    def decode(self, action, seconds):
+        self.action(action).decode.observe(seconds)
+        self._emit("decode", action, seconds)
+
+    @contextmanager
+    def measure(self, kind, action):
+        """
+        Учет времени выполнения блока
+        :param kind: "encode" или "decode"
+        :param action: SOAP действие
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            getattr(self, kind)(action, time.perf_counter() - started)
+
+    def timer(self, kind, action) -> Timer:
+        """
+        :param kind: "encode" или "decode"
+        :param action: SOAP действие
+        :return: Timer, время учитывается при вызове stop()
+        """
+        return Timer(self, kind, action)
+
+    def snapshot(self) -> dict:
+        """
+        :return: {SOAP действие: показатели}
+        """
+        return {action: metrics.as_dict() for action, metrics in sorted(self.actions.items())}
+
+    def prometheus(self, prefix="rusguard_client") -> str:
+        """
+        Показатели в текстовом формате Prometheus
+        :param prefix: Префикс имен метрик
+        :return:
+        """
+        lines = []
+
+        def counter(name, help_text, values):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for labels, value in values:
+                lines.append(f"{prefix}_{name}{{{labels}}} {value}")
+
+        def histogram(name, help_text, attribute):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            for action, metrics in sorted(self.actions.items()):
+                data = getattr(metrics, attribute)
+                for bound, total in data.cumulative():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{prefix}_{name}_bucket{{action="{action}",le="{le}"}} {total}')
+                lines.append(f'{prefix}_{name}_sum{{action="{action}"}} {data.sum}')
+                lines.append(f'{prefix}_{name}_count{{action="{action}"}} {data.count}')
+
+        actions = sorted(self.actions.items())
+        counter("requests_total", "Requests sent", [(f'action="{a}"', m.requests) for a, m in actions])
+        counter("errors_total", "Failed requests", [
+            (f'action="{a}",error="{error}"', count) for a, m in actions for error, count in sorted(m.errors.items())
+        ])
+        counter("request_bytes_total", "Request body bytes", [(f'action="{a}"', m.sent_bytes) for a, m in actions])
+        counter("response_bytes_total", "Response body bytes", [(f'action="{a}"', m.received_bytes) for a, m in actions])
+        histogram("request_seconds", "Server response time", "latency")
+        histogram("encode_seconds", "Request XML rendering time", "encode")
+        histogram("decode_seconds", "Response XML decoding time", "decode")
+
+        return "\n".join(lines) + "\n"
@@ -1,164 +1,264 @@
-import uuid
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import os
+import threading
+
+from RusGuardClient.ANetwork import AsyncNetworkClient
+from RusGuardClient.Models import LogMessage
 
-import requests
-import urllib3
-import logging
 
-from RusGuardClient import Decoder
-from datetime import datetime as dt
-from RusGuardClient.Models import LogMessage
-from RusGuardClient.xml_creator import xml_document
-from xml.dom.minidom import Document
-from json import loads
+class BackgroundLoop:
+    """
+    Цикл событий в отдельном потоке, общий для всех синхронных клиентов процесса.
+    Поток не наследуется дочерним процессом (fork), поэтому в нем создается новый цикл;
+    клиенты, созданные до fork, в дочернем процессе не работают.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="RusGuardClientLoop", daemon=True)
+        self.thread.start()
+
+        self._clients = {}  # type: {tuple: [AsyncNetworkClient, int, threading.Lock]}
+        self._clients_lock = threading.Lock()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    @classmethod
+    def _after_fork(cls):
+        # Блокировка могла быть захвачена другим потоком родителя в момент fork
+        cls._lock = threading.Lock()
+        cls._instance = None
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def acquire(self, key, factory):
+        """
+        Асинхронный клиент, общий для синхронных клиентов с одинаковым ключом
+        :param key: Ключ клиента (hashable); None - новый клиент, не общий
+        :param factory: Функция без аргументов, создающая AsyncNetworkClient
+        :return: (клиент, блокировка для подключения клиента)
+        """
+        if key is None:
+            return factory(), threading.Lock()
 
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-logging.basicConfig(format='[%(asctime)s] NetworkClient: %(message)s', datefmt='%d/%b/%y %H:%M:%S', level=logging.INFO)
+        with self._clients_lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = self._clients[key] = [factory(), 0, threading.Lock()]
+            entry[1] += 1
+            return entry[0], entry[2]
 
+    def release(self, key, client) -> bool:
+        """
+        :param key: Ключ клиента, см. acquire
+        :param client: Клиент, полученный из acquire
+        :return: Клиент больше никем не используется и его можно отключить
+        """
+        if key is None:
+            return True
+
+        with self._clients_lock:
+            entry = self._clients.get(key)
+            if entry is None or entry[0] is not client:
+                return True
+            entry[1] -= 1
+            if entry[1]:
+                return False
+            del self._clients[key]
+            return True
+
+    def run(self, coroutine, timeout=None):
+        """
+        Выполнение корутины в фоновом цикле с ожиданием результата в вызывающем потоке
+        :param coroutine: Корутина
+        :param timeout: Максимальное время ожидания (сек.)
+        :return: Результат корутины
+        """
+        if threading.current_thread() is self.thread:
+            coroutine.close()
+            raise RuntimeError("Синхронный клиент нельзя вызывать из его фонового цикла событий")
+        if os.getpid() != self.pid:
+            coroutine.close()
+            raise RuntimeError("Синхронный клиент, созданный до fork, нельзя использовать в дочернем процессе")
+
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # Без отмены корутина продолжила бы выполняться в фоновом цикле
+            future.cancel()
+            raise
 
-class NetworkClient:
-    url = None
-    session_uuid = None
-    client_uuid = None
 
-    request_count = 0
-    username = ""
-    password = ""
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=BackgroundLoop._after_fork)
+
 
-    def __init__(self, host, username, password):
-        self.url = f"https://{host}/LNetworkServer/LNetworkService.svc"
-        self.client_uuid = str(uuid.uuid4())
-        self.username = username
-        self.password = password
+class NetworkClient:
+    """
+    Синхронный клиент: потокобезопасная обертка над AsyncNetworkClient,
+    выполняемым в общем фоновом цикле событий. Вызовы из разных потоков
+    используют общий пул соединений, кэши и объединение запросов асинхронного клиента.
+    Синхронные клиенты с одинаковыми параметрами (например, созданные в разных потоках)
+    используют один AsyncNetworkClient и один сеанс; сеанс завершается при отключении последнего из них.
+    Методы AsyncNetworkClient (кроме асинхронных генераторов) доступны как синхронные,
+    например client.get_employee_photo(employee_id).
+    """
+
+    def __init__(self, host, username, password, shared=True, **kwargs):
+        """
+        :param host: Адрес сервера RusGuard
+        :param username: Имя пользователя
+        :param password: Пароль
+        :param shared: Использовать общий AsyncNetworkClient с другими синхронными клиентами
+                       с теми же параметрами; параметры должны быть hashable, иначе клиент не общий
+        :param kwargs: Параметры AsyncNetworkClient
+        """
+        self._background = BackgroundLoop.instance()
+        self._factory = lambda: AsyncNetworkClient(host, username, password, **kwargs)
 
-        self.packet_count = 0
+        key = (host, username, password, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            key = None
+        self._key = key if shared else None
+
+        self._client = None  # type: AsyncNetworkClient
+        self._connecting = None  # type: threading.Lock
+        self._attached = False
 
         self.Connect()
 
+    @property
+    def client(self) -> AsyncNetworkClient:
+        return self._client
+
+    @property
+    def url(self) -> str:
+        return self._client._url
+
+    @property
+    def client_uuid(self) -> str:
+        return self._client._client_uuid
+
+    @property
+    def session_uuid(self):
+        return self._client._session_uuid if self._client.connected else None
+
+    @property
+    def request_count(self) -> int:
+        return self._client._request_count
+
+    def _run(self, coroutine, timeout=None):
+        return self._background.run(coroutine, timeout)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        attribute = getattr(self._client, name)
+        if not inspect.iscoroutinefunction(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def method(*args, **kwargs):
+            return self._run(attribute(*args, **kwargs))
+
+        return method
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Disconnect()
+
     def Socket(self, soapaction, data, timeout=60):
-        headers = {
-            'Content-Type': 'text/xml; charset=utf-8',
-            'Soapaction': '"' + soapaction + '"',
-            'Accept-Encoding': 'gzip, deflate'
-        }
-        try:
-            time_start = dt.now()
-            response = requests.post(self.url, verify=False, headers=headers, data=data.encode(), timeout=timeout)
-            if response.status_code == 500:
-                block = Decoder.ErrorDecode(response.text)
-                logging.info("Time Wait: " + f"{dt.now()-time_start}")
-                logging.error("%s - %s", block['faultcode'], block['faultstring'])
-                raise SystemError
-
-            return response.text
-        except requests.ConnectionError:
-            logging.error("Ошибка подключения к серверу: %s", self.url)
-            exit(500)
-
-    def SecureHeader(self, count) -> xml_document:
-        root = xml_document()
-        root.xml_timestamp()
-        root.xml_usernametoken(self.username, self.password, "uuid-" + self.client_uuid + "-" + str(count))
-
-        return root
+        if isinstance(data, str):
+            data = data.encode()
+        return self._run(self._client._socket(soapaction, data, timeout))
 
     def Connect(self):
         """
         Отправка запроса с авторизацией на сервер и получения токена.
+        Общий клиент, уже подключенный другим синхронным клиентом, повторно не подключается.
         :return: Ключ сессии
         """
-        soapaction = "http://www.rusguardsecurity.ru/ILNetworkService/Connect"
-        root = self.SecureHeader(self.packet_count + 1)
-        data = root.xml_method("Connect", {"xmlns": "http://www.rusguardsecurity.ru"})
+        attached = not self._attached
+        if attached:
+            self._client, self._connecting = self._background.acquire(self._key, self._factory)
+            self._attached = True
 
-        logging.info("Попытка подключения к серверу.")
-        response = self.Socket(soapaction, data.toxml())
         try:
-            self.session_uuid = Decoder.ConnectionDecode(response)
-        except ValueError:
-            logging.error("Ошибка получения токена авторизации")
-
-        self.packet_count += 1
-        logging.info("Авторизация прошла успешно.")
-        logging.info("SessionID - %s", self.session_uuid)
+            with self._connecting:
+                if not self._client.connected:
+                    self._run(self._client.connect())
+        except BaseException:
+            if attached:
+                self._attached = False
+                if self._background.release(self._key, self._client):
+                    self._run(self._client._close_session())
+            raise
+        return self.session_uuid
 
     def Disconnect(self):
         """
-        Закрываем соединение с сервером
+        Закрываем соединение с сервером (у общего клиента - при отключении последнего синхронного клиента)
         :return:
         """
-        soapaction = "http://www.rusguardsecurity.ru/ILNetworkService/Disconnect"
-
-        root = self.SecureHeader(self.packet_count + 1)
-        data = root.xml_method("Disconnect", {"xmlns": "http://www.rusguardsecurity.ru"})
+        if not self._attached:
+            return
 
-        self.Socket(soapaction, data.toxml())
-        logging.info("Соединение с сервером разорвано.")
+        self._attached = False
+        if self._background.release(self._key, self._client) and self._client.connected:
+            self._run(self._client.disconnect())
 
     def GetVersion(self) -> str:
         """
         Получение версии сервера
         :return:
         """
-        soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetVariable"
-
-        root = self.SecureHeader(self.packet_count + 1)
-
-        child = Document().createElement("name")
-        child.appendChild(Document().createTextNode("Version"))
-
-        data = root.xml_method("GetVariable", {"xmlns": "http://www.rusguardsecurity.ru"}, [child])
-        response = self.Socket(soapaction, data.toxml())
-        key, value = Decoder.GetVariable(response)
-
-        logging.info("Версия сервера: %s", value)
-
-        return value
+        return self._run(self._client.get_version())
 
     def GetLastEvent(self) -> LogMessage:
-        soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetLastEvent"
-
-        with open("./RusGuardClient/Templates/GetLastEvent.json", 'r') as file:
-            json_file = loads(file.read())
-
-        root = self.SecureHeader(self.packet_count + 1)
-        data = root.xml_simple(Decoder.JsonToXML(json_file))
-
-        response = self.Socket(soapaction, data.toxml())
-        event = Decoder.GetLastEvent(response)
-
-        logging.info("ID Последнего события %s", event.Id)
-        logging.info("[%s] %s", event.Message, event.Details)
-
-        self.packet_count += 1
-        return event
+        return self._run(self._client.get_last_event())
 
     def GetEvents(self, fromMessageId=0) -> [LogMessage]:
-        soapaction = "http://www.rusguardsecurity.ru/ILDataService/GetEvents"
-
-        with open("./RusGuardClient/Templates/GetEvents.json", 'r') as file:
-            json_file = loads(file.read())
-
-        json_file['GetEvents']['fromMessageId'] = fromMessageId
+        return self._run(self._client.get_events(fromMessageId))
 
-        root = self.SecureHeader(self.packet_count + 1)
-        data = root.xml_simple(Decoder.JsonToXML(json_file))
+    def GetNotification(self):
+        return self._run(self._client.get_notification())
 
-        response = self.Socket(soapaction, data.toxml())
-        self.packet_count += 1
-        return Decoder.GetEvents(response)
+    def GetEmployeePhoto(self, employeeId, photoNumber=1) -> str:
+        return self._run(self._client.get_employee_photo(employeeId, photoNumber))
 
-    async def GetNotification(self):
-        soapaction = "http://www.rusguardsecurity.ru/ILNetworkService/GetNotification"
+    def GetFilteredEvents(self, query, **kwargs) -> [LogMessage]:
+        return self._run(self._client.get_filtered_events(query, **kwargs))
 
-        with open("./RusGuardClient/Templates/GetNotification.json", 'r') as file:
-            json_file = loads(file.read())
+    def GetLogMessageTypes(self):
+        return self._run(self._client.get_log_message_types())
 
-        json_file['GetNotification']['connectionId'] = self.session_uuid
+    def GetLogMessageSubtypes(self):
+        return self._run(self._client.get_log_message_subtypes())
 
-        root = self.SecureHeader(self.packet_count + 1)
-        data = root.xml_simple(Decoder.JsonToXML(json_file))
+    def GetAllNets(self):
+        return self._run(self._client.get_all_nets())
 
-        response = self.Socket(soapaction, data.toxml(), 9)
-        self.packet_count += 1
+    def GetNetServers(self, serverId=None):
+        return self._run(self._client.get_net_servers(serverId))
 
-        return Decoder.GetNotification(response)
+    def GetServerDriversFullInfo(self, serverId):
+        return self._run(self._client.get_server_drivers_full_info(serverId))
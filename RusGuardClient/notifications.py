@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import time
+
+from RusGuardClient.Models import EmployeePassageNotification
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+
+class Subscription:
+    """
+    Очередь пакетов уведомлений одного подписчика.
+    При переполнении очереди действует политика:
+        block - опрос сервера ждет, пока подписчик освободит место (следующий запрос уже отправлен);
+        drop_oldest - удаляется самый старый пакет;
+        drop_newest - новый пакет отбрасывается.
+    """
+
+    def __init__(self, engine, maxsize=100, policy=BLOCK):
+        """
+        :param engine: NotificationEngine
+        :param maxsize: Размер очереди (пакетов)
+        :param policy: Политика переполнения: block, drop_oldest или drop_newest
+        """
+        if policy not in (BLOCK, DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Неизвестная политика переполнения: {policy}")
+
+        self._engine = engine
+        self.queue = asyncio.Queue(maxsize)
+        self.policy = policy
+        self.dropped = 0
+
+    async def put(self, batch):
+        if self.policy == BLOCK:
+            await self.queue.put(batch)
+            return
+
+        if self.queue.full():
+            self.dropped += 1
+            if self.policy == DROP_NEWEST:
+                return
+            self.queue.get_nowait()
+
+        self.queue.put_nowait(batch)
+
+    async def get(self) -> [EmployeePassageNotification]:
+        return await self.queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> [EmployeePassageNotification]:
+        return await self.queue.get()
+
+    def close(self):
+        self._engine.unsubscribe(self)
+
+
+class NotificationEngine:
+    """
+    Непрерывный опрос GetNotification с раздачей пакетов подписчикам.
+
+    Следующий запрос к серверу отправляется сразу после получения ответа,
+    до передачи пакета подписчикам, поэтому время обработки уведомлений
+    не добавляется к задержке получения следующих.
+    Время ожидания ответа подстраивается под время удержания запроса сервером:
+    при пустых ответах оно устанавливается чуть больше наблюдаемого времени удержания,
+    при срабатывании таймаута - увеличивается.
+    После ошибки запроса опрос продолжается с экспоненциально растущей паузой,
+    после ошибки сервера (например, истекшего сеанса) клиент подключается заново.
+
+    Пример:
+        async with client.notifications() as engine:
+            async for batch in engine.subscribe(policy="drop_oldest"):
+                ...
+    """
+
+    def __init__(self, client, timeout=9.0, min_timeout=5.0, max_timeout=60.0, margin=1.5, retry_interval=1.0,
+                 max_retry_interval=30.0):
+        """
+        :param client: AsyncNetworkClient
+        :param timeout: Начальное время ожидания ответа (сек.)
+        :param min_timeout: Минимальное время ожидания
+        :param max_timeout: Максимальное время ожидания
+        :param margin: Запас к наблюдаемому времени удержания запроса сервером (сек.)
+        :param retry_interval: Пауза после первой ошибки запроса (сек.)
+        :param max_retry_interval: Максимальная пауза после повторяющихся ошибок (сек.)
+        """
+        self._client = client
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.margin = margin
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+
+        self._subscribers = []  # type: [Subscription]
+        self._task = None  # type: asyncio.Task
+        self.received = 0
+        self.errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def subscribe(self, maxsize=100, policy=BLOCK) -> Subscription:
+        """
+        Новый подписчик
+        :param maxsize: Размер очереди (пакетов)
+        :param policy: Политика переполнения: block, drop_oldest или drop_newest
+        :return: Subscription, асинхронный итератор пакетов уведомлений
+        """
+        subscription = Subscription(self, maxsize, policy)
+        self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription in self._subscribers:
+            self._subscribers.remove(subscription)
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self):
+        return self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.stop()
+
+    def _tune(self, held, timed_out):
+        """
+        Подстройка времени ожидания
+        :param held: Время выполнения запроса (сек.)
+        :param timed_out: Запрос прерван по таймауту клиента
+        """
+        if timed_out:
+            timeout = self.timeout * 2
+        else:
+            timeout = held + self.margin
+        self.timeout = min(max(timeout, self.min_timeout), self.max_timeout)
+
+    def _poll(self):
+        started = time.monotonic()
+        task = asyncio.ensure_future(self._client.get_notification(self.timeout))
+        return task, started
+
+    def _backoff(self, failures) -> float:
+        """
+        :param failures: Количество ошибок подряд
+        :return: Пауза перед следующим запросом (сек.)
+        """
+        return min(self.retry_interval * 2 ** (failures - 1), self.max_retry_interval)
+
+    async def _reconnect(self):
+        try:
+            await self._client.connect()
+        except Exception as error:
+            logging.error("Не удалось переподключиться к серверу для получения уведомлений: %r", error)
+
+    async def _publish(self, batch):
+        self.received += len(batch)
+        for subscription in list(self._subscribers):
+            await subscription.put(batch)
+
+    async def _run(self):
+        poll, started = self._poll()
+        failures = 0
+        try:
+            while True:
+                try:
+                    batch = await poll
+                except TimeoutError:
+                    self._tune(time.monotonic() - started, True)
+                    poll, started = self._poll()
+                    continue
+                except Exception as error:
+                    # Любая ошибка (в том числе разбора ответа) не останавливает опрос
+                    failures += 1
+                    self.errors += 1
+                    logging.error("Ошибка получения уведомлений: %r", error)
+                    await asyncio.sleep(self._backoff(failures))
+                    if isinstance(error, SystemError):
+                        await self._reconnect()
+                    poll, started = self._poll()
+                    continue
+
+                failures = 0
+                if not batch:
+                    self._tune(time.monotonic() - started, False)
+
+                poll, started = self._poll()
+
+                if batch:
+                    await self._publish(batch)
+        finally:
+            poll.cancel()
+            logging.info("Опрос уведомлений остановлен")
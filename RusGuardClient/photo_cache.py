@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from pathlib import Path
+
+
+class MemoryCache:
+    """
+    LRU кэш в памяти, ограниченный суммарным размером значений в байтах
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        """
+        :param max_bytes: Максимальный суммарный размер значений
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()  # type: {str: (bytes, float)}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, max_age=None):
+        """
+        :param key: Ключ
+        :param max_age: Максимальный возраст записи в секундах
+        :return: (значение, время записи) или None
+        """
+        item = self._items.get(key)
+        if item is None:
+            return None
+
+        if max_age is not None and time.time() - item[1] > max_age:
+            self.pop(key)
+            return None
+
+        self._items.move_to_end(key)
+        return item
+
+    def put(self, key, value, stored_at=None):
+        """
+        :param key: Ключ
+        :param value: Значение (bytes)
+        :param stored_at: Время записи (time.time()), по умолчанию - текущее
+        :return:
+        """
+        self.pop(key)
+        if len(value) > self.max_bytes:
+            return
+
+        self._items[key] = (value, time.time() if stored_at is None else stored_at)
+        self.size += len(value)
+
+        while self.size > self.max_bytes:
+            _, (evicted, _) = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+    def pop(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.size -= len(item[0])
+
+    def clear(self):
+        self._items.clear()
+        self.size = 0
+
+
+class DiskCache:
+    """
+    Кэш файлов в каталоге, ограниченный суммарным размером.
+    Возраст файла определяется по времени изменения (st_mtime), при превышении
+    размера удаляются самые старые файлы. Методы блокирующие, вызываются из потока.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, suffix=".png", exclude=()):
+        """
+        :param directory: Каталог кэша
+        :param max_bytes: Максимальный суммарный размер файлов
+        :param suffix: Расширение файлов кэша
+        :param exclude: Имена файлов каталога, не относящихся к кэшу
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.exclude = set(exclude)
+
+        self.size = 0
+        self._index = None  # type: {str: (int, float)}
+        self._lock = threading.Lock()
+
+    def path(self, key) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+
+        self._index = {}
+        self.size = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return
+
+        for entry in entries:
+            if not entry.name.endswith(self.suffix) or entry.name in self.exclude or not entry.is_file():
+                continue
+            stat = entry.stat()
+            self._index[entry.name[:-len(self.suffix)]] = (stat.st_size, stat.st_mtime)
+            self.size += stat.st_size
+
+    def _forget(self, key):
+        item = self._index.pop(key, None)
+        if item is not None:
+            self.size -= item[0]
+
+    def _remove(self, key):
+        self._forget(key)
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def get(self, key, max_age=None):
+        """
+        :param key: Ключ
+        :param max_age: Максимальный возраст файла в секундах
+        :return: (содержимое, время изменения файла) или None
+        """
+        with self._lock:
+            self._load_index()
+            path = self.path(key)
+            try:
+                mtime = path.stat().st_mtime
+                if max_age is not None and time.time() - mtime > max_age:
+                    self._remove(key)
+                    return None
+                data = path.read_bytes()
+            except FileNotFoundError:
+                self._forget(key)
+                return None
+
+            return data, mtime
+
+    def fresh(self, key, max_age=None) -> bool:
+        """
+        Файл есть в кэше и не устарел (без чтения содержимого)
+        """
+        with self._lock:
+            self._load_index()
+            try:
+                mtime = self.path(key).stat().st_mtime
+            except FileNotFoundError:
+                self._forget(key)
+                return False
+            return max_age is None or time.time() - mtime <= max_age
+
+    def put(self, key, data):
+        """
+        Атомарная запись файла и удаление самых старых файлов при превышении размера
+        :param key: Ключ
+        :param data: Содержимое (bytes)
+        :return: Время записи
+        """
+        with self._lock:
+            self._load_index()
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+            path = self.path(key)
+            temporary = path.with_name(path.name + ".tmp")
+            temporary.write_bytes(data)
+            os.replace(temporary, path)
+            mtime = path.stat().st_mtime
+
+            self._forget(key)
+            self._index[key] = (len(data), mtime)
+            self.size += len(data)
+
+            if self.size > self.max_bytes:
+                for evicted in sorted(self._index, key=lambda item: self._index[item][1]):
+                    if self.size <= self.max_bytes:
+                        break
+                    if evicted != key:
+                        self._remove(evicted)
+
+            return mtime
+
+    def pop(self, key):
+        with self._lock:
+            self._load_index()
+            self._remove(key)
+
+
+class PhotoCache:
+    """
+    Двухуровневый кэш фотографий сотрудников: LRU в памяти перед файловым кэшем.
+    Файловые операции выполняются в отдельном потоке, попадание в кэш памяти
+    не обращается к диску.
+    """
+
+    placeholder_name = "no_avatar.png"
+
+    def __init__(self, directory="./EmployeePhoto", ttl=timedelta(days=5),
+                 memory_bytes=32 * 1024 * 1024, disk_bytes=512 * 1024 * 1024):
+        """
+        :param directory: Каталог файлового кэша
+        :param ttl: Время жизни фотографии (timedelta)
+        :param memory_bytes: Размер кэша в памяти
+        :param disk_bytes: Размер файлового кэша
+        """
+        self.ttl = ttl
+        self.memory = MemoryCache(memory_bytes)
+        self.disk = DiskCache(directory, disk_bytes, exclude=(self.placeholder_name,))
+        self._placeholder = None
+
+    @property
+    def max_age(self) -> float:
+        return self.ttl.total_seconds()
+
+    async def fresh(self, key) -> bool:
+        """
+        Фотография есть в кэше (в памяти или на диске) и не устарела
+        """
+        key = str(key)
+        if self.memory.get(key, self.max_age) is not None:
+            return True
+        return await asyncio.to_thread(self.disk.fresh, key, self.max_age)
+
+    async def get(self, key):
+        """
+        :param key: Идентификатор сотрудника
+        :return: Фотография (bytes), b"" - фотографии нет на сервере (см. put_missing), или None
+        """
+        key = str(key)
+        item = self.memory.get(key, self.max_age)
+        if item is not None:
+            return item[0]
+
+        item = await asyncio.to_thread(self.disk.get, key, self.max_age)
+        if item is None:
+            return None
+
+        data, mtime = item
+        self.memory.put(key, data, mtime)
+        return data
+
+    async def put(self, key, data):
+        """
+        :param key: Идентификатор сотрудника
+        :param data: Фотография (bytes)
+        :return:
+        """
+        key = str(key)
+        self.memory.put(key, data)
+        try:
+            await asyncio.to_thread(self.disk.put, key, data)
+        except OSError as error:
+            logging.error("Не удалось сохранить фотографию %s: %s", key, error)
+
+    async def put_missing(self, key):
+        """
+        Отметка об отсутствии фотографии на сервере (пустое значение): до истечения ttl
+        фотография не запрашивается повторно
+        :param key: Идентификатор сотрудника
+        :return:
+        """
+        await self.put(key, b"")
+
+    async def invalidate(self, key):
+        key = str(key)
+        self.memory.pop(key)
+        await asyncio.to_thread(self.disk.pop, key)
+
+    async def placeholder(self):
+        """
+        Изображение для сотрудников без фотографии, читается с диска один раз
+        :return: bytes
+        """
+        if self._placeholder is None:
+            path = self.disk.directory / self.placeholder_name
+            self._placeholder = await asyncio.to_thread(path.read_bytes)
+        return self._placeholder
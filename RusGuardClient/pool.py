@@ -0,0 +1,209 @@
+import asyncio
+import logging
+from pathlib import Path
+
+from RusGuardClient.ANetwork import AsyncNetworkClient
+
+
+class SiteLimiter:
+    """
+    Ограничение одновременных запросов к площадке: запрос занимает место
+    в семафоре площадки и в общем семафоре пула
+    """
+
+    def __init__(self, site_semaphore: asyncio.Semaphore, pool_semaphore: asyncio.Semaphore):
+        self._site = site_semaphore
+        self._pool = pool_semaphore
+
+    async def __aenter__(self):
+        await self._site.acquire()
+        try:
+            await self._pool.acquire()
+        except BaseException:
+            self._site.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._pool.release()
+        self._site.release()
+
+
+def _tag(result, site):
+    """
+    Заполнение поля Site у сообщений и уведомлений результата
+    """
+    items = result if isinstance(result, list) else [result]
+    for item in items:
+        if hasattr(type(item), "Site"):
+            item.Site = site
+    return result
+
+
+class ClientPool:
+    """
+    Пул клиентов нескольких серверов RusGuard (площадок) в одном цикле событий.
+    Подключение выполняется одновременно, сообщения и уведомления помечаются
+    именем площадки (поле Site) и объединяются в общие потоки.
+
+    Пример:
+        sites = {"north": ("acs1", "user", "password"), "south": ("acs2", "user", "password")}
+        async with ClientPool(sites, per_site=4, total=32) as pool:
+            async for message in pool.tail("./cursors"):
+                print(message.Site, message.Message)
+    """
+
+    def __init__(self, sites: dict, per_site=4, total=32, queue_size=1000, **kwargs):
+        """
+        :param sites: {Площадка: (адрес сервера, имя пользователя, пароль)}
+        :param per_site: Максимальное количество одновременных запросов к одной площадке
+        :param total: Максимальное количество одновременных запросов пула
+        :param queue_size: Размер очереди объединенных потоков
+        :param kwargs: Параметры AsyncNetworkClient
+        """
+        self.sites = dict(sites)
+        self.per_site = per_site
+        self.total = total
+        self.queue_size = queue_size
+
+        self._kwargs = kwargs
+        self._semaphore = asyncio.Semaphore(total)
+        self.clients = {}  # type: {str: AsyncNetworkClient}
+
+    def __getitem__(self, site) -> AsyncNetworkClient:
+        return self.clients[site]
+
+    def __iter__(self):
+        return iter(self.clients)
+
+    def __len__(self):
+        return len(self.clients)
+
+    def _client(self, site) -> AsyncNetworkClient:
+        host, username, password = self.sites[site]
+        kwargs = dict(self._kwargs)
+        # Место под длинный опрос уведомлений, который не ограничивается
+        kwargs.setdefault("limit", self.per_site + 1)
+        kwargs.setdefault("limit_per_host", self.per_site + 1)
+
+        return AsyncNetworkClient(
+            host, username, password,
+            limiter=SiteLimiter(asyncio.Semaphore(self.per_site), self._semaphore),
+            **kwargs
+        )
+
+    async def connect(self):
+        """
+        Одновременное подключение ко всем площадкам.
+        Площадки, к которым не удалось подключиться, в пул не включаются.
+        :return: {Площадка: исключение} для неподключенных площадок
+        """
+        sites = [site for site in self.sites if site not in self.clients]
+        clients = [self._client(site) for site in sites]
+
+        results = await asyncio.gather(*[client.connect() for client in clients], return_exceptions=True)
+
+        failed = {}
+        for site, client, result in zip(sites, clients, results):
+            # connect() не возбуждает исключение, если сервер не выдал токен авторизации
+            if not isinstance(result, BaseException) and not client.connected:
+                result = ValueError("Ошибка получения токена авторизации")
+            if isinstance(result, BaseException):
+                logging.error("Площадка %s: не удалось подключиться (%r)", site, result)
+                await client._close_session()
+                failed[site] = result
+            else:
+                self.clients[site] = client
+
+        logging.info("Подключено площадок: %s из %s", len(self.clients), len(self.sites))
+        return failed
+
+    async def disconnect(self):
+        clients = self.clients
+        self.clients = {}
+        await asyncio.gather(*[client.disconnect() for client in clients.values()], return_exceptions=True)
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    async def call(self, method, *args, **kwargs) -> dict:
+        """
+        Одновременный вызов метода клиента на всех площадках
+        :param method: Имя метода AsyncNetworkClient, например "get_last_event"
+        :return: {Площадка: результат или исключение}
+        """
+        sites = list(self.clients)
+        results = await asyncio.gather(
+            *[getattr(self.clients[site], method)(*args, **kwargs) for site in sites],
+            return_exceptions=True
+        )
+
+        return {
+            site: result if isinstance(result, BaseException) else _tag(result, site)
+            for site, result in zip(sites, results)
+        }
+
+    async def _merge(self, sources):
+        """
+        Объединение асинхронных итераторов площадок в один поток
+        :param sources: {Площадка: асинхронный итератор}
+        :return: Асинхронный генератор элементов
+        """
+        if not sources:
+            return
+
+        queue = asyncio.Queue(self.queue_size)
+
+        async def forward(site, source):
+            try:
+                async for item in source:
+                    await queue.put(_tag(item, site))
+            except Exception as error:
+                logging.error("Площадка %s: поток остановлен (%r)", site, error)
+
+        tasks = [asyncio.ensure_future(forward(site, source)) for site, source in sources.items()]
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def tail(self, cursor_dir=None, **kwargs):
+        """
+        Объединенный поток новых событий всех площадок, см. AsyncNetworkClient.tail
+        :param cursor_dir: Каталог для файлов позиций площадок ({площадка}.cursor)
+        :param kwargs: Параметры EventFollower
+        :return: Асинхронный генератор LogMessage с заполненным полем Site
+        """
+        sources = {}
+        for site, client in self.clients.items():
+            cursor = None if cursor_dir is None else Path(cursor_dir) / f"{site}.cursor"
+            sources[site] = client.tail(cursor, **kwargs)
+
+        async for message in self._merge(sources):
+            yield message
+
+    async def notifications(self, maxsize=100, policy="block", **kwargs):
+        """
+        Объединенный поток уведомлений всех площадок, см. NotificationEngine
+        :param maxsize: Размер очереди подписчика каждой площадки
+        :param policy: Политика переполнения очереди
+        :param kwargs: Параметры NotificationEngine
+        :return: Асинхронный генератор пакетов EmployeePassageNotification с заполненным полем Site
+        """
+        engines = {site: client.notifications(**kwargs) for site, client in self.clients.items()}
+        sources = {site: engine.subscribe(maxsize, policy) for site, engine in engines.items()}
+
+        for engine in engines.values():
+            engine.start()
+        try:
+            async for batch in self._merge(sources):
+                yield batch
+        finally:
+            await asyncio.gather(*[engine.stop() for engine in engines.values()])
@@ -0,0 +1,175 @@
+from datetime import datetime, timedelta
+
+
+class EventQuery:
+    """
+    Построитель запроса GetFilteredEvents.
+
+    Пример:
+        query = EventQuery().subtypes("AccessPointEntryByKey").devices(door_id).between(start, end)
+        events = await client.get_filtered_events(query, shard=timedelta(days=1))
+    """
+
+    def __init__(self):
+        self._types = []
+        self._subtypes = []
+        self._devices = []
+        self._subjects = []
+        self._subject_type = "Employee"
+        self._groups = []
+        self._group_type = "EmployeeGroup"
+
+        self._start = None  # type: datetime
+        self._end = None  # type: datetime
+        self._from_message_id = 0
+
+        self._page_size = 1000
+        self._sorted_column = "DateTime"
+        self._descending = False
+
+        self._show_related = False
+        self._show_removed = False
+
+    def copy(self):
+        query = EventQuery()
+        query.__dict__.update(self.__dict__)
+        for key, value in query.__dict__.items():
+            if isinstance(value, list):
+                query.__dict__[key] = list(value)
+        return query
+
+    def types(self, *types):
+        """
+        :param types: Типы сообщений (LogMsgType)
+        """
+        self._types.extend(types)
+        return self
+
+    def subtypes(self, *subtypes):
+        """
+        :param subtypes: Подтипы сообщений (LogMsgSubType)
+        """
+        self._subtypes.extend(subtypes)
+        return self
+
+    def devices(self, *device_ids):
+        """
+        :param device_ids: Идентификаторы устройств (драйверов)
+        """
+        self._devices.extend(device_ids)
+        return self
+
+    def subjects(self, *subject_ids, subject_type="Employee"):
+        """
+        :param subject_ids: Идентификаторы субъектов
+        :param subject_type: Тип субъектов (Employee, Operator, ...)
+        """
+        self._subjects.extend(subject_ids)
+        self._subject_type = subject_type
+        return self
+
+    def groups(self, *group_ids, group_type="EmployeeGroup"):
+        """
+        :param group_ids: Идентификаторы групп субъектов
+        :param group_type: Тип групп
+        """
+        self._groups.extend(group_ids)
+        self._group_type = group_type
+        return self
+
+    def between(self, start=None, end=None):
+        """
+        :param start: Начало периода, datetime
+        :param end: Конец периода, datetime
+        """
+        self._start = start
+        self._end = end
+        return self
+
+    def after_message(self, message_id):
+        self._from_message_id = message_id
+        return self
+
+    def paginate(self, page_size):
+        self._page_size = page_size
+        return self
+
+    def sort(self, column="DateTime", descending=False):
+        self._sorted_column = column
+        self._descending = descending
+        return self
+
+    def include_related(self, value=True):
+        self._show_related = value
+        return self
+
+    def include_removed(self, value=True):
+        self._show_removed = value
+        return self
+
+    @property
+    def start(self) -> datetime:
+        return self._start
+
+    @property
+    def end(self) -> datetime:
+        return self._end
+
+    @property
+    def page_size(self) -> int:
+        return self._page_size
+
+    @property
+    def sorted_column(self) -> str:
+        return self._sorted_column
+
+    @property
+    def descending(self) -> bool:
+        return self._descending
+
+    def shards(self, interval: timedelta):
+        """
+        Разбиение периода запроса на последовательные интервалы
+        :param interval: Длина интервала
+        :return: Список запросов в порядке возрастания времени
+        """
+        if interval is None or self._start is None or self._end is None:
+            return [self]
+
+        shards = []
+        start = self._start
+        while start < self._end:
+            end = min(start + interval, self._end)
+            shards.append(self.copy().between(start, end))
+            start = end
+
+        return shards or [self]
+
+    def slots(self, page_number=0) -> dict:
+        """
+        Значения слотов шаблона GetFilteredEvents
+        :param page_number: Номер страницы
+        :return:
+        """
+        values = {
+            "fromMessageId": self._from_message_id,
+            "msgTypes": self._types,
+            "msgSubTypes": self._subtypes,
+            "deviceIDs": self._devices,
+            "subjectIDs": self._subjects,
+            "subjectType": self._subject_type,
+            "subjectIDs2": self._groups,
+            "subjectType2": self._group_type,
+            "pageNumber": page_number,
+            "pageSize": self._page_size,
+            "sortedColumn": self._sorted_column,
+            "sortOrder": "Descending" if self._descending else "Ascending",
+            "isShowEventsWithRelatedData": self._show_related,
+            "isShowRemovedEmployes": self._show_removed,
+        }
+        if self._start is not None:
+            values["fromDateTime"] = self._start
+        if self._end is not None:
+            values["toDateTime"] = self._end
+
+        return values
@@ -0,0 +1,80 @@
+import asyncio
+import functools
+
+from RusGuardClient.deadline import detached_context, remaining
+
+
+class _Flight:
+    """
+    Выполняемый общий запрос и количество ожидающих его вызовов
+    """
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных запросов: пока запрос с данным ключом
+    выполняется, остальные вызовы ожидают его результат, а не отправляют свой.
+    Запрос отменяется, когда его перестает ожидать последний вызов.
+    """
+
+    def __init__(self):
+        self._flights = {}  # type: {object: _Flight}
+
+    def __len__(self):
+        return len(self._flights)
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def do(self, key, factory):
+        """
+        :param key: Ключ запроса (hashable)
+        :param factory: Функция без аргументов, возвращающая корутину запроса
+        :return: Результат запроса, общий для всех ожидающих вызовов
+        """
+        budget = remaining(None)
+        flight = self._flights.get(key)
+        if flight is None:
+            # Общий запрос не ограничен сроком вызвавшего его: срок проверяется для каждого ожидающего
+            flight = _Flight(detached_context().run(asyncio.ensure_future, factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+
+        # Отмена или истечение срока одного из ожидающих вызовов не отменяет запрос для остальных
+        flight.waiters += 1
+        try:
+            if budget is None:
+                return await asyncio.shield(flight.task)
+            return await asyncio.wait_for(asyncio.shield(flight.task), budget)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                self._forget(key, flight)
+                flight.task.cancel()
+
+
+def coalesce(method):
+    """
+    Декоратор метода AsyncNetworkClient: одновременные вызовы с одинаковыми
+    аргументами выполняются одним запросом к серверу и получают один и тот же результат.
+    Применяется только к запросам, не изменяющим состояние сервера.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return await method(self, *args, **kwargs)
+
+        return await self._flights.do(key, lambda: method(self, *args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,185 @@
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from RusGuardClient.Models import LogMessage
+
+_FIELDS = tuple(name for name, _ in LogMessage._fields.values())
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _utc_key(value, tz=None):
+    """
+    Ключ времени для индекса: UTC в формате ISO 8601, сортируемый как строка.
+    Время без часового пояса считается заданным в tz; если tz не задан, сохраняется как есть.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    if value.tzinfo is None and tz is not None:
+        value = value.replace(tzinfo=tz)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(sep="T", timespec="microseconds")
+
+
+class EventStore:
+    """
+    Локальное хранилище событий на SQLite.
+    Сообщения индексируются по Id, времени, сотруднику, устройству и подтипу,
+    что позволяет отвечать на повторные запросы по закрытой истории без обращения к серверу.
+    """
+
+    def __init__(self, path=":memory:", tz=None):
+        """
+        :param path: Путь к файлу базы данных
+        :param tz: Часовой пояс (tzinfo) для времени без часового пояса;
+                   None - границы периода без часового пояса не принимаются
+        """
+        self.path = str(path)
+        self.tz = tz
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+
+        columns = ", ".join(f'"{name}" TEXT' for name in _FIELDS if name != "Id")
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                f'CREATE TABLE IF NOT EXISTS events ("Id" INTEGER PRIMARY KEY, utc_time TEXT, {columns})'
+            )
+            for column in ("utc_time", "EmployeeID", "DriverID", "LogMessageSubType"):
+                self._connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS "events_{column}" ON events ("{column}", "Id")'
+                )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def add(self, messages) -> int:
+        """
+        Добавление (или замена) сообщений
+        :param messages: Итерируемый набор LogMessage
+        :return: Количество записанных сообщений
+        """
+        rows = [
+            (message.Id, _utc_key(message.DateTime, self.tz)) + tuple(
+                _text(getattr(message, name)) for name in _FIELDS if name != "Id"
+            )
+            for message in messages if message.Id is not None
+        ]
+        if not rows:
+            return 0
+
+        names = ", ".join(f'"{name}"' for name in _FIELDS if name != "Id")
+        placeholders = ", ".join("?" * (len(_FIELDS) + 1))
+        with self._lock, self._connection:
+            self._connection.executemany(
+                f'INSERT OR REPLACE INTO events ("Id", utc_time, {names}) VALUES ({placeholders})', rows
+            )
+
+        return len(rows)
+
+    def _bound(self, value):
+        """
+        Ключ времени для границы периода выборки
+        :param value: datetime или строка ISO 8601 в UTC
+        :return:
+        """
+        if isinstance(value, datetime) and value.tzinfo is None and self.tz is None:
+            raise ValueError(f"Время без часового пояса: {value}, укажите tzinfo или часовой пояс хранилища (tz)")
+        return _utc_key(value, self.tz)
+
+    def _where(self, start=None, end=None, employee_id=None, driver_id=None, subtypes=None, types=None,
+               after_id=None):
+        conditions = []
+        parameters = []
+
+        if start is not None:
+            conditions.append("utc_time >= ?")
+            parameters.append(self._bound(start))
+        if end is not None:
+            conditions.append("utc_time < ?")
+            parameters.append(self._bound(end))
+        if employee_id is not None:
+            conditions.append('"EmployeeID" = ?')
+            parameters.append(str(employee_id))
+        if driver_id is not None:
+            conditions.append('"DriverID" = ?')
+            parameters.append(str(driver_id))
+        if subtypes:
+            conditions.append(f'"LogMessageSubType" IN ({", ".join("?" * len(subtypes))})')
+            parameters.extend(str(subtype) for subtype in subtypes)
+        if types:
+            conditions.append(f'"LogMessageType" IN ({", ".join("?" * len(types))})')
+            parameters.extend(str(message_type) for message_type in types)
+        if after_id is not None:
+            conditions.append('"Id" > ?')
+            parameters.append(int(after_id))
+
+        where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+        return where, parameters
+
+    def query(self, start=None, end=None, employee_id=None, driver_id=None, subtypes=None, types=None,
+              after_id=None, limit=None, descending=False) -> [LogMessage]:
+        """
+        Выборка сообщений из хранилища
+        :param start: Начало периода (включительно), datetime с часовым поясом, если tz хранилища не задан
+        :param end: Конец периода (не включительно)
+        :param employee_id: Идентификатор сотрудника
+        :param driver_id: Идентификатор устройства
+        :param subtypes: Подтипы сообщений
+        :param types: Типы сообщений
+        :param after_id: Только сообщения с Id больше указанного
+        :param limit: Максимальное количество сообщений
+        :param descending: Сортировка по убыванию времени
+        :return: Список LogMessage, упорядоченный по времени и Id
+        """
+        where, parameters = self._where(start, end, employee_id, driver_id, subtypes, types, after_id)
+        order = "DESC" if descending else "ASC"
+        sql = f'SELECT {", ".join(chr(34) + name + chr(34) for name in _FIELDS)} FROM events{where} ' \
+              f'ORDER BY utc_time {order}, "Id" {order}'
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(int(limit))
+
+        with self._lock:
+            rows = self._connection.execute(sql, parameters).fetchall()
+
+        return [LogMessage.from_text(dict(zip(_FIELDS, row))) for row in rows]
+
+    def count(self, **conditions) -> int:
+        """
+        Количество сообщений, см. параметры query
+        """
+        where, parameters = self._where(**conditions)
+        with self._lock:
+            return self._connection.execute(f"SELECT COUNT(*) FROM events{where}", parameters).fetchone()[0]
+
+    def get(self, message_id) -> LogMessage:
+        """
+        :param message_id: Идентификатор сообщения
+        :return: LogMessage или None
+        """
+        with self._lock:
+            row = self._connection.execute(
+                f'SELECT {", ".join(chr(34) + name + chr(34) for name in _FIELDS)} FROM events WHERE "Id" = ?',
+                (int(message_id),)
+            ).fetchone()
+
+        return None if row is None else LogMessage.from_text(dict(zip(_FIELDS, row)))
+
+    def last_id(self):
+        """
+        :return: Наибольший сохраненный идентификатор сообщения или None
+        """
+        with self._lock:
+            return self._connection.execute('SELECT MAX("Id") FROM events').fetchone()[0]
@@ -0,0 +1,184 @@
+from collections import deque
+from uuid import UUID
+
+from RusGuardClient.Models import LDriverFullInfo
+
+
+def _key(value):
+    """
+    Идентификаторы принимаются как UUID или строкой
+    """
+    if isinstance(value, str):
+        try:
+            return UUID(value)
+        except ValueError:
+            return value
+    return value
+
+
+class DriverTopology:
+    """
+    Индекс драйверов (устройств) сервера по Id, ParentId, DeviceServerId и DriverType.
+    Позволяет без перебора списка находить дочерние устройства и путь
+    от сервера до устройства события (LogMessage.DriverID).
+    """
+
+    def __init__(self, drivers=()):
+        """
+        :param drivers: Список LDriverFullInfo
+        """
+        self._by_id = {}  # type: {UUID: LDriverFullInfo}
+        self._children = {}  # type: {UUID: {UUID: LDriverFullInfo}}
+        self._by_server = {}  # type: {UUID: {UUID: LDriverFullInfo}}
+        self._by_type = {}  # type: {str: {UUID: LDriverFullInfo}}
+
+        for driver in drivers:
+            self._add(driver)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def __contains__(self, driver_id):
+        return _key(driver_id) in self._by_id
+
+    def __getitem__(self, driver_id) -> LDriverFullInfo:
+        return self._by_id[_key(driver_id)]
+
+    @staticmethod
+    def _index(index, key, driver):
+        index.setdefault(key, {})[driver.Id] = driver
+
+    @staticmethod
+    def _unindex(index, key, driver_id):
+        group = index.get(key)
+        if group is not None:
+            group.pop(driver_id, None)
+            if not group:
+                del index[key]
+
+    def _add(self, driver: LDriverFullInfo):
+        if driver.Id in self._by_id:
+            self._remove(driver.Id)
+
+        self._by_id[driver.Id] = driver
+        self._index(self._children, driver.ParentId, driver)
+        self._index(self._by_server, driver.DeviceServerId, driver)
+        self._index(self._by_type, driver.DriverType, driver)
+
+    def _remove(self, driver_id):
+        driver = self._by_id.pop(driver_id)
+        self._unindex(self._children, driver.ParentId, driver_id)
+        self._unindex(self._by_server, driver.DeviceServerId, driver_id)
+        self._unindex(self._by_type, driver.DriverType, driver_id)
+
+    def update(self, drivers, server_id=None) -> dict:
+        """
+        Обновление индекса новым списком драйверов.
+        Если задан server_id, заменяются только драйверы этого сервера,
+        иначе - драйверы всех серверов, встречающихся в списке.
+        :param drivers: Список LDriverFullInfo
+        :param server_id: Идентификатор сервера устройств
+        :return: {"added": [Id], "removed": [Id], "changed": [Id]}
+        """
+        drivers = list(drivers)
+        if server_id is not None:
+            servers = {_key(server_id)}
+        else:
+            servers = {driver.DeviceServerId for driver in drivers}
+
+        current = {
+            driver_id
+            for server in servers
+            for driver_id in self._by_server.get(server, ())
+        }
+        received = {driver.Id for driver in drivers}
+
+        changes = {"added": [], "removed": [], "changed": []}
+        for driver in drivers:
+            previous = self._by_id.get(driver.Id)
+            if previous is None:
+                changes["added"].append(driver.Id)
+            elif previous.as_dict() != driver.as_dict():
+                changes["changed"].append(driver.Id)
+            else:
+                continue
+            self._add(driver)
+
+        for driver_id in current - received:
+            self._remove(driver_id)
+            changes["removed"].append(driver_id)
+
+        return changes
+
+    def get(self, driver_id) -> LDriverFullInfo:
+        return self._by_id.get(_key(driver_id))
+
+    def children(self, driver_id) -> [LDriverFullInfo]:
+        return list(self._children.get(_key(driver_id), {}).values())
+
+    def roots(self) -> [LDriverFullInfo]:
+        """
+        Драйверы, родитель которых отсутствует в индексе
+        """
+        return [driver for driver in self._by_id.values() if driver.ParentId not in self._by_id]
+
+    def by_server(self, server_id) -> [LDriverFullInfo]:
+        return list(self._by_server.get(_key(server_id), {}).values())
+
+    def by_type(self, driver_type) -> [LDriverFullInfo]:
+        return list(self._by_type.get(driver_type, {}).values())
+
+    def parent(self, driver_id) -> LDriverFullInfo:
+        driver = self.get(driver_id)
+        return None if driver is None else self._by_id.get(driver.ParentId)
+
+    def ancestors(self, driver_id) -> [LDriverFullInfo]:
+        """
+        Родительские драйверы, начиная с ближайшего
+        :param driver_id: Идентификатор драйвера
+        :return:
+        """
+        result = []
+        seen = {_key(driver_id)}
+        driver = self.parent(driver_id)
+        while driver is not None and driver.Id not in seen:
+            result.append(driver)
+            seen.add(driver.Id)
+            driver = self._by_id.get(driver.ParentId)
+
+        return result
+
+    def path(self, driver_id) -> [LDriverFullInfo]:
+        """
+        Путь от верхнего драйвера до указанного (например, сервер - контроллер - дверь)
+        :param driver_id: Идентификатор драйвера, например LogMessage.DriverID
+        :return: Список драйверов или пустой список, если драйвер неизвестен
+        """
+        driver = self.get(driver_id)
+        if driver is None:
+            return []
+
+        path = self.ancestors(driver_id)
+        path.reverse()
+        path.append(driver)
+        return path
+
+    def descendants(self, driver_id) -> [LDriverFullInfo]:
+        """
+        Все дочерние драйверы (обход в ширину)
+        """
+        result = []
+        seen = {_key(driver_id)}
+        queue = deque([_key(driver_id)])
+        while queue:
+            children = self._children.get(queue.popleft(), {})
+            for child_id, child in children.items():
+                if child_id not in seen:
+                    seen.add(child_id)
+                    result.append(child)
+                    queue.append(child_id)
+
+        return result
@@ -0,0 +1,237 @@
+import json
+import time
+from collections import deque
+
+import aiohttp
+
+# Фазы запроса, для которых считается время (сек.)
+PHASES = ("queued", "dns", "connect", "send", "first_byte", "body", "total")
+
+
+class TransportTrace:
+    """
+    Фазы одного HTTP запроса:
+        queued - ожидание свободного соединения в пуле;
+        dns - разрешение имени (None, если соединение не создавалось или адрес взят из кэша);
+        connect - установка TCP соединения вместе с TLS рукопожатием (aiohttp не разделяет их), без dns;
+        send - отправка запроса после получения соединения;
+        first_byte - ожидание заголовков ответа после отправки запроса;
+        body - получение тела ответа после заголовков;
+        total - от начала запроса до последней полученной части ответа.
+    Пока тело ответа читается, body и total продолжают увеличиваться.
+    """
+    __slots__ = ("action", "url", "timestamp", "reused", "status", "error", "sent_bytes", "received_bytes",
+                 "_start", "_marks")
+
+    def __init__(self, action, url):
+        self.action = action
+        self.url = url
+        self.timestamp = time.time()
+        self.reused = None
+        self.status = None
+        self.error = None
+        self.sent_bytes = 0
+        self.received_bytes = 0
+
+        self._start = time.perf_counter()
+        self._marks = {}  # type: {str: float}
+
+    def mark(self, name):
+        self._marks[name] = time.perf_counter() - self._start
+
+    def receive(self, size):
+        """
+        Учет полученной части тела ответа
+        :param size: Размер части (байт)
+        """
+        self.received_bytes += size
+        self.mark("body")
+
+    def _span(self, start, end):
+        if start not in self._marks or end not in self._marks:
+            return None
+        return self._marks[end] - self._marks[start]
+
+    @property
+    def queued(self):
+        return self._span("queued_start", "queued_end")
+
+    @property
+    def dns(self):
+        return self._span("dns_start", "dns_end")
+
+    @property
+    def connect(self):
+        connect = self._span("connect_start", "connect_end")
+        if connect is None:
+            return None
+        return connect - (self.dns or 0.0)
+
+    def _sent(self):
+        # Запрос без тела завершается отправкой заголовков
+        return "sent" if "sent" in self._marks else "headers_sent"
+
+    @property
+    def send(self):
+        sent = self._marks.get(self._sent())
+        if sent is None:
+            return None
+        ready = max(self._marks.get("queued_end", 0.0), self._marks.get("connect_end", 0.0))
+        return sent - ready
+
+    @property
+    def first_byte(self):
+        return self._span(self._sent(), "response")
+
+    @property
+    def body(self):
+        return self._span("response", "body")
+
+    @property
+    def total(self):
+        return max(self._marks.values(), default=0.0)
+
+    def as_dict(self) -> dict:
+        record = {
+            "action": self.action,
+            "url": self.url,
+            "timestamp": self.timestamp,
+            "reused": self.reused,
+            "status": self.status,
+            "error": self.error,
+            "sent_bytes": self.sent_bytes,
+            "received_bytes": self.received_bytes,
+        }
+        for phase in PHASES:
+            record[phase] = getattr(self, phase)
+        return record
+
+
+class TransportTracer:
+    """
+    Трассировка фаз HTTP запросов клиента через aiohttp.TraceConfig.
+    Хранит последние maxlen записей.
+
+    Пример:
+        tracer = TransportTracer()
+        client = AsyncNetworkClient(host, username, password, tracer=tracer)
+        ...
+        tracer.save("trace.jsonl")
+    """
+
+    def __init__(self, maxlen=10000):
+        """
+        :param maxlen: Количество хранимых записей
+        """
+        self.records = deque(maxlen=maxlen)  # type: deque[TransportTrace]
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """
+        :return: TraceConfig для aiohttp.ClientSession
+        """
+        config = aiohttp.TraceConfig()
+        config.on_request_start.append(self._on_request_start)
+        config.on_connection_queued_start.append(self._marker("queued_start"))
+        config.on_connection_queued_end.append(self._marker("queued_end"))
+        config.on_connection_create_start.append(self._marker("connect_start"))
+        config.on_connection_create_end.append(self._on_connection_create_end)
+        config.on_dns_resolvehost_start.append(self._marker("dns_start"))
+        config.on_dns_resolvehost_end.append(self._marker("dns_end"))
+        config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        config.on_request_headers_sent.append(self._on_request_headers_sent)
+        config.on_request_chunk_sent.append(self._on_request_chunk_sent)
+        config.on_request_end.append(self._on_request_end)
+        config.on_response_chunk_received.append(self._on_response_chunk_received)
+        config.on_request_exception.append(self._on_request_exception)
+        return config
+
+    @staticmethod
+    def _marker(name):
+        async def mark(session, context, params):
+            context.trace.mark(name)
+        return mark
+
+    async def _on_request_start(self, session, context, params):
+        request_context = context.trace_request_ctx
+        if request_context is None:
+            request_context = {}
+        context.trace = TransportTrace(request_context.get("action"), str(params.url))
+        # Потоковое чтение ответа не вызывает on_response_chunk_received,
+        # поэтому запись передается вызывающему коду для учета частей (receive)
+        if isinstance(request_context, dict):
+            request_context["trace"] = context.trace
+        self.records.append(context.trace)
+
+    @staticmethod
+    async def _on_connection_create_end(session, context, params):
+        context.trace.mark("connect_end")
+        context.trace.reused = False
+
+    @staticmethod
+    async def _on_connection_reuseconn(session, context, params):
+        context.trace.reused = True
+
+    @staticmethod
+    async def _on_request_headers_sent(session, context, params):
+        context.trace.mark("headers_sent")
+
+    @staticmethod
+    async def _on_request_chunk_sent(session, context, params):
+        context.trace.sent_bytes += len(params.chunk)
+        context.trace.mark("sent")
+
+    @staticmethod
+    async def _on_request_end(session, context, params):
+        context.trace.mark("response")
+        context.trace.status = params.response.status
+
+    @staticmethod
+    async def _on_response_chunk_received(session, context, params):
+        context.trace.receive(len(params.chunk))
+
+    @staticmethod
+    async def _on_request_exception(session, context, params):
+        context.trace.mark("error")
+        context.trace.error = type(params.exception).__name__
+
+    def clear(self):
+        self.records.clear()
+
+    def export(self, action=None) -> [dict]:
+        """
+        :param action: Только записи указанного SOAP действия
+        :return: Записи в виде словарей
+        """
+        return [record.as_dict() for record in self.records if action is None or record.action == action]
+
+    def save(self, path, action=None):
+        """
+        Запись трассировки в файл JSON Lines
+        :param path: Путь к файлу
+        :param action: Только записи указанного SOAP действия
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            for record in self.export(action):
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def summary(self, q=0.5) -> dict:
+        """
+        Квантиль времени фаз по SOAP действиям
+        :param q: Квантиль, 0..1
+        :return: {SOAP действие: {"count", "reused", фаза: время}}
+        """
+        grouped = {}
+        for record in self.records:
+            grouped.setdefault(record.action, []).append(record)
+
+        result = {}
+        for action, records in grouped.items():
+            summary = {
+                "count": len(records),
+                "reused": sum(1 for record in records if record.reused),
+            }
+            for phase in PHASES:
+                values = sorted(value for value in (getattr(record, phase) for record in records) if value is not None)
+                summary[phase] = values[min(len(values) - 1, int(q * len(values)))] if values else None
+            result[action] = summary
+        return result
@@ -6,34 +6,18 @@ from RusGuardClient.Models import *
 
 
 async def notification():
-    while True:
-        try:
-            result = await Client.get_notification()
+    async with Client.notifications() as engine:
+        async for result in engine.subscribe(policy="drop_oldest"):
             for item in result:  # type: EmployeePassageNotification
                 photo = await Client.get_employee_photo(item.EmployeeId)
                 logging.info(f"{item.EmployeeFirstName} {item.EmployeeLastName} - {item.Message}")
 
                 # logging.info("[NOTIF](%s) %s %s", item.EmployeeId, item.Message, item.Details)
-        except TimeoutError:
-            continue
 
 
 async def logger():
-    event = await Client.get_last_event()
-    last_event_id = event.Id
-
-    while True:
-        try:
-            Message = await Client.get_events(int(last_event_id))
-            for item in Message:  # type: LogMessage
-                if last_event_id < item.Id:
-                    last_event_id = item.Id
-
-                logging.info("(%s) %s %s", item.Id, item.Message, item.Details)
-            await asyncio.sleep(1)
-            del Message
-        except KeyboardInterrupt:
-            break
+    async for item in Client.tail("./EventCursor"):  # type: LogMessage
+        logging.info("(%s) %s %s", item.Id, item.Message, item.Details)
 
 
 async def loop():
@@ -45,36 +29,26 @@ async def loop():
     await asyncio.gather(*tasks)
 
 
-if __name__ == '__main__':
-    main_loop = asyncio.get_event_loop()
-    Client = AsyncNetworkClient("acs1.osetrovo.int", 'dmhf', 'C373oa97rus')
-    Client.get_version()
-
-    servers = main_loop.run_until_complete(
-        Client.get_net_servers()
-    )
-
-    server_id = ""
+async def main():
+    global Client
 
-    for server in servers:  # type: LServerInfo
-        if server.ServerType == "DeviceServer":
-            server_id = server.Id
+    async with AsyncNetworkClient("acs1.osetrovo.int", 'dmhf', 'C373oa97rus') as Client:
+        await Client.get_version()
 
-    response = main_loop.run_until_complete(
-        Client.get_server_drivers_full_info(server_id)
-    )
+        topology = await Client.get_driver_topology()
 
-    for i in response:  # type: LDriverFullInfo
+        for i in topology:  # type: LDriverFullInfo
 
-        if i.ParentPropertyName == "Controllers":
-            print(f"\n{i.Name}")
-            for state in i.States:
-                print(f"    Параметр {state}: {i.States[state]}")
-            print('')
-            for y in i.Properties:
-                print(f"    Установка {y}: {i.Properties[y]}")
+            if i.ParentPropertyName == "Controllers":
+                print(f"\n{' / '.join(driver.Name for driver in topology.path(i.Id))}")
+                for state in i.States:
+                    print(f"    Параметр {state}: {i.States[state]}")
+                print('')
+                for y in i.Properties:
+                    print(f"    Установка {y}: {i.Properties[y]}")
 
+        # await loop()
 
-    # main_loop.run_until_complete(loop())
 
-    Client.disconnect()
\ No newline at end of file
+if __name__ == '__main__':
+    asyncio.run(main())